@@ -0,0 +1,201 @@
+"""SQLite backend for API tokens (indexed, transactional).
+
+api_token.json は発行・無効化のたびに全体を書き直し、無効化済みも残り続け、参照のたびに
+全履歴を解析していた。ここではトークンを 1 行ずつ api_tokens テーブルに持つ。
+
+- 認証は token_hash（SHA-256）の一意索引で 1 行だけ引く
+- 有効なトークンの station_id にも索引（部分索引）を張る
+- 発行・無効化は BEGIN IMMEDIATE のトランザクションで行い、同時に書いても更新が失われない
+- 無効化から retention_days を過ぎた行は compact() で削除する（発行・無効化のたびにも実行）
+
+JSON（api_token.json と同じ形式）は import_store() / export_store() の入出力形式として残す。
+"""
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS api_tokens(
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      token_hash TEXT NOT NULL UNIQUE,
+      token TEXT NOT NULL,
+      station_id TEXT NOT NULL DEFAULT '',
+      issued_at TEXT,
+      note TEXT,
+      revoked_at TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS api_tokens_active_station_idx ON api_tokens(station_id) WHERE revoked_at IS NULL",
+    "CREATE INDEX IF NOT EXISTS api_tokens_revoked_at_idx ON api_tokens(revoked_at) WHERE revoked_at IS NOT NULL",
+)
+COLUMNS = ("token", "station_id", "issued_at", "note", "revoked_at")
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _now_iso() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _entry(row: sqlite3.Row) -> Dict[str, object]:
+    return {name: row[name] for name in COLUMNS}
+
+
+class SqliteTokenStore:
+    """Token table in a single SQLite file (one short-lived connection per call)."""
+
+    def __init__(self, path: Path, retention_days: int = 90) -> None:
+        self.path = Path(path)
+        self.retention_days = retention_days
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # ファイルが作り直された場合（削除・復元）もテーブルを用意する
+        initialized = self._initialized and self.path.exists()
+        conn = sqlite3.connect(str(self.path), timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            if not initialized:
+                for statement in SCHEMA:
+                    conn.execute(statement)
+                self._initialized = True
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """書き込みトランザクション（開始時に書き込みロックを取る）"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # --- 参照 ---
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT count(*) FROM api_tokens").fetchone()[0]
+
+    def all_entries(self) -> List[Dict[str, object]]:
+        with self._connect() as conn:
+            return [_entry(row) for row in conn.execute("SELECT * FROM api_tokens ORDER BY id")]
+
+    def active_entries(self) -> List[Dict[str, object]]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM api_tokens WHERE revoked_at IS NULL ORDER BY id")
+            return [_entry(row) for row in rows]
+
+    def find_active(self, token: str) -> Optional[Dict[str, object]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM api_tokens WHERE token_hash = ? AND revoked_at IS NULL",
+                (token_hash(token),),
+            ).fetchone()
+        return _entry(row) if row is not None else None
+
+    def has_active(self) -> bool:
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM api_tokens WHERE revoked_at IS NULL LIMIT 1").fetchone() is not None
+
+    # --- 更新 ---
+    def issue(self, token: str, station_id: str, note: Optional[str], keep_existing: bool) -> Dict[str, object]:
+        now = _now_iso()
+        with self._write() as conn:
+            if not keep_existing:
+                conn.execute("UPDATE api_tokens SET revoked_at = ? WHERE revoked_at IS NULL", (now,))
+            # 無効化済みの同じトークンを再発行した場合は、その行を有効に戻す
+            conn.execute(
+                """
+                INSERT INTO api_tokens(token_hash, token, station_id, issued_at, note, revoked_at)
+                VALUES (?, ?, ?, ?, ?, NULL)
+                ON CONFLICT(token_hash) DO UPDATE SET
+                  station_id = excluded.station_id, issued_at = excluded.issued_at,
+                  note = excluded.note, revoked_at = NULL
+                """,
+                (token_hash(token), token, station_id, now, note),
+            )
+            self._compact(conn)
+        return {"token": token, "station_id": station_id, "issued_at": now, "note": note, "revoked_at": None}
+
+    def revoke(self, token: Optional[str] = None, station_id: Optional[str] = None, all_tokens: bool = False) -> int:
+        now = _now_iso()
+        with self._write() as conn:
+            if all_tokens:
+                cur = conn.execute("UPDATE api_tokens SET revoked_at = ? WHERE revoked_at IS NULL", (now,))
+            else:
+                clauses, params = [], [now]
+                if token:
+                    clauses.append("token_hash = ?")
+                    params.append(token_hash(token))
+                if station_id:
+                    clauses.append("station_id = ?")
+                    params.append(station_id)
+                if not clauses:
+                    return 0
+                cur = conn.execute(
+                    f"UPDATE api_tokens SET revoked_at = ? WHERE revoked_at IS NULL AND ({' OR '.join(clauses)})",
+                    params,
+                )
+            updated = cur.rowcount
+            self._compact(conn)
+        return updated
+
+    def _compact(self, conn: sqlite3.Connection, retention_days: Optional[int] = None) -> int:
+        days = self.retention_days if retention_days is None else retention_days
+        if days < 0:
+            return 0
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds")
+        cur = conn.execute("DELETE FROM api_tokens WHERE revoked_at IS NOT NULL AND revoked_at < ?", (cutoff,))
+        return cur.rowcount
+
+    def compact(self, retention_days: Optional[int] = None) -> int:
+        """無効化から retention_days 日を過ぎた行を削除し、削除件数を返す"""
+        with self._write() as conn:
+            return self._compact(conn, retention_days)
+
+    # --- JSON 入出力 ---
+    def import_store(self, store: Dict[str, object], replace: bool = False) -> int:
+        """api_token.json 形式（{"tokens": [...]}）の内容を取り込む。既存と同じトークンは上書き"""
+        imported = 0
+        with self._write() as conn:
+            if replace:
+                conn.execute("DELETE FROM api_tokens")
+            for entry in store.get("tokens", []):
+                token = str(entry.get("token") or "")
+                if not token:
+                    continue
+                conn.execute(
+                    """
+                    INSERT INTO api_tokens(token_hash, token, station_id, issued_at, note, revoked_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(token_hash) DO UPDATE SET
+                      station_id = excluded.station_id, issued_at = excluded.issued_at,
+                      note = excluded.note, revoked_at = excluded.revoked_at
+                    """,
+                    (
+                        token_hash(token), token, str(entry.get("station_id") or ""),
+                        entry.get("issued_at"), entry.get("note"), entry.get("revoked_at"),
+                    ),
+                )
+                imported += 1
+        return imported
+
+    def export_store(self) -> Dict[str, object]:
+        return {"tokens": self.all_entries()}
+
+    def clear(self) -> None:
+        with self._write() as conn:
+            conn.execute("DELETE FROM api_tokens")
@@ -1,17 +1,36 @@
-"""API token storage utilities supporting multiple entries."""
+"""API token storage utilities supporting multiple entries.
+
+保存先（API_TOKEN_BACKEND）:
+- sqlite（既定）: API_TOKEN_DB の api_tokens テーブル（api_token_sqlite.SqliteTokenStore）。
+  初回作成時に API_TOKEN_FILE（api_token.json）があれば取り込む。
+- json: 従来どおり API_TOKEN_FILE に全件を書く。
+
+どちらでも api_token.json 形式を export_tokens() / import_tokens() で入出力できる。
+"""
 from __future__ import annotations
 
+import copy
+import hmac
 import json
 import os
 import secrets
-from datetime import datetime
+import sqlite3
+import threading
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+from api_token_sqlite import SqliteTokenStore
 
 API_TOKEN_FILE = Path(os.getenv("API_TOKEN_FILE", "/etc/toolmgmt/api_token.json"))
 API_TOKEN_HEADER = os.getenv("API_TOKEN_HEADER", "X-API-Token")
+API_TOKEN_BACKEND = os.getenv("API_TOKEN_BACKEND", "sqlite").strip().lower()
+API_TOKEN_DB = Path(os.getenv("API_TOKEN_DB", "/var/lib/toolmgmt/api_tokens.db"))
+# 無効化済みトークンを残す日数（これを過ぎたものは発行・無効化・compact 時に削除）
+API_TOKEN_RETENTION_DAYS = int(os.getenv("API_TOKEN_RETENTION_DAYS", "90"))
 SERVER_STATION_ID = os.getenv("STATION_ID", "")
 STORE_VERSION = 1
+BACKENDS = ("sqlite", "json")
 
 
 def _now_iso() -> str:
@@ -55,21 +74,37 @@ def _convert_legacy(data: Dict[str, object]) -> Dict[str, object]:
     return store
 
 
+# ファイル監視（file_watcher.WatchService）で変更が通知される場合だけ読み込み結果を保持する。
+# 監視していない CLI などでは従来どおり毎回ファイルを読む。
+_store_cache_lock = threading.Lock()
+_store_cache: Dict[str, object] = {"enabled": False, "store": None}
+
+
+def enable_store_cache(enabled: bool = True) -> None:
+    with _store_cache_lock:
+        _store_cache.update({"enabled": enabled, "store": None})
+
+
+def invalidate_store_cache() -> None:
+    with _store_cache_lock:
+        _store_cache["store"] = None
+
+
 def _load_store() -> Dict[str, object]:
+    with _store_cache_lock:
+        if not _store_cache["enabled"]:
+            return _read_store()
+        if _store_cache["store"] is None:
+            _store_cache["store"] = _read_store()
+        # 呼び出し側（issue_token など）が書き換えてもキャッシュに影響しないよう複製を返す
+        return copy.deepcopy(_store_cache["store"])
+
+
+def _read_store() -> Dict[str, object]:
     if not API_TOKEN_FILE.exists():
-        token = os.getenv("API_AUTH_TOKEN", "").strip()
-        if token:
-            entry = {
-                "token": token,
-                "station_id": SERVER_STATION_ID,
-                "issued_at": None,
-                "note": "env",  # env fallback
-                "revoked_at": None,
-            }
-            store = _default_store()
-            store["tokens"].append(entry)
-            store["source"] = "env"
-            return store
+        env = _env_store()
+        if env is not None:
+            return env
         store = _default_store()
         store["source"] = "none"
         return store
@@ -103,10 +138,81 @@ def _save_store(store: Dict[str, object]) -> None:
     store.pop("error", None)
     with API_TOKEN_FILE.open('w', encoding='utf-8') as fh:
         json.dump(store, fh, ensure_ascii=False, indent=2)
+    invalidate_store_cache()
+
+
+# =========================
+# 保存先の切り替え
+# =========================
+_sqlite_lock = threading.Lock()
+_sqlite_stores: Dict[tuple, SqliteTokenStore] = {}
+
+
+def backend_name() -> str:
+    return API_TOKEN_BACKEND if API_TOKEN_BACKEND in BACKENDS else "sqlite"
+
+
+def token_store_path() -> Path:
+    """現在の保存先ファイル（ファイル監視の対象）"""
+    return API_TOKEN_DB if backend_name() == "sqlite" else API_TOKEN_FILE
+
+
+def _sqlite() -> Optional[SqliteTokenStore]:
+    if backend_name() != "sqlite":
+        return None
+    key = (str(API_TOKEN_DB), API_TOKEN_RETENTION_DAYS)
+    with _sqlite_lock:
+        store = _sqlite_stores.get(key)
+        if store is None:
+            fresh = not API_TOKEN_DB.exists()
+            try:
+                API_TOKEN_DB.parent.mkdir(parents=True, exist_ok=True)
+            except PermissionError:
+                pass
+            store = SqliteTokenStore(API_TOKEN_DB, retention_days=API_TOKEN_RETENTION_DAYS)
+            if fresh and API_TOKEN_FILE.exists():
+                # 初回は既存の api_token.json を取り込む（JSON はそのまま残す）
+                legacy = _read_store()
+                if legacy.get("source") == "file":
+                    store.import_store(legacy)
+            _sqlite_stores[key] = store
+        return store
+
+
+def _env_store() -> Optional[Dict[str, object]]:
+    token = os.getenv("API_AUTH_TOKEN", "").strip()
+    if not token:
+        return None
+    store = _default_store()
+    store["tokens"].append({
+        "token": token,
+        "station_id": SERVER_STATION_ID,
+        "issued_at": None,
+        "note": "env",  # env fallback
+        "revoked_at": None,
+    })
+    store["source"] = "env"
+    return store
+
+
+def _current_store() -> Dict[str, object]:
+    """保存先に関係なく api_token.json 形式（{"tokens": [...], "source": ...}）で全件を返す"""
+    db = _sqlite()
+    if db is None:
+        return _load_store()
+    try:
+        if db.count() == 0:
+            env = _env_store()
+            if env is not None:
+                return env
+            return {"version": STORE_VERSION, "tokens": [], "source": "none"}
+        return {"version": STORE_VERSION, "tokens": db.all_entries(), "source": "sqlite"}
+    except sqlite3.Error as exc:
+        return {"version": STORE_VERSION, "tokens": [], "source": "error", "error": str(exc)}
 
 
 def list_tokens(with_token: bool = False) -> List[Dict[str, object]]:
-    store = _load_store()
+    store = _current_store()
     tokens = []
     for entry in store.get("tokens", []):
         item = {
@@ -122,6 +228,17 @@ def list_tokens(with_token: bool = False) -> List[Dict[str, object]]:
 
 
 def get_active_tokens() -> List[Dict[str, object]]:
+    db = _sqlite()
+    if db is not None:
+        try:
+            active = db.active_entries()
+            if not active and db.count() == 0:
+                env = _env_store()
+                return env["tokens"] if env else []
+            return active
+        except sqlite3.Error as exc:
+            print(f"[api-token] token table unavailable: {exc}")
+            return []
     store = _load_store()
     active = [entry for entry in store.get("tokens", []) if entry.get("revoked_at") is None and entry.get("token")]
     if store.get("source") == "env" and not active:
@@ -130,8 +247,39 @@ def get_active_tokens() -> List[Dict[str, object]]:
     return active
 
 
+def has_active_tokens() -> bool:
+    db = _sqlite()
+    if db is not None:
+        try:
+            if db.has_active():
+                return True
+        except sqlite3.Error as exc:
+            print(f"[api-token] token table unavailable: {exc}")
+            return False
+    return bool(get_active_tokens())
+
+
+def find_active_token(token: str) -> Optional[Dict[str, object]]:
+    """有効なトークンの行を返す（sqlite はハッシュ索引で 1 行だけ引く）"""
+    if not token:
+        return None
+    db = _sqlite()
+    if db is not None:
+        try:
+            found = db.find_active(token)
+        except sqlite3.Error as exc:
+            print(f"[api-token] token table unavailable: {exc}")
+            return None
+        if found is not None or db.count() > 0:
+            return found
+    for entry in get_active_tokens():
+        if hmac.compare_digest(str(entry.get("token", "")), token):
+            return entry
+    return None
+
+
 def get_token_info() -> Dict[str, object]:
-    store = _load_store()
+    store = _current_store()
     active = get_active_tokens()
     if active:
         entry = active[-1]
@@ -162,8 +310,11 @@ def generate_token() -> str:
 
 
 def issue_token(station_id: str, token: str | None = None, note: str | None = None, keep_existing: bool = False) -> Dict[str, object]:
-    store = _load_store()
     new_token = token or generate_token()
+    db = _sqlite()
+    if db is not None:
+        return db.issue(new_token, station_id, note, keep_existing)
+    store = _load_store()
     entries = store.get("tokens", [])
     if not keep_existing:
         now = _now_iso()
@@ -178,13 +329,16 @@ def issue_token(station_id: str, token: str | None = None, note: str | None = No
         "revoked_at": None,
     }
     entries.append(entry)
-    store["tokens"] = entries
+    store["tokens"] = _retained(entries, API_TOKEN_RETENTION_DAYS)
     store["source"] = "file"
     _save_store(store)
     return entry
 
 
 def revoke_token(token: str | None = None, station_id: str | None = None, all_tokens: bool = False) -> int:
+    db = _sqlite()
+    if db is not None:
+        return db.revoke(token=token, station_id=station_id, all_tokens=all_tokens)
     store = _load_store()
     updated = 0
     now = _now_iso()
@@ -204,13 +358,79 @@ def revoke_token(token: str | None = None, station_id: str | None = None, all_to
             updated += 1
 
     if updated:
-        store["tokens"] = entries
+        store["tokens"] = _retained(entries, API_TOKEN_RETENTION_DAYS)
         store["source"] = "file"
         _save_store(store)
     return updated
 
 
+def _retained(entries: List[Dict[str, object]], retention_days: int) -> List[Dict[str, object]]:
+    """無効化から retention_days 日を過ぎたエントリを除く（負の値なら除かない）"""
+    if retention_days < 0:
+        return entries
+    cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat(timespec="seconds")
+    return [entry for entry in entries if not entry.get("revoked_at") or str(entry["revoked_at"]) >= cutoff]
+
+
+def compact_tokens(retention_days: Optional[int] = None) -> int:
+    """保持期間を過ぎた無効化済みトークンを削除し、削除件数を返す"""
+    days = API_TOKEN_RETENTION_DAYS if retention_days is None else retention_days
+    db = _sqlite()
+    if db is not None:
+        return db.compact(days)
+    store = _load_store()
+    if store.get("source") != "file":
+        return 0
+    entries = store.get("tokens", [])
+    kept = _retained(entries, days)
+    if len(kept) != len(entries):
+        store["tokens"] = kept
+        _save_store(store)
+    return len(entries) - len(kept)
+
+
+def export_tokens(path: Optional[Path] = None) -> Path:
+    """全トークンを api_token.json 形式で書き出す（既定は API_TOKEN_FILE）"""
+    target = Path(path) if path is not None else API_TOKEN_FILE
+    store = _current_store()
+    payload = {"version": STORE_VERSION, "tokens": store.get("tokens", []) if store.get("source") != "env" else []}
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f".{target.name}.tmp")
+    tmp_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp_path, target)
+    if target == API_TOKEN_FILE:
+        invalidate_store_cache()
+    return target
+
+
+def import_tokens(path: Optional[Path] = None, replace: bool = False) -> int:
+    """api_token.json 形式のファイルを取り込む（同じトークンは上書き）。取り込んだ件数を返す"""
+    source = Path(path) if path is not None else API_TOKEN_FILE
+    data = json.loads(source.read_text(encoding="utf-8"))
+    incoming = data if isinstance(data, dict) and "tokens" in data else _convert_legacy(data if isinstance(data, dict) else {})
+    db = _sqlite()
+    if db is not None:
+        return db.import_store(incoming, replace=replace)
+    if source == API_TOKEN_FILE and not replace:
+        # json 保存先に自分自身を取り込む場合は何もしない
+        return len(incoming.get("tokens", []))
+    store = _load_store()
+    # env フォールバックやエラー時の内容は保存しない
+    existing = store.get("tokens", []) if store.get("source") == "file" and not replace else []
+    by_token = {entry["token"]: entry for entry in existing if entry.get("token")}
+    for entry in incoming.get("tokens", []):
+        if entry.get("token"):
+            by_token[entry["token"]] = dict(entry)
+    _save_store({"version": STORE_VERSION, "tokens": list(by_token.values())})
+    return len(incoming.get("tokens", []))
+
+
 def delete_token_file() -> None:
+    """保存先を空にする（json はファイル削除、sqlite は全行削除）"""
+    db = _sqlite()
+    if db is not None:
+        db.clear()
+        return
     if API_TOKEN_FILE.exists():
         API_TOKEN_FILE.unlink()
-
+    invalidate_store_cache()
@@ -1,45 +1,96 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+# eventlet / gevent で起動する場合は、他のモジュールより先に monkey patch する
+if __name__ == '__main__':
+    import server_mode
+    server_mode.prepare(server_mode.resolve_mode())
+
 import time
 import threading
 import json
 import csv
-from datetime import datetime
+import hashlib
+import io
+import ipaddress
+import math
+import mimetypes
+from datetime import date, datetime, timedelta
 from typing import Optional
-from functools import wraps
+from functools import lru_cache, wraps
 from typing import Optional
 import logging
 from pathlib import Path
-from flask import Flask, render_template, request, jsonify, has_request_context
+from flask import (
+    Blueprint,
+    Flask,
+    Response,
+    abort,
+    current_app,
+    render_template,
+    request,
+    jsonify,
+    has_request_context,
+    send_file,
+    stream_with_context,
+)
 from flask_socketio import SocketIO, emit
-import psycopg2
-from smartcard.CardRequest import CardRequest
-from smartcard.util import toHexString
 import os
 import subprocess
 import urllib.request
 from usb_sync import run_usb_sync
-from station_config import load_station_config, save_station_config
+from station_config import StationConfigStore
+from file_watcher import ChangeEvent, WatchService
 from api_token_store import (
     get_token_info,
-    get_active_tokens,
+    find_active_token,
+    has_active_tokens,
     list_tokens,
     issue_token,
     revoke_token,
-    API_TOKEN_FILE,
     API_TOKEN_HEADER,
+    enable_store_cache,
+    invalidate_store_cache,
+    backend_name as token_backend_name,
+    token_store_path,
+)
+from plan_cache import compile_plan_snapshots, maybe_refresh_plan_cache
+from plan_capacity import CapacityTimeline
+from plan_index import PlanIndex
+from rollups import ensure_rollup_tables, mark_rollups_dirty, refresh_rollups
+from scan_partitions import apply_retention, ensure_future_partitions, ensure_scan_events
+from plan_store import PlanHeaderError, load_table, partition_view, sort_plan, sort_standard_times
+from db_trace import traced_cursor
+from inventory import ToolInventory
+from loan_archive import ALL_LOANS_SQL, TOOL_LOCK_NAMESPACE, TOOL_LOCK_SQL, archive_returned_loans, archive_status, ensure_loan_archive
+from nfc_reader import get_reader
+from open_loans import OpenLoan, OpenLoanView
+from overdue import MAX_LIMIT_HOURS, OverdueEngine
+from prepared import StatementRegistry
+from server_mode import active_mode, offload, socketio_async_mode
+from static_assets import IMMUTABLE_CACHE_CONTROL, asset_url, manifest_version, resolve_asset
+from metrics import (
+    CONTENT_TYPE_LATEST,
+    DB_CONNECT_SECONDS,
+    DB_QUERY_SECONDS,
+    FRAGMENT_CACHE_LOOKUPS_TOTAL,
+    HTTP_REQUEST_SECONDS,
+    LOANS_OVERDUE_TOTAL,
+    OPEN_LOANS_RECONCILE_TOTAL,
+    SCAN_STAGE_SECONDS,
+    SOCKETIO_EMITS_TOTAL,
+    render_latest,
 )
-from plan_cache import maybe_refresh_plan_cache
 
 
 # =========================
 # 基本設定
 # =========================
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['DOCUMENT_VIEWER_URL'] = os.getenv("DOCUMENT_VIEWER_URL", "http://127.0.0.1:5000")
-socketio = SocketIO(app, cors_allowed_origins="*")
+# ルートは Blueprint に登録し、create_app() で Flask アプリに組み込む。
+# import 時にはネットワーク探索・ハードウェア・ログファイルに触れない。
+bp = Blueprint("toolmgmt", __name__)
+bp.add_app_template_global(asset_url)
+socketio = SocketIO()
 
 
 def _parse_bool(value: Optional[str], default: bool = True) -> bool:
@@ -53,14 +104,22 @@ LOG_PATH = Path(os.getenv(
     "API_AUDIT_LOG",
     str((Path(__file__).resolve().parent / "logs" / "api_actions.log").resolve())
 ))
-LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
-
-audit_logger = logging.getLogger("api_audit")
-if not audit_logger.handlers:
-    handler = logging.FileHandler(LOG_PATH, encoding="utf-8")
-    handler.setFormatter(logging.Formatter('%(asctime)s\t%(message)s'))
-    audit_logger.addHandler(handler)
-    audit_logger.setLevel(logging.INFO)
+_audit_logger_lock = threading.Lock()
+
+
+def get_audit_logger() -> logging.Logger:
+    """Return the audit logger, opening the log file on first use."""
+    audit_logger = logging.getLogger("api_audit")
+    if audit_logger.handlers:
+        return audit_logger
+    with _audit_logger_lock:
+        if not audit_logger.handlers:
+            LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+            handler = logging.FileHandler(LOG_PATH, encoding="utf-8")
+            handler.setFormatter(logging.Formatter('%(asctime)s\t%(message)s'))
+            audit_logger.addHandler(handler)
+            audit_logger.setLevel(logging.INFO)
+    return audit_logger
 
 # --- 生産計画/標準工数データ設定 ---
 PLAN_DATA_DIR = Path(os.getenv("PLAN_DATA_DIR", "/var/lib/toolmgmt/plan"))
@@ -77,6 +136,15 @@ PLAN_DATASETS = {
     },
 }
 
+# --- 工程設定（station.json）: メモリ上に保持し、保存は書き込み後にメモリへ反映 ---
+station_store = StationConfigStore()
+
+# --- ファイル監視（計画 CSV・API トークン・工程設定をまとめて 1 つの inotify で監視） ---
+FILE_WATCH_DEBOUNCE_SECONDS = float(os.getenv("FILE_WATCH_DEBOUNCE_SECONDS", "0.5"))
+# inotify が使えない環境でのみ使うポーリング間隔
+FILE_WATCH_POLL_SECONDS = float(os.getenv("FILE_WATCH_POLL_SECONDS", "2"))
+file_watch = WatchService(debounce=FILE_WATCH_DEBOUNCE_SECONDS, poll_interval=FILE_WATCH_POLL_SECONDS)
+
 # --- シャットダウンAPI用設定 ---
 SHUTDOWN_TOKEN = os.getenv("SHUTDOWN_TOKEN")  # 任意。必要なら systemd に環境変数を追加して使う
 ALLOWED_SHUTDOWN_ADDRS = {"127.0.0.1", "::1"}
@@ -117,17 +185,21 @@ def _discover_local_addresses():
 
     return addresses
 
-LOCAL_SHUTDOWN_ADDRS = _discover_local_addresses()
+@lru_cache(maxsize=1)
+def local_shutdown_addrs() -> frozenset:
+    """hostname -I / DNS による探索は初回のシャットダウン要求時に 1 度だけ行う"""
+    return frozenset(_discover_local_addresses())
 
 def _is_local_request():
     try:
         addr = request.remote_addr or ""
-        return addr in LOCAL_SHUTDOWN_ADDRS
+        return addr in local_shutdown_addrs()
     except Exception:
         return False
 
 
 def log_api_action(action: str, status: str = "success", detail=None) -> None:
+    audit_logger = get_audit_logger()
     if not audit_logger.handlers:
         return
 
@@ -154,17 +226,6 @@ def log_api_action(action: str, status: str = "success", detail=None) -> None:
 
 
 
-def _parse_due_date(value: str) -> Optional[datetime]:
-    if not value:
-        return None
-    for fmt in ("%Y-%m-%d", "%Y/%m/%d"):
-        try:
-            return datetime.strptime(value, fmt)
-        except ValueError:
-            continue
-    return None
-
-
 def load_plan_dataset(key: str) -> dict:
     cfg = PLAN_DATASETS[key]
     path = PLAN_DATA_DIR / cfg["filename"]
@@ -181,18 +242,13 @@ def load_plan_dataset(key: str) -> dict:
         return result
 
     try:
-        with path.open("r", encoding="utf-8-sig", newline="") as fh:
-            reader = csv.DictReader(fh)
-            headers = reader.fieldnames or []
-            if headers != cfg["columns"]:
-                result["error"] = (
-                    f"{cfg['label']}のヘッダーが想定と異なります: {headers}"
-                )
-                return result
-            rows = []
-            for row in reader:
-                normalized = {column: row.get(column, "") for column in cfg["columns"]}
-                rows.append(normalized)
+        # スナップショットが最新なら mmap で読み、なければ CSV を解析してスナップショットを作る
+        table = load_table(path, cfg["columns"])
+    except PlanHeaderError as exc:
+        result["error"] = (
+            f"{cfg['label']}のヘッダーが想定と異なります: {exc.headers}"
+        )
+        return result
     except FileNotFoundError:
         result["error"] = f"{cfg['label']}ファイルが見つかりません ({path})"
         return result
@@ -200,7 +256,9 @@ def load_plan_dataset(key: str) -> dict:
         result["error"] = f"{cfg['label']}の読み込みに失敗しました: {exc}"
         return result
 
-    result["rows"] = rows
+    # rows は列指向の PlanTable（row['部品番号'] の形で参照できる）
+    result["rows"] = table
+    result["source"] = table.source
     try:
         result["updated_at"] = datetime.fromtimestamp(path.stat().st_mtime).strftime("%Y-%m-%d %H:%M")
     except Exception:  # pylint: disable=broad-except
@@ -208,46 +266,135 @@ def load_plan_dataset(key: str) -> dict:
     return result
 
 
-def build_production_view() -> dict:
+def refresh_plan_cache() -> None:
     try:
         maybe_refresh_plan_cache()
     except Exception as exc:  # pylint: disable=broad-except
         print(f"[plan-cache] refresh skipped due to error: {exc}")
-    plan_data = load_plan_dataset("production_plan")
-    standard_data = load_plan_dataset("standard_times")
-
-    plan_entries = []
-    for row in plan_data["rows"]:
-        record = dict(row)
-        record["_sort_due"] = _parse_due_date(row.get("納期"))
-        plan_entries.append(record)
-
-    plan_entries.sort(key=lambda item: (
-        item["_sort_due"] if item["_sort_due"] else datetime.max,
-        item.get("製番", ""),
-    ))
-    for item in plan_entries:
-        item.pop("_sort_due", None)
-
-    standard_entries = []
-    for row in standard_data["rows"]:
-        record = dict(row)
-        record["_sort_key"] = (
-            record.get("部品番号", ""),
-            record.get("工程名", ""),
-        )
-        standard_entries.append(record)
 
-    standard_entries.sort(
-        key=lambda item: (
-            item["_sort_key"][0] or "",
-            item["_sort_key"][1] or "",
+
+# ファイル監視中は計画 CSV の変更通知が来るまでバージョンを保持する（stat もしない）
+_plan_version_state = {"watched": False, "version": None}
+
+
+def invalidate_plan_version() -> None:
+    _plan_version_state["version"] = None
+
+
+def plan_data_version() -> str:
+    """生産計画/標準工数 CSV のバージョン（パス・mtime・サイズのハッシュ）。
+
+    ファイルを読まずに stat だけで求まるため、リクエストごとに呼んでもよい。
+    ファイル監視中は変更通知（invalidate_plan_version）まで前回の値を返す。
+    """
+    cached = _plan_version_state["version"]
+    if _plan_version_state["watched"] and cached is not None:
+        return cached
+    version = _compute_plan_data_version()
+    if _plan_version_state["watched"]:
+        _plan_version_state["version"] = version
+    return version
+
+
+def _compute_plan_data_version() -> str:
+    digest = hashlib.sha1()
+    for key, cfg in PLAN_DATASETS.items():
+        path = PLAN_DATA_DIR / cfg["filename"]
+        try:
+            st = path.stat()
+            digest.update(f"{key}:{path}:{st.st_mtime_ns}:{st.st_size};".encode("utf-8"))
+        except OSError:
+            digest.update(f"{key}:{path}:missing;".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+# --- 計画データのバージョンごとに 1 度だけ作る派生データ（読み込み結果・索引など） ---
+_plan_derived_cache = {}
+_plan_derived_lock = threading.Lock()
+
+
+def plan_cached(name: str, build):
+    """Return ``build()`` for the current plan_data_version(), rebuilding only on a version change.
+
+    構築中に CSV が差し替わった場合は古いバージョンで保存され、次の呼び出しで作り直される。
+    """
+    version = plan_data_version()
+    with _plan_derived_lock:
+        cached = _plan_derived_cache.get(name)
+    if cached and cached[0] == version:
+        return cached[1]
+    value = build()
+    with _plan_derived_lock:
+        _plan_derived_cache[name] = (version, value)
+    return value
+
+
+def clear_plan_cache() -> None:
+    with _plan_derived_lock:
+        _plan_derived_cache.clear()
+
+
+def load_plan_datasets() -> dict:
+    """生産計画・標準工数の読み込み結果（{key: load_plan_dataset(key)}）"""
+    return plan_cached("datasets", lambda: {key: load_plan_dataset(key) for key in PLAN_DATASETS})
+
+
+def get_plan_index() -> PlanIndex:
+    """部品番号 / 製番 のハッシュ索引（計画データのバージョンごとに 1 度だけ構築）"""
+    def build() -> PlanIndex:
+        datasets = load_plan_datasets()
+        return PlanIndex(
+            datasets["production_plan"]["rows"] or None,
+            datasets["standard_times"]["rows"] or None,
         )
-    )
-    for item in standard_entries:
-        item.pop("_sort_key", None)
+    return plan_cached("index", build)
+
+
+def get_capacity_timeline() -> CapacityTimeline:
+    """納期 × 工程名 の工数集計（計画データのバージョンごとに 1 度だけ構築）"""
+    return plan_cached("capacity", lambda: CapacityTimeline(get_plan_index()))
+
+
+def get_plan_views() -> dict:
+    """並べ替え済みの表示順と、工程名ごとに分割した表示順（計画データのバージョンごとに 1 度だけ作る）"""
+    def build() -> dict:
+        datasets = load_plan_datasets()
+        plan_rows = datasets["production_plan"]["rows"]
+        standard_rows = datasets["standard_times"]["rows"]
+        # 行は複製せず、並び順（行番号の配列）だけを作る
+        plan_view = sort_plan(plan_rows) if plan_rows else []
+        standard_view = sort_standard_times(standard_rows) if standard_rows else []
+        return {
+            "plan": plan_view,
+            "standard": standard_view,
+            "plan_by_process": partition_view(plan_view, "工程名") if plan_rows else {},
+            "standard_by_process": partition_view(standard_view, "工程名") if standard_rows else {},
+        }
+    return plan_cached("views", build)
+
+
+def station_process() -> str:
+    return str(station_store.get().get("process") or "").strip()
+
+
+def build_production_view(refresh: bool = True, process: Optional[str] = None) -> dict:
+    """生産計画/標準工数の表示データ。process を指定するとその工程名の行だけを返す。"""
+    if refresh:
+        refresh_plan_cache()
+    datasets = load_plan_datasets()
+    plan_data = datasets["production_plan"]
+    standard_data = datasets["standard_times"]
+    views = get_plan_views()
+
+    if process:
+        plan_entries = views["plan_by_process"].get(process, [])
+        standard_entries = views["standard_by_process"].get(process, [])
+    else:
+        plan_entries = views["plan"]
+        standard_entries = views["standard"]
 
     return {
+        "process": process or "",
         "entries": plan_entries,
         "plan_entries": plan_entries,
         "standard_entries": standard_entries,
@@ -275,8 +422,7 @@ def require_api_token(action_name: str):
         def wrapper(*args, **kwargs):
             if not API_TOKEN_ENFORCEDD:
                 return func(*args, **kwargs)
-            active_tokens = get_active_tokens()
-            if active_tokens:
+            if has_active_tokens():
                 provided = _extract_provided_token()
                 if not provided:
                     log_api_action(
@@ -286,7 +432,7 @@ def require_api_token(action_name: str):
                     )
                     return jsonify({"error": "unauthorized"}), 401
 
-                matched = next((t for t in active_tokens if t.get("token") == provided), None)
+                matched = find_active_token(provided)
                 if not matched:
                     log_api_action(
                         action_name,
@@ -305,7 +451,27 @@ def require_api_token(action_name: str):
     return decorator
 
 DB = dict(host="127.0.0.1", port=5432, dbname="sensordb", user="app", password="app")
-GET_UID = [0xFF, 0xCA, 0x00, 0x00, 0x00]  # PC/SC: GET DATA (UID/IDm)
+# スキャン処理のタイミング（負荷試験ハーネスでは短縮する）
+SCAN_DEBOUNCE_SECONDS = float(os.getenv("SCAN_DEBOUNCE_SECONDS", "2"))
+SCAN_RESET_DELAY = float(os.getenv("SCAN_RESET_DELAY_SECONDS", "3"))
+SCAN_LOOP_INTERVAL = float(os.getenv("SCAN_LOOP_INTERVAL_SECONDS", "0.1"))
+# タップ処理の接続を使い回し、ホットパスの SQL を PREPARE しておく（0 で従来どおり SQL を毎回送る）
+DB_PREPARED_STATEMENTS = _parse_bool(os.getenv("DB_PREPARED_STATEMENTS", "1"), True)
+
+# 貸出中一覧（メモリ上の実体化ビュー）。DB との突き合わせ間隔（秒、0 以下で無効）
+OPEN_LOANS_RECONCILE_SECONDS = float(os.getenv("OPEN_LOANS_RECONCILE_SECONDS", "300"))
+open_loan_view = OpenLoanView()
+# 返却期限: 工具名ごとの上限（loan_limits）がなければこの時間（0 以下で期限なし）
+LOAN_MAX_HOURS_DEFAULT = float(os.getenv("LOAN_MAX_HOURS_DEFAULT", "72"))
+OVERDUE_CHECK_SECONDS = float(os.getenv("OVERDUE_CHECK_SECONDS", "60"))
+overdue_engine = OverdueEngine(default_hours=LOAN_MAX_HOURS_DEFAULT)
+open_loan_view.add_listener(overdue_engine.loans_changed)
+# scan_events の翌月以降のパーティション作成・保持期限の処理間隔（秒、0 以下で無効）
+SCAN_EVENTS_MAINTENANCE_SECONDS = float(os.getenv("SCAN_EVENTS_MAINTENANCE_SECONDS", "86400"))
+# Grafana 用集計表の更新間隔（秒、0 以下で無効）
+ROLLUP_INTERVAL_SECONDS = float(os.getenv("ROLLUP_INTERVAL_SECONDS", "300"))
+# 古い返却済みの貸出を loans_archive に移す間隔（秒、0 以下で無効）。loan_archive.py
+LOANS_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("LOANS_ARCHIVE_INTERVAL_SECONDS", "86400"))
 
 # グローバル状態
 scan_state = {
@@ -318,14 +484,71 @@ scan_state = {
 }
 
 
+def emit_event(event: str, payload: dict, **kwargs) -> None:
+    """socketio.emit wrapper that counts emitted events for /metrics.
+
+    サーバー側の socketio.emit は to/room を省略すれば全クライアントへ送る。
+    python-socketio 5 の Server.emit() は broadcast を受け付けず TypeError になるため取り除く。
+    """
+    kwargs.pop("broadcast", None)
+    SOCKETIO_EMITS_TOTAL.inc(event=event)
+    socketio.emit(event, payload, **kwargs)
+
+
 def emit_station_config_update(config: dict) -> None:
     """Broadcast station configuration update to connected clients."""
     try:
-        socketio.emit("station_config_updated", config, broadcast=True)
+        emit_event("station_config_updated", config)
     except Exception as exc:  # pylint: disable=broad-except
         print(f"[station-config] failed to broadcast update: {exc}")
 
 
+def emit_inventory_update(summaries: list) -> None:
+    """在庫数が変わった工具名の集計を配信する"""
+    try:
+        emit_event("inventory_updated", {"tools": summaries, "totals": tool_inventory.totals()})
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"[inventory] failed to broadcast update: {exc}")
+
+
+# 工具名ごとの在庫数（登録数・貸出中・在庫）。貸出・返却は貸出中ビューの変更通知で反映する
+tool_inventory = ToolInventory(on_change=emit_inventory_update)
+open_loan_view.add_listener(tool_inventory.loans_changed)
+
+
+def start_file_watch(flask_app: Flask) -> None:
+    """計画 CSV・API トークン・工程設定の変更を監視し、キャッシュを捨てて画面へ配信する"""
+    def on_plan_change(event: ChangeEvent) -> None:
+        invalidate_plan_version()
+        version = plan_data_version()
+        print(f"[watch] 計画データが更新されました: {[p.name for p in event.paths]} (version {version})")
+        with flask_app.app_context():
+            # 読み込み・索引・表示順を作り直してから、このステーションの工程の表を配信する
+            emit_production_view_update(station_process())
+
+    def on_token_change(_event: ChangeEvent) -> None:
+        invalidate_store_cache()
+        print("[watch] API トークンファイルが更新されました")
+        emit_event("api_token_updated", token_status())
+
+    def on_station_change(config: dict) -> None:
+        print(f"[watch] station.json が変更されました: process={config.get('process')!r}")
+        emit_station_config_update(config)
+        with flask_app.app_context():
+            emit_production_view_update(str(config.get("process") or ""))
+
+    file_watch.subscribe(
+        "plan", [PLAN_DATA_DIR / cfg["filename"] for cfg in PLAN_DATASETS.values()], on_plan_change
+    )
+    file_watch.subscribe("api_token", [token_store_path()], on_token_change)
+    station_store.watch(file_watch, on_station_change)
+    file_watch.start()
+    # 変更は通知で分かるので、以後はリクエストごとの stat / 読み直しをしない
+    _plan_version_state.update({"watched": True, "version": None})
+    enable_store_cache()
+    print(f"[watch] watching plan / api_token / station_config ({file_watch.backend})")
+
+
 def check_doc_viewer_health(url: str, timeout: float = 1.0) -> bool:
     """Return True if DocumentViewer /health endpoint responds."""
     if not url:
@@ -345,10 +568,12 @@ def check_doc_viewer_health(url: str, timeout: float = 1.0) -> bool:
 # --- DB接続: リトライ付き（最大30秒） ---
 def get_conn():
     import time
+    import psycopg2
     last_err = None
     for i in range(30):
         try:
-            conn = psycopg2.connect(**DB)
+            with DB_CONNECT_SECONDS.time():
+                conn = psycopg2.connect(**DB)
             return conn
         except Exception as e:
             last_err = e
@@ -357,11 +582,100 @@ def get_conn():
     # 30回失敗したら最後の例外を投げる
     raise last_err
 
+
+# --- ホットパスの SQL（prepared.py。PREPARE 済みの接続では名前で実行する） ---
+STATEMENTS = StatementRegistry()
+STATEMENTS.register("name_of_user", "SELECT full_name FROM users WHERE uid=%s", ("text",))
+STATEMENTS.register("name_of_tool", "SELECT name FROM tools WHERE uid=%s", ("text",))
+STATEMENTS.register(
+    "insert_scan", "INSERT INTO scan_events(tag_uid, role_hint) VALUES (%s,%s)", ("text", "text")
+)
+STATEMENTS.register("borrow_or_return.tool_lock", TOOL_LOCK_SQL, ("integer", "text"))
+STATEMENTS.register("borrow_or_return.find_open", """
+  SELECT id, borrower_uid FROM loans
+  WHERE tool_uid=%s AND returned_at IS NULL
+  ORDER BY loaned_at DESC LIMIT 1
+""", ("text",))
+STATEMENTS.register("borrow_or_return.return", """
+  UPDATE loans
+     SET returned_at=NOW(), return_user_uid=%s
+   WHERE id=%s
+""", ("text", "bigint"))
+# ビューに載せる行を一覧取得と同じ形で返す
+STATEMENTS.register("borrow_or_return.borrow", """
+  WITH ins AS (
+    INSERT INTO loans(tool_uid, borrower_uid) VALUES (%s,%s)
+    RETURNING id, tool_uid, borrower_uid, loaned_at
+  )
+  SELECT ins.id,
+         ins.tool_uid,
+         COALESCE(t.name, ins.tool_uid),
+         ins.borrower_uid,
+         COALESCE(u.full_name, ins.borrower_uid),
+         ins.loaned_at
+    FROM ins
+LEFT JOIN tools t ON t.uid=ins.tool_uid
+LEFT JOIN users u ON u.uid=ins.borrower_uid
+""", ("text", "text"))
+STATEMENTS.register("fetch_open_loans", """
+  SELECT l.id,
+         l.tool_uid,
+         COALESCE(t.name, l.tool_uid) AS tool_name,
+         l.borrower_uid,
+         COALESCE(u.full_name, l.borrower_uid) AS borrower_name,
+         l.loaned_at
+    FROM loans l
+LEFT JOIN tools t ON t.uid=l.tool_uid
+LEFT JOIN users u ON u.uid=l.borrower_uid
+   WHERE l.returned_at IS NULL
+ORDER BY l.loaned_at DESC
+   LIMIT %s
+""", ("bigint",))
+
+# タップ処理（scan_monitor）用に使い回す接続。DB_PREPARED_STATEMENTS=0 ではタップごとに接続する
+_tap_conn = None
+_tap_conn_lock = threading.Lock()
+
+
+def acquire_tap_conn():
+    """タップ処理用の接続を取得する。release_tap_conn() まで他のタップ処理は待つ"""
+    global _tap_conn
+    _tap_conn_lock.acquire()
+    try:
+        if not DB_PREPARED_STATEMENTS:
+            return get_conn()
+        if _tap_conn is None or _tap_conn.closed:
+            _tap_conn = get_conn()
+            STATEMENTS.prepare(_tap_conn)
+        return _tap_conn
+    except Exception:
+        _tap_conn_lock.release()
+        raise
+
+
+def release_tap_conn(conn) -> None:
+    """読み取りだけのトランザクションを閉じる。接続が壊れていれば次のタップで繋ぎ直す"""
+    global _tap_conn
+    try:
+        if conn is not _tap_conn:
+            conn.close()
+            return
+        try:
+            conn.rollback()
+        except Exception:  # pylint: disable=broad-except
+            _tap_conn = None
+            try:
+                conn.close()
+            except Exception:  # pylint: disable=broad-except
+                pass
+    finally:
+        _tap_conn_lock.release()
+
 def ensure_tables():
     """必要テーブルを作成"""
     conn = get_conn()
     try:
-        with conn, conn.cursor() as cur:
+        with conn, traced_cursor(conn, "ensure_tables") as cur:
             cur.execute("""
               CREATE TABLE IF NOT EXISTS users(
                 uid TEXT PRIMARY KEY,
@@ -374,21 +688,36 @@ def ensure_tables():
                 name TEXT UNIQUE NOT NULL
               )
             """)
+            # 工具名ごとの貸出上限時間（行がなければ LOAN_MAX_HOURS_DEFAULT）。USB 同期の
+            # TRUNCATE tool_master ... CASCADE で消えないよう、外部キーを付けずに別表で持つ
             cur.execute("""
-              CREATE TABLE IF NOT EXISTS tools(
-                uid TEXT PRIMARY KEY,
-                name TEXT NOT NULL REFERENCES tool_master(name) ON UPDATE CASCADE
+              CREATE TABLE IF NOT EXISTS loan_limits(
+                name TEXT PRIMARY KEY,
+                max_hours NUMERIC NOT NULL CHECK (max_hours > 0)
               )
             """)
+            # 以前の tool_master.max_loan_hours 列の値を移してから列を削除する
             cur.execute("""
-              CREATE TABLE IF NOT EXISTS scan_events(
-                id BIGSERIAL PRIMARY KEY,
-                ts TIMESTAMPTZ NOT NULL DEFAULT now(),
-                station_id TEXT NOT NULL DEFAULT 'pi1',
-                tag_uid TEXT NOT NULL,
-                role_hint TEXT CHECK (role_hint IN ('user','tool') OR role_hint IS NULL)
+              SELECT 1 FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = 'tool_master' AND column_name = 'max_loan_hours'
+            """)
+            if cur.fetchone():
+                cur.execute("""
+                  INSERT INTO loan_limits(name, max_hours)
+                  SELECT name, max_loan_hours FROM tool_master WHERE max_loan_hours IS NOT NULL
+                  ON CONFLICT (name) DO NOTHING
+                """)
+                cur.execute("ALTER TABLE tool_master DROP COLUMN max_loan_hours")
+            cur.execute("""
+              CREATE TABLE IF NOT EXISTS tools(
+                uid TEXT PRIMARY KEY,
+                name TEXT NOT NULL REFERENCES tool_master(name) ON UPDATE CASCADE
               )
             """)
+            # ts の月単位で分割（従来の表は scan_events_legacy として取り込む）。scan_partitions.py
+            created = ensure_scan_events(cur)
+            if created:
+                print(f"[scan_events] パーティションを作成しました: {', '.join(created)}")
             cur.execute("""
               CREATE TABLE IF NOT EXISTS loans(
                 id BIGSERIAL PRIMARY KEY,
@@ -399,100 +728,434 @@ def ensure_tables():
                 returned_at TIMESTAMPTZ
               )
             """)
+            # 貸出中（未返却）だけの部分索引。貸出中ビュー・期限監視の読み込みで使う
+            # （scripts/apply_db_tuning.sql と同じ定義）
+            cur.execute("CREATE INDEX IF NOT EXISTS loans_open_by_tool_idx ON loans (tool_uid) WHERE returned_at IS NULL")
+            cur.execute("CREATE INDEX IF NOT EXISTS loans_open_by_borrower_idx ON loans (borrower_uid) WHERE returned_at IS NULL")
+            # 返却から日数の経った貸出の移動先（loan_archive.py）
+            ensure_loan_archive(cur)
+            # Grafana 用の時間別・日別集計表（rollups.py）
+            ensure_rollup_tables(cur)
     finally:
         conn.close()
 
+@DB_QUERY_SECONDS.time(query="name_of_user")
 def name_of_user(conn, uid):
-    with conn.cursor() as cur:
-        cur.execute("SELECT full_name FROM users WHERE uid=%s", (uid,))
+    with traced_cursor(conn, "name_of_user") as cur:
+        STATEMENTS.execute(cur, "name_of_user", (uid,))
         r = cur.fetchone()
     return r[0] if r else uid
 
+@DB_QUERY_SECONDS.time(query="name_of_tool")
 def name_of_tool(conn, uid):
-    with conn.cursor() as cur:
-        cur.execute("SELECT name FROM tools WHERE uid=%s", (uid,))
+    with traced_cursor(conn, "name_of_tool") as cur:
+        STATEMENTS.execute(cur, "name_of_tool", (uid,))
         r = cur.fetchone()
     return r[0] if r else uid
 
+@DB_QUERY_SECONDS.time(query="list_tool_names")
 def list_tool_names(conn):
-    with conn.cursor() as cur:
+    with traced_cursor(conn, "list_tool_names") as cur:
         cur.execute("SELECT name FROM tool_master ORDER BY name ASC")
         return [r[0] for r in cur.fetchall()]
 
+@DB_QUERY_SECONDS.time(query="add_tool_name")
 def add_tool_name(conn, name):
-    with conn, conn.cursor() as cur:
+    with conn, traced_cursor(conn, "add_tool_name") as cur:
         cur.execute("INSERT INTO tool_master(name) VALUES(%s) ON CONFLICT(name) DO NOTHING", (name,))
+    tool_inventory.add_name(name)
 
+@DB_QUERY_SECONDS.time(query="delete_tool_name")
 def delete_tool_name(conn, name):
-    with conn, conn.cursor() as cur:
-        cur.execute("SELECT 1 FROM tools WHERE name=%s LIMIT 1", (name,))
+    with conn, traced_cursor(conn, "delete_tool_name") as cur:
+        cur.execute("SELECT 1 FROM tools WHERE name=%s LIMIT 1", (name,), name="delete_tool_name.check_in_use")
         if cur.fetchone():
             raise RuntimeError("この工具名は '工具' に割当済みです。先に tools 側を変更/削除してください。")
         cur.execute("DELETE FROM tool_master WHERE name=%s", (name,))
+    tool_inventory.remove_name(name)
 
+@DB_QUERY_SECONDS.time(query="insert_scan")
 def insert_scan(conn, uid, role=None):
-    with conn, conn.cursor() as cur:
-        cur.execute("INSERT INTO scan_events(tag_uid, role_hint) VALUES (%s,%s)", (uid, role))
+    with conn, traced_cursor(conn, "insert_scan") as cur:
+        STATEMENTS.execute(cur, "insert_scan", (uid, role))
 
+@DB_QUERY_SECONDS.time(query="borrow_or_return")
 def borrow_or_return(conn, user_uid, tool_uid):
-    """貸出中なら返却、未貸出なら貸出を登録"""
-    with conn, conn.cursor() as cur:
-        cur.execute("""
-          SELECT id, borrower_uid FROM loans
-          WHERE tool_uid=%s AND returned_at IS NULL
-          ORDER BY loaned_at DESC LIMIT 1
-        """, (tool_uid,))
+    """貸出中なら返却、未貸出なら貸出を登録（コミット後に貸出中ビューへ反映）"""
+    with conn, traced_cursor(conn, "borrow_or_return") as cur:
+        # 同じ工具の貸出・返却、loans_archive への移動と交差しないよう工具単位で直列化する
+        STATEMENTS.execute(cur, "borrow_or_return.tool_lock", (TOOL_LOCK_NAMESPACE, tool_uid))
+        STATEMENTS.execute(cur, "borrow_or_return.find_open", (tool_uid,))
         row = cur.fetchone()
         if row:  # 返却
             loan_id, prev_user = row
-            cur.execute("""
-              UPDATE loans
-                 SET returned_at=NOW(), return_user_uid=%s
-               WHERE id=%s
-            """, (user_uid, loan_id))
-            return "return", {"prev_user": prev_user}
+            STATEMENTS.execute(cur, "borrow_or_return.return", (user_uid, loan_id))
+            result = "return", {"prev_user": prev_user, "loan_id": loan_id}
         else:    # 新規貸出
-            cur.execute("""
-              INSERT INTO loans(tool_uid, borrower_uid) VALUES (%s,%s)
-            """, (tool_uid, user_uid))
-            return "borrow", {}
+            STATEMENTS.execute(cur, "borrow_or_return.borrow", (tool_uid, user_uid))
+            loan = OpenLoan.from_row(cur.fetchone())
+            result = "borrow", {"loan_id": loan.id}
+    # with conn: を抜けた時点でコミット済み
+    if result[0] == "return":
+        open_loan_view.remove(loan_id)
+    else:
+        open_loan_view.add(loan)
+    return result
 
+@DB_QUERY_SECONDS.time(query="fetch_open_loans")
 def fetch_open_loans(conn, limit=100):
-    with conn.cursor() as cur:
-        cur.execute("""
-          SELECT l.id,
-                 l.tool_uid,
-                 COALESCE(t.name, l.tool_uid) AS tool_name,
-                 l.borrower_uid,
-                 COALESCE(u.full_name, l.borrower_uid) AS borrower_name,
-                 l.loaned_at
-            FROM loans l
-       LEFT JOIN tools t ON t.uid=l.tool_uid
-       LEFT JOIN users u ON u.uid=l.borrower_uid
-           WHERE l.returned_at IS NULL
-        ORDER BY l.loaned_at DESC
-           LIMIT %s
-        """, (limit,))
+    """貸出中の行を DB から取得（limit=None で全件。通常の参照は open_loan_view を使う）"""
+    with traced_cursor(conn, "fetch_open_loans") as cur:
+        STATEMENTS.execute(cur, "fetch_open_loans", (limit,))
         return cur.fetchall()
 
+
+def reconcile_open_loans(conn=None) -> Optional[dict]:
+    """貸出中ビューを DB と突き合わせる（初回は読み込み）。差分、または途中で更新があれば None"""
+    since = open_loan_view.sequence
+    own_conn = conn is None
+    if own_conn:
+        conn = get_conn()
+    try:
+        rows = fetch_open_loans(conn, limit=None)
+        conn.rollback()
+    finally:
+        if own_conn:
+            conn.close()
+    diff = open_loan_view.reconcile(rows, since=since)
+    if diff is None:
+        OPEN_LOANS_RECONCILE_TOTAL.inc(result="skipped")
+    elif any(diff.values()):
+        OPEN_LOANS_RECONCILE_TOTAL.inc(result="drift")
+        print(f"[open-loans] DB との差分を反映しました: {diff}")
+    else:
+        OPEN_LOANS_RECONCILE_TOTAL.inc(result="in_sync")
+    return diff
+
+
+@DB_QUERY_SECONDS.time(query="fetch_inventory_rows")
+def fetch_inventory_rows(conn):
+    """在庫集計の元データ: tool_master の名前と tools の (uid, name)"""
+    with traced_cursor(conn, "fetch_inventory_rows") as cur:
+        cur.execute("SELECT name FROM tool_master", name="fetch_inventory_rows.names")
+        names = [r[0] for r in cur.fetchall()]
+        cur.execute("SELECT uid, name FROM tools", name="fetch_inventory_rows.tools")
+        tools = cur.fetchall()
+    return names, tools
+
+
+def reconcile_inventory(conn=None) -> None:
+    """工具名・工具を DB から読み直して在庫数を作り直す（貸出中は貸出中ビューから）"""
+    ensure_open_loan_view(conn)
+    own_conn = conn is None
+    if own_conn:
+        conn = get_conn()
+    try:
+        names, tools = fetch_inventory_rows(conn)
+        conn.rollback()
+    finally:
+        if own_conn:
+            conn.close()
+    open_loan_view.replay(lambda loans: tool_inventory.load(names, tools, [loan.tool_uid for loan in loans]))
+
+
+def reload_after_master_sync() -> None:
+    """USB 同期で users / tools / tool_master を入れ替えた後、上限時間・貸出中ビュー・在庫数を DB から読み直す"""
+    conn = get_conn()
+    try:
+        reload_loan_limits(conn)
+        reconcile_open_loans(conn)
+        reconcile_inventory(conn)
+    finally:
+        conn.close()
+
+
+@DB_QUERY_SECONDS.time(query="fetch_loan_limits")
+def fetch_loan_limits(conn):
+    with traced_cursor(conn, "fetch_loan_limits") as cur:
+        cur.execute("SELECT name, max_hours FROM loan_limits")
+        return {name: float(hours) for name, hours in cur.fetchall()}
+
+
+@DB_QUERY_SECONDS.time(query="set_loan_limit")
+def set_loan_limit(conn, name, hours):
+    """工具名の貸出上限時間を保存（None で既定値に戻す）し、期限を計算し直す"""
+    with conn, traced_cursor(conn, "set_loan_limit") as cur:
+        cur.execute("SELECT 1 FROM tool_master WHERE name=%s", (name,), name="set_loan_limit.check_name")
+        if cur.fetchone() is None:
+            raise RuntimeError(f"工具名が登録されていません: {name}")
+        if hours is None:
+            cur.execute("DELETE FROM loan_limits WHERE name=%s", (name,))
+        else:
+            cur.execute(
+                """
+                INSERT INTO loan_limits(name, max_hours) VALUES (%s, %s)
+                ON CONFLICT (name) DO UPDATE SET max_hours = EXCLUDED.max_hours
+                """,
+                (name, hours),
+            )
+    overdue_engine.set_limit(name, hours)
+
+
+def reload_loan_limits(conn=None) -> None:
+    own_conn = conn is None
+    if own_conn:
+        conn = get_conn()
+    try:
+        limits = fetch_loan_limits(conn)
+        conn.rollback()
+    finally:
+        if own_conn:
+            conn.close()
+    if limits != overdue_engine.limits():
+        overdue_engine.set_limits(limits)
+
+
+def check_overdue_loans() -> list:
+    """前回の確認から返却期限を過ぎた貸出を loan_overdue で配信し、配信できたもののリストを返す"""
+    delivered = []
+    for entry in overdue_engine.tick():
+        try:
+            emit_event("loan_overdue", entry)
+        except Exception as exc:  # pylint: disable=broad-except
+            # 未通知に戻し、次の確認で改めて配信する
+            overdue_engine.retry(entry["id"])
+            print(f"[overdue] failed to emit loan_overdue for loan {entry['id']}: {exc}")
+            continue
+        LOANS_OVERDUE_TOTAL.inc()
+        print(f"[overdue] 返却期限超過: {entry['tool']} ({entry['tool_uid']}) / {entry['borrower']}")
+        delivered.append(entry)
+    return delivered
+
+
+def overdue_monitor():
+    """OVERDUE_CHECK_SECONDS ごとに期限を迎えた貸出だけを確認する（DB には問い合わせない）"""
+    while True:
+        socketio.sleep(OVERDUE_CHECK_SECONDS)
+        try:
+            check_overdue_loans()
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f"[overdue] check failed: {exc}")
+
+
+@DB_QUERY_SECONDS.time(query="refresh_rollups")
+def run_rollup_refresh() -> dict:
+    conn = get_conn()
+    try:
+        return refresh_rollups(conn)
+    finally:
+        conn.close()
+
+
+def rollup_worker():
+    """ROLLUP_INTERVAL_SECONDS ごとに watermark 以降の集計を作り直す"""
+    while True:
+        try:
+            result = run_rollup_refresh()
+            if not result.get("skipped"):
+                print(f"[rollups] {result['from']} 以降を集計しました ({result['rows']} 行)")
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f"[rollups] refresh failed: {exc}")
+        socketio.sleep(ROLLUP_INTERVAL_SECONDS)
+
+
+def maintain_scan_events() -> dict:
+    """先の月のパーティションを作り、保持期限を過ぎた月を書き出し・切り離す"""
+    conn = get_conn()
+    try:
+        with conn, traced_cursor(conn, "scan_partitions.premake") as cur:
+            created = ensure_future_partitions(cur)
+        retired = apply_retention(conn)
+    finally:
+        conn.close()
+    return {"created": created, "retired": retired}
+
+
+def scan_events_maintenance():
+    while True:
+        try:
+            result = maintain_scan_events()
+            if result["created"] or result["retired"]:
+                print(f"[scan_events] {result}")
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f"[scan_events] maintenance failed: {exc}")
+        socketio.sleep(SCAN_EVENTS_MAINTENANCE_SECONDS)
+
+
+@DB_QUERY_SECONDS.time(query="archive_loans")
+def run_loan_archive() -> dict:
+    """返却から LOANS_ARCHIVE_AFTER_DAYS 日を過ぎた貸出を loans_archive に移す"""
+    conn = get_conn()
+    try:
+        result = archive_returned_loans(conn)
+        with conn, traced_cursor(conn, "loan_archive") as cur:
+            result.update(archive_status(cur))
+    finally:
+        conn.close()
+    return result
+
+
+def loan_archive_worker():
+    while True:
+        try:
+            result = run_loan_archive()
+            if result["moved"]:
+                print(f"[loan_archive] {result}")
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f"[loan_archive] archive failed: {exc}")
+        socketio.sleep(LOANS_ARCHIVE_INTERVAL_SECONDS)
+
+
+def ensure_inventory(conn=None) -> ToolInventory:
+    if not tool_inventory.loaded:
+        reconcile_inventory(conn)
+    return tool_inventory
+
+
+def ensure_open_loan_view(conn=None) -> OpenLoanView:
+    """未読み込みなら DB から読み込んでからビューを返す"""
+    if not open_loan_view.loaded:
+        reconcile_open_loans(conn)
+    return open_loan_view
+
+
+def open_loan_reconciler():
+    """OPEN_LOANS_RECONCILE_SECONDS ごとに貸出中ビューと在庫数を DB と突き合わせる"""
+    while True:
+        socketio.sleep(OPEN_LOANS_RECONCILE_SECONDS)
+        try:
+            reload_loan_limits()
+            reconcile_open_loans()
+            reconcile_inventory()
+        except Exception as exc:  # pylint: disable=broad-except
+            OPEN_LOANS_RECONCILE_TOTAL.inc(result="error")
+            print(f"[open-loans] reconcile failed: {exc}")
+
+@DB_QUERY_SECONDS.time(query="fetch_recent_history")
 def fetch_recent_history(conn, limit=50):
-    with conn.cursor() as cur:
+    """直近の貸出・返却。loans_archive 側は返却の新しい順に索引から limit 行だけ読む"""
+    with traced_cursor(conn, "fetch_recent_history") as cur:
         cur.execute("""
           SELECT CASE WHEN l.returned_at IS NULL THEN '貸出' ELSE '返却' END AS action,
                  COALESCE(t.name, l.tool_uid) AS tool,
                  COALESCE(u.full_name, l.borrower_uid) AS borrower,
                  l.loaned_at, l.returned_at
-            FROM loans l
+            FROM (
+                  (SELECT tool_uid, borrower_uid, loaned_at, returned_at
+                     FROM loans
+                 ORDER BY COALESCE(returned_at, loaned_at) DESC
+                    LIMIT %(limit)s)
+                  UNION ALL
+                  (SELECT tool_uid, borrower_uid, loaned_at, returned_at
+                     FROM loans_archive
+                 ORDER BY returned_at DESC
+                    LIMIT %(limit)s)
+                 ) l
        LEFT JOIN tools t ON t.uid=l.tool_uid
        LEFT JOIN users u ON u.uid=l.borrower_uid
         ORDER BY COALESCE(l.returned_at, l.loaned_at) DESC
-           LIMIT %s
-        """, (limit,))
+           LIMIT %(limit)s
+        """, {"limit": limit})
         return cur.fetchall()
 
+# --- 監査用 CSV エクスポート（サーバーサイドカーソルで逐次取得） ---
+EXPORT_ITERSIZE = int(os.getenv("EXPORT_ITERSIZE", "2000"))
+
+EXPORT_QUERIES = {
+    "loans": {
+        "header": ["id", "tool_uid", "tool_name", "borrower_uid", "borrower_name",
+                   "loaned_at", "return_user_uid", "return_user_name", "returned_at"],
+        "sql": """
+          SELECT l.id,
+                 l.tool_uid,
+                 COALESCE(t.name, l.tool_uid),
+                 l.borrower_uid,
+                 COALESCE(u.full_name, l.borrower_uid),
+                 l.loaned_at,
+                 l.return_user_uid,
+                 COALESCE(r.full_name, l.return_user_uid),
+                 l.returned_at
+            FROM """ + ALL_LOANS_SQL + """ l
+       LEFT JOIN tools t ON t.uid=l.tool_uid
+       LEFT JOIN users u ON u.uid=l.borrower_uid
+       LEFT JOIN users r ON r.uid=l.return_user_uid
+           WHERE l.loaned_at >= %s AND l.loaned_at < %s
+        ORDER BY l.loaned_at, l.id
+        """,
+    },
+    "scan_events": {
+        "header": ["id", "ts", "station_id", "tag_uid", "role_hint"],
+        "sql": """
+          SELECT id, ts, station_id, tag_uid, role_hint
+            FROM scan_events
+           WHERE ts >= %s AND ts < %s
+        ORDER BY ts, id
+        """,
+    },
+}
+
+
+def _parse_export_date(text: str) -> datetime:
+    try:
+        return datetime.strptime(text, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"日付は YYYY-MM-DD 形式で指定してください: {text}") from None
+
+
+def _parse_export_range(args) -> tuple:
+    """from/to (YYYY-MM-DD, to は当日を含む) を半開区間に変換する"""
+    start_text = (args.get("from") or "").strip()
+    end_text = (args.get("to") or "").strip()
+    start = _parse_export_date(start_text) if start_text else datetime(1970, 1, 1)
+    try:
+        end = _parse_export_date(end_text) + timedelta(days=1) if end_text else datetime(9999, 1, 1)
+    except OverflowError:  # to=9999-12-31 の翌日は datetime で表せない
+        raise ValueError("to は 9999-12-30 以前の日付を指定してください") from None
+    if end <= start:
+        raise ValueError("to は from 以降の日付を指定してください")
+    return start, end
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+
+def iter_export_rows(kind: str, start: datetime, end: datetime, itersize: int = EXPORT_ITERSIZE):
+    """名前付きカーソルで itersize 件ずつ取得し CSV テキストを逐次返す"""
+    query = EXPORT_QUERIES[kind]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(query["header"])
+    yield "\ufeff" + buffer.getvalue()
+
+    conn = get_conn()
+    try:
+        with traced_cursor(conn, f"export_{kind}", server_side=f"export_{kind}") as cur:
+            cur.itersize = itersize
+            cur.execute(query["sql"], (start, end))
+            pending = 0
+            buffer.seek(0)
+            buffer.truncate()
+            for row in cur:
+                writer.writerow([_csv_value(v) for v in row])
+                pending += 1
+                if pending >= itersize:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                    pending = 0
+            if pending:
+                yield buffer.getvalue()
+        conn.rollback()
+    finally:
+        conn.close()
+
+@DB_QUERY_SECONDS.time(query="complete_loan_manually")
 def complete_loan_manually(conn, loan_id):
     """スキャンせずに返却処理を行う"""
-    with conn, conn.cursor() as cur:
+    with conn, traced_cursor(conn, "complete_loan_manually") as cur:
         cur.execute("""
           UPDATE loans
              SET returned_at = NOW(),
@@ -503,45 +1166,136 @@ def complete_loan_manually(conn, loan_id):
         row = cur.fetchone()
         if not row:
             raise RuntimeError("対象の貸出が見つかりませんでした")
-        return row
+    open_loan_view.remove(loan_id)
+    return row
 
+@DB_QUERY_SECONDS.time(query="delete_open_loan")
 def delete_open_loan(conn, loan_id):
     """貸出中リストから該当レコードを削除"""
-    with conn, conn.cursor() as cur:
+    with conn, traced_cursor(conn, "delete_open_loan") as cur:
         cur.execute("""
           SELECT l.tool_uid,
-                 COALESCE(t.name, l.tool_uid) AS tool_name
+                 COALESCE(t.name, l.tool_uid) AS tool_name,
+                 l.loaned_at
             FROM loans l
        LEFT JOIN tools t ON t.uid = l.tool_uid
            WHERE l.id=%s AND l.returned_at IS NULL
-        """, (loan_id,))
+        """, (loan_id,), name="delete_open_loan.lookup")
         row = cur.fetchone()
         if not row:
             raise RuntimeError("貸出中のレコードが見つかりません")
 
-        tool_uid, tool_name = row
-        cur.execute("DELETE FROM loans WHERE id=%s", (loan_id,))
-        return tool_uid, tool_name
+        tool_uid, tool_name, loaned_at = row
+        cur.execute("DELETE FROM loans WHERE id=%s", (loan_id,), name="delete_open_loan.delete")
+        # 確定済みの集計から貸出件数を減らすため、貸出日時の時間帯から作り直させる
+        mark_rollups_dirty(cur, loaned_at)
+    open_loan_view.remove(loan_id)
+    return tool_uid, tool_name
 
 # =========================
 # NFCスキャン機能
 # =========================
 def read_one_uid(timeout=3):
-    """NFCタグを読み取り"""
+    """NFCタグを読み取り（NFC_READER_BACKEND で実機/疑似リーダーを切替）"""
+    # pyscard は C 拡張でブロックするため、eventlet/gevent 時は OS スレッドで待つ
+    return offload(get_reader().read_one_uid, timeout=timeout)
+
+
+def _reset_scan_state():
+    scan_state["user_uid"] = ""
+    scan_state["tool_uid"] = ""
+    scan_state["message"] = "📡 スキャン待機中... ユーザータグをかざしてください"
+    emit_event('state_reset', {
+        'message': scan_state["message"]
+    })
+    print("🔄 次の処理待ち")
+
+
+def _schedule_scan_reset():
+    if SCAN_RESET_DELAY <= 0:
+        _reset_scan_state()
+        return
+
+    def reset_later():
+        time.sleep(SCAN_RESET_DELAY)
+        _reset_scan_state()
+
+    threading.Thread(target=reset_later, daemon=True).start()
+
+
+def process_tap(uid):
+    """読み取った UID 1 件をユーザー→工具→貸出/返却の流れで処理する"""
+    # 連続スキャン防止
+    current_time = time.time()
+    if uid == scan_state["last_scanned_uid"] and (current_time - scan_state["last_scan_time"]) < SCAN_DEBOUNCE_SECONDS:
+        return
+        
+    scan_state["last_scanned_uid"] = uid
+    scan_state["last_scan_time"] = current_time
+    tap_started = time.perf_counter()
+    
+    with SCAN_STAGE_SECONDS.time(stage="connect"):
+        conn = acquire_tap_conn()
     try:
-        cs = CardRequest(timeout=timeout, newcardonly=True).waitforcard()
-        if cs is None:
-            return None
-        cs.connection.connect()
-        data, sw1, sw2 = cs.connection.transmit(GET_UID)
-        cs.connection.disconnect()
-        if ((sw1 << 8) | sw2) == 0x9000 and data:
-            return toHexString(data).replace(" ", "")
-    except Exception as e:
-        # タイムアウトエラーは表示しない（正常動作）
-        if "Time-out" not in str(e) and "Command timeout" not in str(e):
-            print(f"スキャンエラー: {e}")
-    return None
+        # ユーザーがまだ設定されていない場合
+        if not scan_state["user_uid"]:
+            with SCAN_STAGE_SECONDS.time(stage="user_scan"):
+                scan_state["user_uid"] = uid
+                scan_state["message"] = f"👤 ユーザー読取: {name_of_user(conn, uid)} ({uid})"
+                insert_scan(conn, uid, "user")
+            
+            with SCAN_STAGE_SECONDS.time(stage="emit"):
+                emit_event('scan_update', {
+                    'user_uid': scan_state["user_uid"],
+                    'user_name': name_of_user(conn, uid),
+                    'tool_uid': scan_state["tool_uid"],
+                    'tool_name': "",
+                    'message': scan_state["message"]
+                })
+            SCAN_STAGE_SECONDS.observe(time.perf_counter() - tap_started, stage="tap_to_emit")
+            
+        # ユーザーが設定済みで工具がまだの場合
+        elif not scan_state["tool_uid"]:
+            with SCAN_STAGE_SECONDS.time(stage="tool_scan"):
+                scan_state["tool_uid"] = uid
+                scan_state["message"] = f"🛠️ 工具読取: {name_of_tool(conn, uid)} ({uid})"
+                insert_scan(conn, uid, "tool")
+            
+            # 両方揃った場合は自動実行
+            try:
+                with SCAN_STAGE_SECONDS.time(stage="borrow_or_return"):
+                    action, info = borrow_or_return(conn, scan_state["user_uid"], scan_state["tool_uid"])
+                emit_started = time.perf_counter()
+                if action == "borrow":
+                    message = f"✅ 貸出：{name_of_tool(conn, scan_state['tool_uid'])} → {name_of_user(conn, scan_state['user_uid'])}"
+                else:
+                    message = f"✅ 返却：{name_of_tool(conn, scan_state['tool_uid'])} by {name_of_user(conn, scan_state['user_uid'])}（借用者: {name_of_user(conn, info.get('prev_user',''))}）"
+                
+                emit_event('transaction_complete', {
+                    'user_uid': scan_state["user_uid"],
+                    'user_name': name_of_user(conn, scan_state["user_uid"]),
+                    'tool_uid': scan_state["tool_uid"],
+                    'tool_name': name_of_tool(conn, scan_state["tool_uid"]),
+                    'message': message,
+                    'action': action
+                })
+                emitted = time.perf_counter()
+                SCAN_STAGE_SECONDS.observe(emitted - emit_started, stage="emit")
+                SCAN_STAGE_SECONDS.observe(emitted - tap_started, stage="tap_to_emit")
+                
+                print(f"✅ 処理完了: {message}")
+                
+                # 一定時間後にリセット
+                _schedule_scan_reset()
+                
+            except Exception as e:
+                error_msg = f"❌ エラー: {e}"
+                print(error_msg)
+                emit_event('error', {'message': error_msg})
+                
+    finally:
+        release_tap_conn(conn)
+
 
 def scan_monitor():
     """バックグラウンドでNFCスキャンを監視"""
@@ -555,75 +1309,7 @@ def scan_monitor():
         try:
             uid = read_one_uid(timeout=1)
             if uid:
-                # 連続スキャン防止
-                current_time = time.time()
-                if uid == scan_state["last_scanned_uid"] and (current_time - scan_state["last_scan_time"]) < 2:
-                    continue
-                    
-                scan_state["last_scanned_uid"] = uid
-                scan_state["last_scan_time"] = current_time
-                
-                conn = get_conn()
-                try:
-                    # ユーザーがまだ設定されていない場合
-                    if not scan_state["user_uid"]:
-                        scan_state["user_uid"] = uid
-                        scan_state["message"] = f"👤 ユーザー読取: {name_of_user(conn, uid)} ({uid})"
-                        insert_scan(conn, uid, "user")
-                        
-                        socketio.emit('scan_update', {
-                            'user_uid': scan_state["user_uid"],
-                            'user_name': name_of_user(conn, uid),
-                            'tool_uid': scan_state["tool_uid"],
-                            'tool_name': "",
-                            'message': scan_state["message"]
-                        })
-                        
-                    # ユーザーが設定済みで工具がまだの場合
-                    elif not scan_state["tool_uid"]:
-                        scan_state["tool_uid"] = uid
-                        scan_state["message"] = f"🛠️ 工具読取: {name_of_tool(conn, uid)} ({uid})"
-                        insert_scan(conn, uid, "tool")
-                        
-                        # 両方揃った場合は自動実行
-                        try:
-                            action, info = borrow_or_return(conn, scan_state["user_uid"], scan_state["tool_uid"])
-                            if action == "borrow":
-                                message = f"✅ 貸出：{name_of_tool(conn, scan_state['tool_uid'])} → {name_of_user(conn, scan_state['user_uid'])}"
-                            else:
-                                message = f"✅ 返却：{name_of_tool(conn, scan_state['tool_uid'])} by {name_of_user(conn, scan_state['user_uid'])}（借用者: {name_of_user(conn, info.get('prev_user',''))}）"
-                            
-                            socketio.emit('transaction_complete', {
-                                'user_uid': scan_state["user_uid"],
-                                'user_name': name_of_user(conn, scan_state["user_uid"]),
-                                'tool_uid': scan_state["tool_uid"],
-                                'tool_name': name_of_tool(conn, scan_state["tool_uid"]),
-                                'message': message,
-                                'action': action
-                            })
-                            
-                            print(f"✅ 処理完了: {message}")
-                            
-                            # 3秒後にリセット
-                            def reset_state():
-                                time.sleep(3)
-                                scan_state["user_uid"] = ""
-                                scan_state["tool_uid"] = ""
-                                scan_state["message"] = "📡 スキャン待機中... ユーザータグをかざしてください"
-                                socketio.emit('state_reset', {
-                                    'message': scan_state["message"]
-                                })
-                                print("🔄 次の処理待ち")
-                            
-                            threading.Thread(target=reset_state, daemon=True).start()
-                            
-                        except Exception as e:
-                            error_msg = f"❌ エラー: {e}"
-                            print(error_msg)
-                            socketio.emit('error', {'message': error_msg})
-                            
-                finally:
-                    conn.close()
+                process_tap(uid)
                     
         except Exception as e:
             # 重要でないエラーは表示しない
@@ -631,31 +1317,265 @@ def scan_monitor():
                 print(f"スキャンループエラー: {e}")
             time.sleep(1)
         
-        time.sleep(0.1)
+        time.sleep(SCAN_LOOP_INTERVAL)
 
 # =========================
 # Webルート
 # =========================
-@app.route('/')
+@bp.before_app_request
+def _start_request_timer():
+    request.environ["toolmgmt.request_started"] = time.perf_counter()
+
+
+@bp.after_app_request
+def _observe_request_latency(response):
+    started = request.environ.get("toolmgmt.request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route,
+            status=str(response.status_code),
+        )
+    return response
+
+
+# /metrics を返す接続元（カンマ区切りの CIDR）。既定はループバックと docker のブリッジ
+# （prometheus コンテナは host.docker.internal = ブリッジのゲートウェイ経由で収集する）
+METRICS_ALLOWED_NETWORKS = tuple(
+    ipaddress.ip_network(cidr.strip(), strict=False)
+    for cidr in os.getenv("METRICS_ALLOWED_NETWORKS", "127.0.0.0/8,::1/128,172.16.0.0/12").split(",")
+    if cidr.strip()
+)
+
+
+def _metrics_client_allowed(addr: Optional[str]) -> bool:
+    try:
+        ip = ipaddress.ip_address(addr or "")
+    except ValueError:
+        return False
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return any(ip in network for network in METRICS_ALLOWED_NETWORKS)
+
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition format（METRICS_ALLOWED_NETWORKS 以外からは 403）"""
+    if not _metrics_client_allowed(request.remote_addr):
+        return Response("forbidden\n", status=403, content_type="text/plain; charset=utf-8")
+    return Response(render_latest(), content_type=CONTENT_TYPE_LATEST)
+
+
+# --- 描画済みフラグメントのキャッシュ（データのバージョンごとに 1 つ保持） ---
+_fragment_cache = {}
+_fragment_cache_lock = threading.Lock()
+
+
+def cached_fragment(name: str, version: str, render) -> str:
+    """Return the rendered fragment for ``version``, rendering it only on a version change."""
+    with _fragment_cache_lock:
+        cached = _fragment_cache.get(name)
+    if cached and cached[0] == version:
+        FRAGMENT_CACHE_LOOKUPS_TOTAL.inc(fragment=name, result="hit")
+        return cached[1]
+    FRAGMENT_CACHE_LOOKUPS_TOTAL.inc(fragment=name, result="miss")
+    html = render()
+    with _fragment_cache_lock:
+        _fragment_cache[name] = (version, html)
+    return html
+
+
+def clear_fragment_cache() -> None:
+    with _fragment_cache_lock:
+        _fragment_cache.clear()
+
+
+def _not_modified(etag: str) -> Optional[Response]:
+    """If-None-Match が一致すれば本文なしの 304 を返す（描画処理ごと省略する）"""
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+    return None
+
+
+def _versioned(response: Response, etag: str) -> Response:
+    response.set_etag(etag)
+    # 常に再検証させる（変更がなければ 304 で本文を送らない）
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@bp.route('/')
 def index():
-    doc_viewer_url = app.config.get('DOCUMENT_VIEWER_URL')
-    doc_viewer_online = check_doc_viewer_health(doc_viewer_url)
-    production_view = build_production_view()
-    station_config = load_station_config()
+    """計画データを含まない画面シェル。データは下記 JSON API から表示後に取得する。"""
+    doc_viewer_url = current_app.config.get('DOCUMENT_VIEWER_URL') or ''
     token_info = get_token_info()
-    return render_template(
+    api_token_required = API_TOKEN_ENFORCED and bool(token_info.get("token"))
+    version = hashlib.sha1(
+        json.dumps([doc_viewer_url, api_token_required, API_TOKEN_HEADER, manifest_version()]).encode("utf-8")
+    ).hexdigest()[:16]
+    etag = f"shell-{version}"
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    html = cached_fragment("index_shell", version, lambda: render_template(
         'index.html',
         doc_viewer_url=doc_viewer_url,
-        doc_viewer_online=doc_viewer_online,
-        api_token_required=API_TOKEN_ENFORCED and bool(token_info.get("token")),
+        api_token_required=api_token_required,
         api_token_header=API_TOKEN_HEADER,
-        api_station_id=token_info.get("station_id", ""),
-        api_token_error=token_info.get("error"),
-        production_view=production_view,
-        station_config=station_config,
+    ))
+    return _versioned(Response(html, mimetype="text/html"), etag)
+
+
+@bp.route('/assets/<path:filename>')
+def fingerprinted_asset(filename):
+    """ハッシュ付き静的ファイル。圧縮済み (.br/.gz) があれば Accept-Encoding に応じてそのまま返す。"""
+    resolved = resolve_asset(filename, request.headers.get("Accept-Encoding", ""))
+    if resolved is None:
+        abort(404)
+    path, encoding = resolved
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    response = send_file(path, mimetype=mimetype, conditional=True)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def production_view_body(process: str, version: str) -> str:
+    """/api/production_view の JSON 本文（計画データのバージョン × 工程ごとにキャッシュ）"""
+    def render() -> str:
+        production_view = build_production_view(refresh=False, process=process)
+        return json.dumps({
+            "version": version,
+            "process": process,
+            "plan_count": len(production_view["plan_entries"]),
+            "standard_count": len(production_view["standard_entries"]),
+            "plan_error": production_view["plan_error"],
+            "standard_error": production_view["standard_error"],
+            "plan_updated_at": production_view["plan_updated_at"],
+            "standard_updated_at": production_view["standard_updated_at"],
+            "html": render_template('partials/production_dashboard.html', production_view=production_view),
+        }, ensure_ascii=False)
+
+    return cached_fragment(f"production_view:{process or '*'}", version, render)
+
+
+def _requested_process() -> str:
+    """?process= 指定 > ?all=1（全工程） > 工程設定（station.json）の工程"""
+    if request.args.get("process") is not None:
+        return request.args.get("process", "").strip()
+    if request.args.get("all") == "1":
+        return ""
+    return station_process()
+
+
+@bp.route('/api/production_view')
+def api_production_view():
+    """生産計画/標準工数の表（描画済み HTML）とメタ情報。既定ではこのステーションの工程の行だけを返す。
+
+    CSV と工程が変わらない限り 304 / キャッシュ応答。
+    """
+    refresh_plan_cache()
+    process = _requested_process()
+    version = plan_data_version()
+    etag = "plan-{}-{}".format(version, hashlib.sha1(process.encode("utf-8")).hexdigest()[:8])
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    body = production_view_body(process, version)
+    return _versioned(Response(body, mimetype="application/json"), etag)
+
+
+def emit_production_view_update(process: str) -> None:
+    """工程の切り替え後、その工程の計画表を配信する（CSV は読み直さず分割済みの表示順を使う）"""
+    try:
+        body = production_view_body(process, plan_data_version())
+        emit_event("production_view_updated", json.loads(body))
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"[plan] failed to push production view: {exc}")
+
+
+@bp.route('/api/plan/lookup')
+def api_plan_lookup():
+    """部品番号 (part) / 製番 (order) で生産計画と結合済みの標準工数を引く"""
+    part = (request.args.get("part") or "").strip()
+    order = (request.args.get("order") or "").strip()
+    if not part and not order:
+        return jsonify({"error": "part または order を指定してください"}), 400
+    refresh_plan_cache()
+    version = plan_data_version()
+    result = get_plan_index().lookup(part=part, order=order)
+    result["version"] = version
+    return jsonify(result)
+
+
+def _parse_iso_date(value: Optional[str]) -> Optional[date]:
+    value = (value or "").strip()
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+@bp.route('/api/plan/capacity')
+def api_plan_capacity():
+    """納期 × 工程名 の機械標準工数（個数 × 機械標準工数）の日別集計
+
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD（両端を含む）または ?from=...&days=N、
+    ?process=切削,研磨 で工程を絞り込む（省略時は全工程）。
+    """
+    try:
+        start = _parse_iso_date(request.args.get("from"))
+        end = _parse_iso_date(request.args.get("to"))
+        days = request.args.get("days")
+        if days:
+            span = int(days)
+            if span < 1:
+                raise ValueError("days は 1 以上で指定してください")
+            start = start or date.today()
+            end = start + timedelta(days=span - 1)
+    except ValueError as exc:
+        return jsonify({"error": f"期間の指定が不正です: {exc}"}), 400
+    if start and end and end < start:
+        return jsonify({"error": "to は from 以降の日付を指定してください"}), 400
+
+    processes = request.args.get("process")
+    refresh_plan_cache()
+    version = plan_data_version()
+    result = get_capacity_timeline().query(
+        start, end, [name.strip() for name in processes.split(",")] if processes else None
     )
+    result["version"] = version
+    return jsonify(result)
+
+
+def token_status() -> dict:
+    """画面表示用の API トークン状態（トークン文字列は返さない）"""
+    token_info = get_token_info()
+    return {
+        "required": API_TOKEN_ENFORCED and bool(token_info.get("token")),
+        "header": API_TOKEN_HEADER,
+        "station_id": token_info.get("station_id", ""),
+        "error": token_info.get("error"),
+    }
+
+
+@bp.route('/api/token_status')
+def api_token_status():
+    return jsonify(token_status())
+
 
-@app.route('/api/start_scan', methods=['POST'])
+@bp.route('/api/doc_viewer_status')
+def api_doc_viewer_status():
+    doc_viewer_url = current_app.config.get('DOCUMENT_VIEWER_URL') or ''
+    return jsonify({"url": doc_viewer_url, "online": check_doc_viewer_health(doc_viewer_url)})
+
+@bp.route('/api/start_scan', methods=['POST'])
 @require_api_token("start_scan")
 def start_scan():
     global scan_state
@@ -667,7 +1587,7 @@ def start_scan():
     log_api_action("start_scan", detail={"message": scan_state["message"]})
     return jsonify({"status": "started", "message": scan_state["message"]})
 
-@app.route('/api/stop_scan', methods=['POST'])
+@bp.route('/api/stop_scan', methods=['POST'])
 @require_api_token("stop_scan")
 def stop_scan():
     global scan_state
@@ -677,7 +1597,7 @@ def stop_scan():
     log_api_action("stop_scan", detail={"message": scan_state["message"]})
     return jsonify({"status": "stopped", "message": scan_state["message"]})
 
-@app.route('/api/reset', methods=['POST'])
+@bp.route('/api/reset', methods=['POST'])
 @require_api_token("reset_state")
 def reset_state():
     global scan_state
@@ -688,21 +1608,15 @@ def reset_state():
     log_api_action("reset_state")
     return jsonify({"status": "reset"})
 
-@app.route('/api/loans')
+@bp.route('/api/loans')
 def get_loans():
     conn = get_conn()
     try:
-        open_loans = fetch_open_loans(conn)
+        # 貸出中一覧はメモリ上のビューから返す（DB は履歴の取得だけ）
+        open_loans = ensure_open_loan_view(conn).list(limit=100)
         history = fetch_recent_history(conn)
         return jsonify({
-            "open_loans": [{
-                "id": r[0],
-                "tool_uid": r[1],
-                "tool": r[2],
-                "borrower_uid": r[3],
-                "borrower": r[4],
-                "loaned_at": r[5].isoformat()
-            } for r in open_loans],
+            "open_loans": [loan.as_dict() for loan in open_loans],
             "history": [{
                 "action": r[0], "tool": r[1], "borrower": r[2], 
                 "loaned_at": r[3].isoformat(), 
@@ -713,15 +1627,165 @@ def get_loans():
         conn.close()
 
 
-@app.route('/api/station_config', methods=['GET'])
+@bp.route('/api/loans/open')
+def get_open_loans():
+    """貸出中一覧の全件（DB に問い合わせない）"""
+    view = ensure_open_loan_view()
+    return jsonify({"open_loans": [loan.as_dict() for loan in view.list()], "count": len(view)})
+
+
+@bp.route('/api/loans/tool/<tool_uid>')
+def get_tool_holder(tool_uid):
+    """工具を誰が借りているか（貸出中でなければ loan は null）"""
+    loan = ensure_open_loan_view().holder_of(tool_uid)
+    return jsonify({"tool_uid": tool_uid, "loan": loan.as_dict() if loan else None})
+
+
+@bp.route('/api/loans/user/<user_uid>')
+def get_user_loans(user_uid):
+    """ユーザーが借りている工具の一覧"""
+    loans = ensure_open_loan_view().held_by(user_uid)
+    return jsonify({"user_uid": user_uid, "open_loans": [loan.as_dict() for loan in loans]})
+
+
+@bp.route('/api/inventory')
+def get_inventory():
+    """工具名ごとの登録数・在庫・貸出中（DB に問い合わせない）"""
+    inventory = ensure_inventory()
+    return jsonify({"tools": inventory.summaries(), "totals": inventory.totals()})
+
+
+@bp.route('/api/inventory/<path:name>')
+def get_inventory_for_name(name):
+    summary = ensure_inventory().summary(name)
+    if summary is None:
+        return jsonify({"error": f"工具名が登録されていません: {name}"}), 404
+    return jsonify(summary)
+
+
+@bp.route('/api/overdue')
+def get_overdue_loans():
+    """返却期限を過ぎている貸出（期限の古い順）"""
+    ensure_open_loan_view()
+    check_overdue_loans()
+    overdue = overdue_engine.overdue()
+    next_deadline = overdue_engine.next_deadline()
+    return jsonify({
+        "overdue": overdue,
+        "count": len(overdue),
+        "default_hours": overdue_engine.default_hours,
+        "next_due_at": next_deadline.isoformat() if next_deadline else None,
+    })
+
+
+@bp.route('/api/loan_limits')
+def get_loan_limits():
+    return jsonify({"default_hours": overdue_engine.default_hours, "limits": overdue_engine.limits()})
+
+
+@bp.route('/api/loan_limits', methods=['POST'])
+@require_api_token("set_loan_limit")
+def update_loan_limit():
+    data = request.get_json(silent=True) or {}
+    name = str(data.get('name') or '').strip()
+    hours = data.get('max_hours')
+    try:
+        hours = float(hours) if hours not in (None, "") else None
+        if hours is not None and not (math.isfinite(hours) and 0 < hours <= MAX_LIMIT_HOURS):
+            raise ValueError(hours)
+    except (TypeError, ValueError):
+        log_api_action("set_loan_limit", status="error", detail={"name": name, "max_hours": data.get('max_hours')})
+        return jsonify({"error": f"max_hours は 0 より大きく {MAX_LIMIT_HOURS} 以下の数（既定値に戻す場合は null）で指定してください"}), 400
+    if not name:
+        log_api_action("set_loan_limit", status="error", detail="missing_name")
+        return jsonify({"error": "工具名を指定してください"}), 400
+
+    conn = get_conn()
+    try:
+        set_loan_limit(conn, name, hours)
+    except RuntimeError as e:
+        log_api_action("set_loan_limit", status="error", detail={"name": name, "error": str(e)})
+        return jsonify({"error": str(e)}), 404
+    finally:
+        conn.close()
+    log_api_action("set_loan_limit", detail={"name": name, "max_hours": hours})
+    return jsonify({"status": "success", "name": name, "max_hours": hours, "default_hours": overdue_engine.default_hours})
+
+
+@bp.route('/api/rollups/refresh', methods=['POST'])
+@require_api_token("refresh_rollups")
+def refresh_rollups_api():
+    """Grafana 用集計表を今すぐ更新する（定期更新を待たずに反映したいとき）"""
+    try:
+        result = run_rollup_refresh()
+    except Exception as e:
+        log_api_action("refresh_rollups", status="error", detail=str(e))
+        return jsonify({"error": str(e)}), 500
+    log_api_action("refresh_rollups", detail={"rows": result.get("rows"), "skipped": result.get("skipped")})
+    return jsonify({key: value.isoformat() if isinstance(value, datetime) else value for key, value in result.items()})
+
+
+@bp.route('/api/loans/archive')
+def get_loan_archive_status():
+    """loans（直近・貸出中）と loans_archive の行数・大きさ"""
+    conn = get_conn()
+    try:
+        with conn, traced_cursor(conn, "loan_archive") as cur:
+            return jsonify(archive_status(cur))
+    finally:
+        conn.close()
+
+
+@bp.route('/api/loans/archive', methods=['POST'])
+@require_api_token("archive_loans")
+def archive_loans_api():
+    """古い返却済みの貸出を今すぐ loans_archive に移す"""
+    try:
+        result = run_loan_archive()
+    except Exception as e:
+        log_api_action("archive_loans", status="error", detail=str(e))
+        return jsonify({"error": str(e)}), 500
+    log_api_action("archive_loans", detail={"moved": result["moved"], "batches": result["batches"]})
+    return jsonify(result)
+
+
+def _export_response(kind: str, action_name: str):
+    try:
+        start, end = _parse_export_range(request.args)
+    except ValueError as exc:
+        log_api_action(action_name, status="error", detail=str(exc))
+        return jsonify({"error": str(exc)}), 400
+
+    log_api_action(action_name, detail={"from": start.date(), "to": (end - timedelta(days=1)).date()})
+    filename = f"{kind}_{start:%Y%m%d}_{(end - timedelta(days=1)):%Y%m%d}.csv"
+    return Response(
+        stream_with_context(iter_export_rows(kind, start, end)),
+        mimetype="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+@bp.route('/api/export/loans.csv')
+@require_api_token("export_loans")
+def export_loans_csv():
+    return _export_response("loans", "export_loans")
+
+
+@bp.route('/api/export/scan_events.csv')
+@require_api_token("export_scan_events")
+def export_scan_events_csv():
+    return _export_response("scan_events", "export_scan_events")
+
+
+@bp.route('/api/station_config', methods=['GET'])
 @require_api_token("station_config_get")
 def api_station_config_get():
-    config = load_station_config()
+    config = station_store.get()
     log_api_action("station_config_get", detail={"process": config.get("process"), "source": config.get("source")})
     return jsonify(config)
 
 
-@app.route('/api/station_config', methods=['POST'])
+@bp.route('/api/station_config', methods=['POST'])
 @require_api_token("station_config_update")
 def api_station_config_update():
     payload = request.get_json(silent=True) or {}
@@ -741,8 +1805,9 @@ def api_station_config_update():
             normalized.append(item)
         available = normalized
 
+    previous_process = station_process()
     try:
-        config = save_station_config(process=process, available=available)
+        config = station_store.save(process=process, available=available)
     except Exception as exc:  # pylint: disable=broad-except
         log_api_action("station_config_update", status="error", detail=str(exc))
         return jsonify({"error": str(exc)}), 500
@@ -752,10 +1817,12 @@ def api_station_config_update():
         "available": config.get("available"),
     })
     emit_station_config_update(config)
+    if config.get("process", "") != previous_process:
+        emit_production_view_update(config.get("process", ""))
     return jsonify(config)
 
 
-@app.route('/api/tokens', methods=['GET'])
+@bp.route('/api/tokens', methods=['GET'])
 @require_api_token("list_tokens")
 def api_tokens_list():
     reveal = request.args.get('reveal') == '1'
@@ -768,11 +1835,12 @@ def api_tokens_list():
     return jsonify({
         "tokens": tokens,
         "summary": summary,
-        "file": str(API_TOKEN_FILE),
+        "backend": token_backend_name(),
+        "file": str(token_store_path()),
     })
 
 
-@app.route('/api/tokens', methods=['POST'])
+@bp.route('/api/tokens', methods=['POST'])
 @require_api_token("issue_token")
 def api_tokens_issue():
     payload = request.get_json(silent=True) or {}
@@ -804,7 +1872,7 @@ def api_tokens_issue():
     return jsonify(response)
 
 
-@app.route('/api/tokens/revoke', methods=['POST'])
+@bp.route('/api/tokens/revoke', methods=['POST'])
 @require_api_token("revoke_token")
 def api_tokens_revoke():
     payload = request.get_json(silent=True) or {}
@@ -829,7 +1897,7 @@ def api_tokens_revoke():
     })
     return jsonify({"updated": count})
 
-@app.route('/api/loans/<int:loan_id>/manual_return', methods=['POST'])
+@bp.route('/api/loans/<int:loan_id>/manual_return', methods=['POST'])
 @require_api_token("manual_return")
 def manual_return_loan(loan_id):
     conn = get_conn()
@@ -842,7 +1910,7 @@ def manual_return_loan(loan_id):
         tool_name = name_of_tool(conn, tool_uid)
         borrower_name = name_of_user(conn, borrower_uid)
         message = f"✅ 手動返却：{tool_name} を {borrower_name} から回収しました"
-        socketio.emit('transaction_complete', {
+        emit_event('transaction_complete', {
             'user_uid': borrower_uid,
             'user_name': borrower_name,
             'tool_uid': tool_uid,
@@ -858,7 +1926,7 @@ def manual_return_loan(loan_id):
     finally:
         conn.close()
 
-@app.route('/api/loans/<int:loan_id>', methods=['DELETE'])
+@bp.route('/api/loans/<int:loan_id>', methods=['DELETE'])
 @require_api_token("delete_open_loan")
 def delete_open_loan_api(loan_id):
     conn = get_conn()
@@ -877,7 +1945,7 @@ def delete_open_loan_api(loan_id):
     finally:
         conn.close()
 
-@app.route('/api/usb_sync', methods=['POST'])
+@bp.route('/api/usb_sync', methods=['POST'])
 @require_api_token("usb_sync")
 def api_usb_sync():
     device = '/dev/sda1'
@@ -886,6 +1954,14 @@ def api_usb_sync():
     try:
         result = run_usb_sync(device)
         code = int(result.get("returncode", 1))
+        # 取り込んだ計画 CSV は同期直後にスナップショット化しておく（初回表示で解析しない）
+        compile_plan_snapshots()
+        if code == 0:
+            try:
+                reload_after_master_sync()
+            except Exception as exc:  # pylint: disable=broad-except
+                # 定期の突き合わせ（OPEN_LOANS_RECONCILE_SECONDS）で追いつく
+                print(f"[usb-sync] failed to reload loans / inventory: {exc}")
         status = "success" if code == 0 else "error"
         payload = {
             "status": status,
@@ -893,14 +1969,20 @@ def api_usb_sync():
             "stdout": result.get("stdout", ""),
             "stderr": result.get("stderr", ""),
             "steps": result.get("steps", []),
+            "elapsed_ms": result.get("elapsed_ms"),
         }
-        log_api_action("usb_sync", status=status, detail={"device": device, "returncode": code})
+        log_api_action("usb_sync", status=status, detail={
+            "device": device,
+            "returncode": code,
+            "elapsed_ms": result.get("elapsed_ms"),
+            "step_ms": {step.get("name"): step.get("duration_ms") for step in result.get("steps", [])},
+        })
         return jsonify(payload), (200 if code == 0 else 500)
     except Exception as e:
         log_api_action("usb_sync", status="error", detail={"device": device, "error": str(e)})
         return jsonify({"status": "error", "stderr": str(e)}), 500
 
-@app.route('/api/scan_tag', methods=['POST'])
+@bp.route('/api/scan_tag', methods=['POST'])
 @require_api_token("scan_tag")
 def scan_tag():
     """手動スキャン用API"""
@@ -915,7 +1997,7 @@ def scan_tag():
         log_api_action("scan_tag", status="error", detail={"status": "timeout"})
         return jsonify({"uid": None, "status": "timeout"})
 
-@app.route('/api/register_user', methods=['POST'])
+@bp.route('/api/register_user', methods=['POST'])
 @require_api_token("register_user")
 def register_user():
     data = request.json
@@ -928,12 +2010,13 @@ def register_user():
     
     conn = get_conn()
     try:
-        with conn, conn.cursor() as cur:
+        with conn, traced_cursor(conn, "register_user") as cur:
             cur.execute("""
               INSERT INTO users(uid, full_name)
               VALUES(%s,%s)
               ON CONFLICT(uid) DO UPDATE SET full_name=EXCLUDED.full_name
             """, (uid, name.strip()))
+        open_loan_view.rename_user(uid, name.strip())
         print(f"👤 ユーザー登録: {name} ({uid})")
         log_api_action("register_user", detail={"uid": uid, "name": name})
         return jsonify({"status": "success", "message": "ユーザーを登録/更新しました"})
@@ -944,7 +2027,7 @@ def register_user():
     finally:
         conn.close()
 
-@app.route('/api/register_tool', methods=['POST'])
+@bp.route('/api/register_tool', methods=['POST'])
 @require_api_token("register_tool")
 def register_tool():
     data = request.json
@@ -957,12 +2040,14 @@ def register_tool():
     
     conn = get_conn()
     try:
-        with conn, conn.cursor() as cur:
+        with conn, traced_cursor(conn, "register_tool") as cur:
             cur.execute("""
               INSERT INTO tools(uid, name)
               VALUES(%s,%s)
               ON CONFLICT(uid) DO UPDATE SET name=EXCLUDED.name
             """, (uid, name))
+        open_loan_view.rename_tool(uid, name)
+        tool_inventory.register_tool(uid, name)
         print(f"🛠️ 工具登録: {name} ({uid})")
         log_api_action("register_tool", detail={"uid": uid, "name": name})
         return jsonify({"status": "success", "message": "工具を登録/更新しました"})
@@ -973,7 +2058,7 @@ def register_tool():
     finally:
         conn.close()
 
-@app.route('/api/tool_names')
+@bp.route('/api/tool_names')
 def get_tool_names():
     conn = get_conn()
     try:
@@ -984,7 +2069,7 @@ def get_tool_names():
     finally:
         conn.close()
 
-@app.route('/api/add_tool_name', methods=['POST'])
+@bp.route('/api/add_tool_name', methods=['POST'])
 @require_api_token("add_tool_name")
 def add_tool_name_api():
     data = request.json
@@ -1007,7 +2092,7 @@ def add_tool_name_api():
     finally:
         conn.close()
 
-@app.route('/api/delete_tool_name', methods=['POST'])
+@bp.route('/api/delete_tool_name', methods=['POST'])
 @require_api_token("delete_tool_name")
 def delete_tool_name_api():
     data = request.json
@@ -1030,7 +2115,7 @@ def delete_tool_name_api():
     finally:
         conn.close()
 
-@app.route('/api/check_tag', methods=['POST'])
+@bp.route('/api/check_tag', methods=['POST'])
 @require_api_token("check_tag")
 def check_tag():
     """タグ情報確認用API"""
@@ -1042,11 +2127,11 @@ def check_tag():
         conn = get_conn()
         try:
             # ユーザー情報確認
-            with conn.cursor() as cur:
-                cur.execute("SELECT full_name FROM users WHERE uid=%s", (uid,))
+            with traced_cursor(conn, "check_tag") as cur:
+                cur.execute("SELECT full_name FROM users WHERE uid=%s", (uid,), name="check_tag.user")
                 user_result = cur.fetchone()
                 
-                cur.execute("SELECT name FROM tools WHERE uid=%s", (uid,))
+                cur.execute("SELECT name FROM tools WHERE uid=%s", (uid,), name="check_tag.tool")
                 tool_result = cur.fetchone()
             
             result = {"uid": uid, "status": "success"}
@@ -1072,7 +2157,7 @@ def check_tag():
         log_api_action("check_tag", status="error", detail={"status": "timeout"})
         return jsonify({"uid": None, "status": "timeout"})
 
-@app.route("/api/shutdown", methods=["POST"])
+@bp.route("/api/shutdown", methods=["POST"])
 @require_api_token("shutdown")
 def api_shutdown():
     """
@@ -1116,15 +2201,50 @@ def api_shutdown():
 # =========================
 # 初期化・起動
 # =========================
+def create_app(config: Optional[dict] = None) -> Flask:
+    """Build the Flask app without side effects (no DB, hardware, network or log files)."""
+    flask_app = Flask(__name__)
+    flask_app.config['SECRET_KEY'] = 'your-secret-key-here'
+    flask_app.config['DOCUMENT_VIEWER_URL'] = os.getenv("DOCUMENT_VIEWER_URL", "http://127.0.0.1:5000")
+    if config:
+        flask_app.config.update(config)
+    flask_app.register_blueprint(bp)
+    socketio.init_app(flask_app, cors_allowed_origins="*", async_mode=socketio_async_mode())
+    return flask_app
+
+
+app = create_app()
+
+
 if __name__ == '__main__':
+    host = os.getenv("TOOLMGMT_HOST", "0.0.0.0")
+    port = int(os.getenv("TOOLMGMT_PORT", "8501"))
+    mode = active_mode()
     ensure_tables()
+    reload_loan_limits()
+    reconcile_open_loans()
+    reconcile_inventory()
     
-    # バックグラウンドスキャンスレッド開始
-    scan_thread = threading.Thread(target=scan_monitor, daemon=True)
-    scan_thread.start()
+    # バックグラウンドスキャンスレッド開始（eventlet/gevent ではグリーンスレッド）
+    socketio.start_background_task(scan_monitor)
+    if OPEN_LOANS_RECONCILE_SECONDS > 0:
+        socketio.start_background_task(open_loan_reconciler)
+    if OVERDUE_CHECK_SECONDS > 0:
+        socketio.start_background_task(overdue_monitor)
+    if ROLLUP_INTERVAL_SECONDS > 0:
+        socketio.start_background_task(rollup_worker)
+    if SCAN_EVENTS_MAINTENANCE_SECONDS > 0:
+        socketio.start_background_task(scan_events_maintenance)
+    if LOANS_ARCHIVE_INTERVAL_SECONDS > 0:
+        socketio.start_background_task(loan_archive_worker)
+    start_file_watch(app)
     
     print("🚀 Flask 工具管理システムを開始します...")
+    print(f"⚙️ サーバーモード: {mode}")
     print("📡 NFCスキャン監視スレッド開始")
-    print("🌐 http://0.0.0.0:8501 でアクセス可能")
+    print(f"🌐 http://{host}:{port} でアクセス可能")
     print("💡 タイムアウトエラーは正常動作（タグ待機中）なので無視してください")
-    socketio.run(app, host='0.0.0.0', port=8501, debug=False, allow_unsafe_werkzeug=True)
+    if mode == "werkzeug":
+        socketio.run(app, host=host, port=port, debug=False, allow_unsafe_werkzeug=True)
+    else:
+        socketio.run(app, host=host, port=port, debug=False)
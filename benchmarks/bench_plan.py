@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""Benchmark plan loading, production view building and index rendering.
+
+合成した production_plan.csv / standard_times.csv（既定 1k / 100k / 1M 行）を使い、
+load_plan_dataset（CSV 解析 / スナップショット）・build_production_view・部品番号/製番索引の
+構築と /api/plan/lookup・納期×工程の工数集計（/api/plan/capacity）・トップページ（画面シェル）・
+/api/production_view（初回描画とフラグメントキャッシュ応答）の処理時間とピークメモリ、読み込んだ計画の
+1 行あたりのメモリ（bytes_per_row）を測る。
+ベースライン（benchmarks/baselines.json）より許容幅以上に遅く/重くなった場合は終了コード 1。
+
+    python3 benchmarks/bench_plan.py --sizes 1k,100k
+    python3 benchmarks/bench_plan.py --update-baseline
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+BASELINE_FILE = Path(__file__).resolve().parent / "baselines.json"
+# baselines.json に同梱している基準プロファイル（make bench が使う）
+REFERENCE_PROFILE = "reference"
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+PROCESSES = ["切削", "研磨", "旋削", "溶接", "組立", "検査"]
+PART_NAMES = ["ギア", "プレート", "シャフト", "ブラケット", "フランジ", "カバー"]
+
+# 結果を保持したときのメモリを行数で割って報告するケース
+PER_ROW_CASES = ("load_plan_dataset_cold", "load_plan_dataset", "build_production_view")
+
+PLAN_HEADER = ["納期", "個数", "部品番号", "部品名", "製番", "工程名"]
+STANDARD_HEADER = ["部品名", "機械標準工数", "製造オーダー番号", "部品番号", "工程名"]
+
+
+def generate_plan_files(directory: Path, rows: int, seed: int = 0) -> None:
+    """Write synthetic plan/standard-time CSVs with the production headers."""
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    start = date(2025, 10, 1)
+    parts = max(1, rows // 4)
+
+    with (directory / "production_plan.csv").open("w", encoding="utf-8", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(PLAN_HEADER)
+        for i in range(rows):
+            part = rng.randrange(parts)
+            due = start + timedelta(days=rng.randrange(120))
+            sep = "-" if i % 5 else "/"
+            writer.writerow([
+                due.strftime(f"%Y{sep}%m{sep}%d"),
+                rng.randint(1, 200),
+                f"P-{part:06d}",
+                PART_NAMES[part % len(PART_NAMES)],
+                f"SO-{i:07d}",
+                PROCESSES[part % len(PROCESSES)],
+            ])
+
+    with (directory / "standard_times.csv").open("w", encoding="utf-8", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(STANDARD_HEADER)
+        for i in range(rows):
+            part = i % parts
+            writer.writerow([
+                PART_NAMES[part % len(PART_NAMES)],
+                f"{rng.uniform(0.1, 8.0):.2f}",
+                f"SO-{i:07d}",
+                f"P-{part:06d}",
+                PROCESSES[(part + i // parts) % len(PROCESSES)],
+            ])
+
+
+def _import_app(plan_dir: Path):
+    os.environ["PLAN_DATA_DIR"] = str(plan_dir)
+    os.environ["PLAN_REMOTE_BASE_URL"] = ""
+    os.environ.setdefault("API_AUDIT_LOG", str(Path(tempfile.gettempdir()) / "toolmgmt_bench_audit.log"))
+    import app_flask  # pylint: disable=import-outside-toplevel
+
+    app_flask.app.config["DOCUMENT_VIEWER_URL"] = ""
+    return app_flask
+
+
+def _measure(func: Callable[[], object], repeat: int) -> Tuple[float, float, int]:
+    """Return (best seconds, peak MiB, retained bytes).
+
+    Timing runs without tracemalloc overhead. retained は戻り値を保持したままの
+    確保量（= 結果オブジェクトが占めるメモリ）。
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func()
+        retained, peak = tracemalloc.get_traced_memory()
+        del result
+    finally:
+        tracemalloc.stop()
+    return best, peak / (1024 * 1024), retained
+
+
+def run_size(label: str, rows: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    with tempfile.TemporaryDirectory(prefix=f"plan-bench-{label}-") as tmp:
+        plan_dir = Path(tmp)
+        generate_plan_files(plan_dir, rows)
+        app_flask = _import_app(plan_dir)
+        app_flask.PLAN_DATA_DIR = plan_dir
+        client = app_flask.app.test_client()
+
+        def render_index():
+            response = client.get("/")
+            assert response.status_code == 200, response.status_code
+            return response.data
+
+        def production_view_cold():
+            app_flask.clear_fragment_cache()
+            app_flask.clear_plan_cache()
+            response = client.get("/api/production_view")
+            assert response.status_code == 200, response.status_code
+            return response.data
+
+        def production_view_cached():
+            response = client.get("/api/production_view")
+            assert response.status_code == 200, response.status_code
+            return response.data
+
+        def load_plan_dataset_cold():
+            # スナップショットを消して CSV 解析 + スナップショット作成の経路を測る
+            for snapshot in plan_dir.glob("*.snapshot"):
+                snapshot.unlink()
+            return (
+                app_flask.load_plan_dataset("production_plan"),
+                app_flask.load_plan_dataset("standard_times"),
+            )
+
+        def plan_lookup():
+            # 索引構築済みの状態で、部品番号・製番による参照を 100 回
+            index = app_flask.get_plan_index()
+            parts = list(index.plan_by_part)[:50]
+            orders = list(index.plan_by_order)[:50]
+            for part in parts:
+                client.get(f"/api/plan/lookup?part={part}")
+            for order in orders:
+                client.get(f"/api/plan/lookup?order={order}")
+
+        def capacity_query():
+            # 集計構築済みの状態で、期間を変えた /api/plan/capacity を 100 回
+            app_flask.get_capacity_timeline()
+            for days in range(1, 101):
+                client.get(f"/api/plan/capacity?from=2025-01-01&days={days * 3}")
+
+        cases = {
+            "load_plan_dataset_cold": load_plan_dataset_cold,
+            "load_plan_dataset": lambda: (
+                app_flask.load_plan_dataset("production_plan"),
+                app_flask.load_plan_dataset("standard_times"),
+            ),
+            "build_production_view": lambda: (app_flask.clear_plan_cache(), app_flask.build_production_view())[1],
+            "plan_index_build": lambda: (app_flask.clear_plan_cache(), app_flask.get_plan_index())[1],
+            "plan_lookup": plan_lookup,
+            "capacity_build": lambda: (app_flask.clear_plan_cache(), app_flask.get_capacity_timeline())[1],
+            "capacity_query": capacity_query,
+            "render_index": render_index,
+            "production_view_cold": production_view_cold,
+            "production_view_cached": production_view_cached,
+        }
+        results: Dict[str, Dict[str, float]] = {}
+        for name, func in cases.items():
+            seconds, peak_mb, retained = _measure(func, repeat)
+            results[name] = {"seconds": round(seconds, 4), "peak_mb": round(peak_mb, 2)}
+            line = f"{label:>5} {name:<22} {seconds * 1000:10.1f} ms {peak_mb:10.1f} MiB"
+            if name in PER_ROW_CASES:
+                # 2 つの CSV（各 rows 行）を保持したときの 1 行あたりのメモリ
+                results[name]["bytes_per_row"] = round(retained / (2 * rows), 1)
+                line += f" {results[name]['bytes_per_row']:8.1f} B/row"
+            print(line, flush=True)
+        return results
+
+
+def compare(
+    results: Dict[str, Dict[str, Dict[str, float]]],
+    baseline: Dict[str, Dict[str, Dict[str, float]]],
+    time_tolerance: float,
+    memory_tolerance: float,
+) -> List[str]:
+    """Return human-readable regression messages (empty when within tolerance)."""
+    failures: List[str] = []
+    for size, cases in results.items():
+        for name, current in cases.items():
+            base = baseline.get(size, {}).get(name)
+            if not base:
+                continue
+            limit = base["seconds"] * (1 + time_tolerance)
+            if current["seconds"] > limit:
+                failures.append(
+                    f"{size} {name}: {current['seconds']:.4f}s > baseline {base['seconds']:.4f}s (+{time_tolerance:.0%})"
+                )
+            limit_mb = base["peak_mb"] * (1 + memory_tolerance)
+            if current["peak_mb"] > limit_mb:
+                failures.append(
+                    f"{size} {name}: {current['peak_mb']:.1f}MiB > baseline {base['peak_mb']:.1f}MiB (+{memory_tolerance:.0%})"
+                )
+            if "bytes_per_row" in base and "bytes_per_row" in current:
+                limit_row = base["bytes_per_row"] * (1 + memory_tolerance)
+                if current["bytes_per_row"] > limit_row:
+                    failures.append(
+                        f"{size} {name}: {current['bytes_per_row']:.0f}B/row > baseline {base['bytes_per_row']:.0f}B/row (+{memory_tolerance:.0%})"
+                    )
+    return failures
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="生産計画データ処理のベンチマーク")
+    parser.add_argument("--sizes", default="1k,100k,1m", help="計測する行数 (1k,100k,1m のカンマ区切り)")
+    parser.add_argument("--repeat", type=int, default=3, help="時間計測の繰り返し回数 (最良値を採用, 1m は 1 回)")
+    parser.add_argument(
+        "--profile",
+        default=os.getenv("BENCH_PROFILE") or platform.node() or "default",
+        help=f"ベースラインのキー (既定: BENCH_PROFILE、なければホスト名。リポジトリには {REFERENCE_PROFILE!r} を同梱)",
+    )
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="処理時間の許容悪化率")
+    parser.add_argument("--memory-tolerance", type=float, default=0.15, help="ピークメモリの許容悪化率")
+    parser.add_argument("--update-baseline", action="store_true", help="計測結果をベースラインとして保存")
+    parser.add_argument(
+        "--allow-missing-baseline", action="store_true",
+        help="プロファイル・行数のベースラインがなくても失敗にしない（初回計測用）",
+    )
+    parser.add_argument("--output", help="計測結果を JSON で保存するパス")
+    return parser
+
+
+def main(argv: List[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    labels = [item.strip().lower() for item in args.sizes.split(",") if item.strip()]
+    unknown = [label for label in labels if label not in SIZES]
+    if unknown:
+        print(f"未対応のサイズです: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for label in labels:
+        rows = SIZES[label]
+        results[label] = run_size(label, rows, 1 if rows >= 1_000_000 else max(1, args.repeat))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    baselines = json.loads(BASELINE_FILE.read_text(encoding="utf-8")) if BASELINE_FILE.exists() else {}
+    if args.update_baseline:
+        baselines.setdefault(args.profile, {}).update(results)
+        BASELINE_FILE.write_text(json.dumps(baselines, ensure_ascii=False, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"ベースラインを更新しました: {BASELINE_FILE} [{args.profile}]")
+        return 0
+
+    baseline = baselines.get(args.profile) or {}
+    missing = [label for label in labels if label not in baseline]
+    if missing:
+        print(
+            f"ベースラインがありません [{args.profile}] {', '.join(missing)}。"
+            "--update-baseline で作成してください。",
+            file=sys.stderr,
+        )
+        if not args.allow_missing_baseline:
+            return 1
+
+    failures = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+    for message in failures:
+        print(f"REGRESSION {message}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Compare per-transaction latency of the tap SQL path with and without prepared statements.
+
+1 取引（ユーザータップ→工具タップ→貸出/返却）でタップ処理が実行する SQL
+（name_of_user / name_of_tool / insert_scan / borrow_or_return / fetch_open_loans）を
+app_flask の関数のまま繰り返し、取引あたりの処理時間の分布を次の 3 通りで比べる。
+
+- connect:  取引ごとに接続し、SQL をそのまま送る（従来のタップ処理）
+- reuse:    接続を使い回し、SQL をそのまま送る
+- prepared: 接続を使い回し、STATEMENTS.prepare() 済みの文を名前で実行する
+
+貸出・スキャン履歴を書き込むため、既定では検証用 DB（sensordb_bench）を使う。
+
+    docker exec -it pg createdb -U app sensordb_bench
+    python3 benchmarks/bench_prepared.py --transactions 500
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.tap_replay import summarize  # noqa: E402
+
+MODES = ("connect", "reuse", "prepared")
+USER_UID = "BENCHUSER"
+TOOL_PREFIX = "BENCHTOOL"
+
+
+def _register_tags(app_flask, tools: int) -> List[str]:
+    uids = [f"{TOOL_PREFIX}{i:04d}" for i in range(tools)]
+    conn = app_flask.get_conn()
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("INSERT INTO tool_master(name) VALUES ('負荷試験工具') ON CONFLICT(name) DO NOTHING")
+            cur.execute(
+                "INSERT INTO users(uid, full_name) VALUES (%s,'負荷試験ユーザー') ON CONFLICT(uid) DO NOTHING",
+                (USER_UID,),
+            )
+            for uid in uids:
+                cur.execute(
+                    "INSERT INTO tools(uid, name) VALUES (%s,'負荷試験工具') ON CONFLICT(uid) DO NOTHING",
+                    (uid,),
+                )
+    finally:
+        conn.close()
+    return uids
+
+
+def run_transaction(app_flask, conn, tool_uid: str) -> None:
+    """process_tap() が 1 取引で実行するのと同じ順に SQL を実行する"""
+    app_flask.name_of_user(conn, USER_UID)
+    app_flask.insert_scan(conn, USER_UID, "user")
+    app_flask.name_of_tool(conn, tool_uid)
+    app_flask.insert_scan(conn, tool_uid, "tool")
+    app_flask.borrow_or_return(conn, USER_UID, tool_uid)
+    app_flask.name_of_tool(conn, tool_uid)
+    app_flask.name_of_user(conn, USER_UID)
+    app_flask.fetch_open_loans(conn)
+    conn.rollback()
+
+
+def bench_mode(app_flask, mode: str, tools: List[str], transactions: int, warmup: int) -> Dict[str, object]:
+    durations: List[float] = []
+    shared = None
+    if mode != "connect":
+        shared = app_flask.get_conn()
+        if mode == "prepared" and not app_flask.STATEMENTS.prepare(shared):
+            raise RuntimeError("PREPARE に失敗しました")
+    try:
+        for i in range(warmup + transactions):
+            tool_uid = tools[i % len(tools)]
+            started = time.perf_counter()
+            conn = shared or app_flask.get_conn()
+            try:
+                run_transaction(app_flask, conn, tool_uid)
+            finally:
+                if shared is None:
+                    conn.close()
+            if i >= warmup:
+                durations.append(time.perf_counter() - started)
+    finally:
+        if shared is not None:
+            shared.close()
+    return summarize(durations)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="タップ処理の SQL を PREPARE あり/なしで比較")
+    parser.add_argument("--transactions", type=int, default=300, help="モードごとの計測取引数")
+    parser.add_argument("--warmup", type=int, default=20, help="計測前に捨てる取引数")
+    parser.add_argument("--tools", type=int, default=50, help="使う工具タグの数")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"比較するモード（{','.join(MODES)}）")
+    parser.add_argument("--dbname", default="sensordb_bench", help="接続先 DB 名 (本番 DB を避けるため既定は sensordb_bench)")
+    parser.add_argument("--output", help="結果を JSON で保存するパス")
+    return parser
+
+
+def main(argv: List[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = sorted(set(modes) - set(MODES))
+    if unknown:
+        raise SystemExit(f"unknown modes: {', '.join(unknown)}")
+
+    os.environ.setdefault("API_AUDIT_LOG", str(Path(tempfile.gettempdir()) / "toolmgmt_bench_audit.log"))
+    import app_flask  # pylint: disable=import-outside-toplevel
+
+    app_flask.DB = dict(app_flask.DB, dbname=args.dbname)
+    app_flask.ensure_tables()
+    tools = _register_tags(app_flask, max(args.tools, 1))
+
+    result: Dict[str, object] = {"dbname": args.dbname, "transactions": args.transactions}
+    for mode in modes:
+        result[mode] = bench_mode(app_flask, mode, tools, args.transactions, args.warmup)
+    prepared_p50 = result["prepared"]["p50_ms"] if "prepared" in result else None
+    if prepared_p50:
+        # prepared に対する各モードの p50 の比（2.0 なら prepared が半分の時間）
+        result["p50_ratio_to_prepared"] = {
+            mode: round(result[mode]["p50_ms"] / prepared_p50, 2)
+            for mode in modes if mode != "prepared" and result[mode]["p50_ms"]
+        }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Compare serving modes (werkzeug / eventlet / gevent) under concurrent load.
+
+各モードで app_flask.py を別ポートに起動し、Socket.IO のロングポーリング接続を
+指定数だけ張ったまま、並列 HTTP リクエストのレイテンシとエラー数を計測する。
+起動時に ensure_tables() を実行するため Postgres が必要（NFC リーダーは疑似でよい）。
+
+    python3 benchmarks/bench_server.py --modes werkzeug,eventlet --idle-connections 50 --concurrency 20
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.tap_replay import summarize  # noqa: E402
+
+
+def _wait_ready(base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/metrics", timeout=1):
+                return
+        except Exception:  # pylint: disable=broad-except
+            time.sleep(0.5)
+    raise RuntimeError(f"サーバーが起動しませんでした: {base_url}")
+
+
+def _hold_polling_connection(base_url: str, stop: threading.Event, errors: List[str]) -> None:
+    """Socket.IO (EIO4) の polling セッションを開き、stop までロングポーリングを続ける"""
+    try:
+        with urllib.request.urlopen(f"{base_url}/socket.io/?EIO=4&transport=polling", timeout=10) as res:
+            body = res.read().decode("utf-8")
+        sid = json.loads(body[body.index("{"):])["sid"]
+        url = f"{base_url}/socket.io/?EIO=4&transport=polling&sid={sid}"
+        request = urllib.request.Request(url, data=b"40", method="POST")
+        urllib.request.urlopen(request, timeout=10).read()
+        while not stop.is_set():
+            urllib.request.urlopen(url, timeout=35).read()
+    except Exception as exc:  # pylint: disable=broad-except
+        if not stop.is_set():
+            errors.append(str(exc))
+
+
+def _timed_get(url: str) -> Optional[float]:
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=30) as res:
+            res.read()
+    except (urllib.error.URLError, OSError):
+        return None
+    return time.perf_counter() - started
+
+
+def bench_mode(mode: str, port: int, args: argparse.Namespace) -> Dict[str, object]:
+    env = dict(os.environ)
+    env.update({
+        "TOOLMGMT_SERVER_MODE": mode,
+        "TOOLMGMT_HOST": "127.0.0.1",
+        "TOOLMGMT_PORT": str(port),
+        "NFC_READER_BACKEND": env.get("NFC_READER_BACKEND", "simulated"),
+        "API_AUDIT_LOG": str(Path(tempfile.gettempdir()) / f"toolmgmt_bench_{mode}.log"),
+    })
+    server = subprocess.Popen(
+        [sys.executable, str(ROOT_DIR / "app_flask.py")],
+        cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    stop = threading.Event()
+    poll_errors: List[str] = []
+    holders: List[threading.Thread] = []
+    try:
+        _wait_ready(base_url, args.startup_timeout)
+        for _ in range(args.idle_connections):
+            holder = threading.Thread(target=_hold_polling_connection, args=(base_url, stop, poll_errors), daemon=True)
+            holder.start()
+            holders.append(holder)
+        time.sleep(1.0)
+
+        url = f"{base_url}{args.path}"
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(lambda _: _timed_get(url), range(args.requests)))
+        elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    latencies = [value for value in results if value is not None]
+    summary = summarize(latencies)
+    summary.update({
+        "mode": mode,
+        "errors": len(results) - len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        "idle_connections": args.idle_connections,
+        "idle_connection_errors": len(poll_errors),
+    })
+    return summary
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="サーバーモード別の同時接続・レイテンシ比較")
+    parser.add_argument("--modes", default="werkzeug,eventlet,gevent", help="比較するモード (カンマ区切り)")
+    parser.add_argument("--path", default="/api/tool_names", help="計測対象のパス")
+    parser.add_argument("--requests", type=int, default=500, help="リクエスト総数")
+    parser.add_argument("--concurrency", type=int, default=20, help="同時リクエスト数")
+    parser.add_argument("--idle-connections", type=int, default=30, help="張りっぱなしにする Socket.IO 接続数")
+    parser.add_argument("--base-port", type=int, default=18501, help="起動に使う先頭ポート")
+    parser.add_argument("--startup-timeout", type=float, default=60.0, help="起動待ちの秒数")
+    parser.add_argument("--output", help="結果を JSON で保存するパス")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for offset, mode in enumerate(item.strip() for item in args.modes.split(",") if item.strip()):
+        try:
+            rows.append(bench_mode(mode, args.base_port + offset, args))
+        except RuntimeError as exc:
+            rows.append({"mode": mode, "error": str(exc)})
+        print(json.dumps(rows[-1], ensure_ascii=False), flush=True)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Measure app_flask import time and create_app() time in fresh interpreters.
+
+サービス再起動やテストの reload にかかる時間の目安として、新しいプロセスで
+`import app_flask` と `create_app()` の所要時間を繰り返し計測する。
+
+    python3 benchmarks/bench_startup.py --runs 10
+    python3 benchmarks/bench_startup.py --max-import-ms 800   # 超えたら終了コード 1
+    python3 benchmarks/bench_startup.py --importtime          # 遅いモジュール上位を表示
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app_flask
+imported = time.perf_counter()
+app_flask.create_app()
+created = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "create_app_ms": (created - imported) * 1000}))
+"""
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("API_AUDIT_LOG", str(Path(tempfile.gettempdir()) / "toolmgmt_bench_audit.log"))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT_DIR), env.get("PYTHONPATH", "")]))
+    return env
+
+
+def measure_once() -> Dict[str, float]:
+    output = subprocess.check_output([sys.executable, "-c", PROBE], cwd=ROOT_DIR, env=_env(), text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def top_imports(limit: int = 15) -> List[str]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app_flask"],
+        cwd=ROOT_DIR, env=_env(), text=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line.split(":", 1)[1].split("|", 2)]
+        rows.append((int(cumulative_us), name, int(self_us)))
+    rows.sort(reverse=True)
+    return [f"{cum / 1000:8.1f} ms (self {own / 1000:6.1f} ms)  {name}" for cum, name, own in rows[:limit]]
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="app_flask の起動時間を計測")
+    parser.add_argument("--runs", type=int, default=5, help="計測回数 (初回はバイトコード生成のため除外)")
+    parser.add_argument("--max-import-ms", type=float, help="import 時間の中央値がこれを超えたら失敗")
+    parser.add_argument("--importtime", action="store_true", help="-X importtime で遅いモジュールを表示")
+    args = parser.parse_args(argv)
+
+    measure_once()  # ウォームアップ（.pyc 生成）
+    samples = [measure_once() for _ in range(max(1, args.runs))]
+    result = {}
+    for key in ("import_ms", "create_app_ms"):
+        values = [sample[key] for sample in samples]
+        result[key] = {
+            "median": round(statistics.median(values), 1),
+            "min": round(min(values), 1),
+            "max": round(max(values), 1),
+        }
+    print(json.dumps(result, indent=2))
+
+    if args.importtime:
+        print("\n".join(top_imports()))
+
+    if args.max_import_ms is not None and result["import_ms"]["median"] > args.max_import_ms:
+        print(f"REGRESSION import_ms median {result['import_ms']['median']} > {args.max_import_ms}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Replay NFC tap traces through the borrow/return pipeline against a local Postgres.
+
+疑似リーダー（nfc_reader.SimulatedReader）からタップを受け取り、app_flask.process_tap()
+をそのまま実行して tap→commit（貸出/返却の確定）と tap→emit（Socket.IO 送信）の
+レイテンシ分布を出力する。ローカル DB に貸出・スキャン履歴を書き込むため、
+既定では検証用 DB（sensordb_bench）を使う。
+
+    docker exec -it pg createdb -U app sensordb_bench
+    python3 benchmarks/tap_replay.py --transactions 500 --taps-per-second 5
+    python3 benchmarks/tap_replay.py --trace trace.csv --rate 4
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from nfc_reader import SimulatedReader, Tap, generate_trace, load_trace, save_trace, set_reader  # noqa: E402
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    summary: Dict[str, Optional[float]] = {"count": len(values)}
+    for pct in PERCENTILES:
+        value = percentile(values, pct)
+        summary[f"p{pct}_ms"] = round(value * 1000, 2) if value is not None else None
+    summary["max_ms"] = round(max(values) * 1000, 2) if values else None
+    return summary
+
+
+def _register_trace_tags(app_flask, taps: List[Tap], user_prefix: str) -> None:
+    users = sorted({tap.uid for tap in taps if tap.uid.startswith(user_prefix)})
+    tools = sorted({tap.uid for tap in taps if not tap.uid.startswith(user_prefix)})
+    conn = app_flask.get_conn()
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("INSERT INTO tool_master(name) VALUES ('負荷試験工具') ON CONFLICT(name) DO NOTHING")
+            for uid in users:
+                cur.execute(
+                    "INSERT INTO users(uid, full_name) VALUES (%s,%s) ON CONFLICT(uid) DO NOTHING",
+                    (uid, f"負荷試験 {uid}"),
+                )
+            for uid in tools:
+                cur.execute(
+                    "INSERT INTO tools(uid, name) VALUES (%s,'負荷試験工具') ON CONFLICT(uid) DO NOTHING",
+                    (uid,),
+                )
+    finally:
+        conn.close()
+
+
+def replay(app_flask, reader: SimulatedReader) -> Dict[str, object]:
+    """Drive process_tap() with the simulated reader and collect latencies."""
+    tap_to_commit: List[float] = []
+    tap_to_emit: List[float] = []
+    current: Dict[str, float] = {}
+
+    original_borrow_or_return = app_flask.borrow_or_return
+    original_emit_event = app_flask.emit_event
+
+    def timed_borrow_or_return(*args, **kwargs):
+        result = original_borrow_or_return(*args, **kwargs)
+        # with conn: を抜けた時点でコミット済み
+        tap_to_commit.append(time.perf_counter() - current["tap_at"])
+        return result
+
+    def timed_emit_event(event, payload, **kwargs):
+        original_emit_event(event, payload, **kwargs)
+        if event in ("scan_update", "transaction_complete"):
+            tap_to_emit.append(time.perf_counter() - current["tap_at"])
+
+    app_flask.borrow_or_return = timed_borrow_or_return
+    app_flask.emit_event = timed_emit_event
+    app_flask.SCAN_DEBOUNCE_SECONDS = 0
+    app_flask.SCAN_RESET_DELAY = 0
+    app_flask.scan_state.update({"active": True, "user_uid": "", "tool_uid": "", "last_scanned_uid": ""})
+    set_reader(reader)
+
+    started = time.perf_counter()
+    taps = 0
+    try:
+        while not reader.exhausted:
+            uid = app_flask.read_one_uid(timeout=1)
+            if not uid:
+                continue
+            current["tap_at"] = reader.last_tap_at
+            app_flask.process_tap(uid)
+            taps += 1
+    finally:
+        app_flask.borrow_or_return = original_borrow_or_return
+        app_flask.emit_event = original_emit_event
+    elapsed = time.perf_counter() - started
+
+    return {
+        "taps": taps,
+        "elapsed_s": round(elapsed, 3),
+        "taps_per_second": round(taps / elapsed, 2) if elapsed else None,
+        "tap_to_commit": summarize(tap_to_commit),
+        "tap_to_emit": summarize(tap_to_emit),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="NFC タップトレースを再生して貸出/返却処理のレイテンシを計測")
+    parser.add_argument("--trace", help="再生するトレース CSV (uid,interval_ms)。省略時は合成トレース")
+    parser.add_argument("--rate", type=float, default=1.0, help="再生倍率 (2 なら到着間隔を 1/2 に短縮)")
+    parser.add_argument("--transactions", type=int, default=200, help="合成トレースの取引数")
+    parser.add_argument("--taps-per-second", type=float, default=2.0, help="合成トレースの平均到着率")
+    parser.add_argument("--users", type=int, default=20, help="合成トレースのユーザー数")
+    parser.add_argument("--tools", type=int, default=200, help="合成トレースの工具数")
+    parser.add_argument("--save-trace", help="生成したトレースを CSV に保存")
+    parser.add_argument("--dbname", default="sensordb_bench", help="接続先 DB 名 (本番 DB を避けるため既定は sensordb_bench)")
+    parser.add_argument("--user-prefix", default="SIMUSER", help="ユーザータグ UID の接頭辞")
+    parser.add_argument("--output", help="結果を JSON で保存するパス")
+    return parser
+
+
+def main(argv: List[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.trace:
+        taps = load_trace(Path(args.trace))
+    else:
+        taps = generate_trace(
+            args.transactions,
+            users=args.users,
+            tools=args.tools,
+            taps_per_second=args.taps_per_second,
+            user_prefix=args.user_prefix,
+        )
+    if args.save_trace:
+        save_trace(Path(args.save_trace), taps)
+
+    os.environ.setdefault("API_AUDIT_LOG", str(Path(tempfile.gettempdir()) / "toolmgmt_bench_audit.log"))
+    import app_flask  # pylint: disable=import-outside-toplevel
+
+    app_flask.DB = dict(app_flask.DB, dbname=args.dbname)
+    app_flask.ensure_tables()
+    _register_trace_tags(app_flask, taps, args.user_prefix)
+
+    result = replay(app_flask, SimulatedReader(taps, rate=args.rate))
+    result.update({"dbname": args.dbname, "rate": args.rate, "trace_taps": len(taps)})
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,171 @@
+"""Instrumented cursor wrapper with slow-query log and EXPLAIN sampling.
+
+app_flask.py の SQL は traced_cursor(conn, "<論理名>") 経由で実行し、文ごとの処理時間を
+/metrics に記録する。閾値 (DB_SLOW_QUERY_MS) を超えた文はスロークエリログに JSON で残し、
+DB_SLOW_QUERY_EXPLAIN=1 のときは実行計画も採取する。ANALYZE（文の再実行）は読み取りだけの
+SELECT に限り、更新系（INSERT/UPDATE/DELETE、それらを含む WITH、FOR UPDATE）は EXPLAIN のみ。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from metrics import DB_SLOW_QUERIES_TOTAL, DB_STATEMENT_SECONDS
+
+
+def _parse_bool(value: Optional[str], default: bool = False) -> bool:
+    if value is None:
+        return default
+    return value.strip().lower() not in {"0", "false", "off", "no", ""}
+
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+EXPLAIN_SLOW_QUERIES = _parse_bool(os.getenv("DB_SLOW_QUERY_EXPLAIN"), False)
+# 同じ論理名の EXPLAIN は最短でもこの間隔を空ける（ANALYZE は文を再実行するため）
+EXPLAIN_INTERVAL_SECONDS = float(os.getenv("DB_SLOW_QUERY_EXPLAIN_INTERVAL", "300"))
+SLOW_QUERY_LOG = Path(os.getenv(
+    "DB_SLOW_QUERY_LOG",
+    str((Path(__file__).resolve().parent / "logs" / "slow_queries.log").resolve())
+))
+
+_WHITESPACE = re.compile(r"\s+")
+# 再実行すると行の書き込み・ロック・シーケンスの消費が起きる文
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|FOR\s+(NO\s+KEY\s+)?UPDATE|FOR\s+(KEY\s+)?SHARE|NEXTVAL|SETVAL)\b", re.I)
+_logger_lock = threading.Lock()
+_explain_lock = threading.Lock()
+_last_explained: Dict[str, float] = {}
+
+
+def _compact_sql(sql: str) -> str:
+    return _WHITESPACE.sub(" ", str(sql)).strip()
+
+
+def get_slow_query_logger() -> logging.Logger:
+    """Return the slow-query logger, attaching the file handler on first use."""
+    logger = logging.getLogger("db_slow_query")
+    if logger.handlers:
+        return logger
+    with _logger_lock:
+        if not logger.handlers:
+            try:
+                SLOW_QUERY_LOG.parent.mkdir(parents=True, exist_ok=True)
+                handler: logging.Handler = logging.FileHandler(SLOW_QUERY_LOG, encoding="utf-8")
+            except OSError:
+                # 書き込めない環境では標準エラーへ
+                handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(asctime)s\t%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+    return logger
+
+
+def _should_explain(name: str) -> bool:
+    if not EXPLAIN_SLOW_QUERIES:
+        return False
+    now = time.monotonic()
+    with _explain_lock:
+        last = _last_explained.get(name)
+        if last is not None and now - last < EXPLAIN_INTERVAL_SECONDS:
+            return False
+        _last_explained[name] = now
+    return True
+
+
+def _is_read_only(sql: str) -> bool:
+    compact = _compact_sql(sql).upper()
+    return compact.startswith(("SELECT", "WITH")) and not _WRITES.search(compact)
+
+
+def _capture_explain(conn, sql: str, params) -> Optional[List[str]]:
+    """EXPLAIN the statement; only read-only SELECTs are re-run with ANALYZE.
+
+    失敗しても呼び出し側のトランザクションを壊さないよう、SAVEPOINT 内で実行してロールバックする。
+    """
+    explain = "EXPLAIN (ANALYZE, BUFFERS) " if _is_read_only(sql) else "EXPLAIN "
+    use_savepoint = not getattr(conn, "autocommit", False)
+
+    cur = conn.cursor()
+    try:
+        if use_savepoint:
+            cur.execute("SAVEPOINT toolmgmt_explain")
+        try:
+            cur.execute(explain + sql, params)
+            return [row[0] for row in cur.fetchall()]
+        finally:
+            if use_savepoint:
+                cur.execute("ROLLBACK TO SAVEPOINT toolmgmt_explain")
+    except Exception as exc:  # pylint: disable=broad-except
+        return [f"EXPLAIN failed: {exc}"]
+    finally:
+        cur.close()
+
+
+class TracedCursor:
+    """Cursor proxy that times each execute() under a logical statement name."""
+
+    _own_attrs = ("_cursor", "label")
+
+    def __init__(self, cursor, label: str) -> None:
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "label", label)
+
+    def execute(self, sql, params=None, *, name: Optional[str] = None):
+        label = name or self.label
+        started = time.perf_counter()
+        result = self._cursor.execute(sql, params)
+        elapsed = time.perf_counter() - started
+        DB_STATEMENT_SECONDS.observe(elapsed, statement=label)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            self._record_slow(label, sql, params, elapsed)
+        return result
+
+    def _record_slow(self, label: str, sql, params, elapsed: float) -> None:
+        DB_SLOW_QUERIES_TOTAL.inc(statement=label)
+        payload: Dict[str, object] = {
+            "statement": label,
+            "duration_ms": round(elapsed * 1000, 1),
+            "threshold_ms": SLOW_QUERY_MS,
+            "sql": _compact_sql(sql),
+        }
+        # サーバーサイドカーソルは EXPLAIN で全件再実行になるため対象外
+        if getattr(self._cursor, "name", None) is None and _should_explain(label):
+            plan = _capture_explain(self._cursor.connection, sql, params)
+            if plan:
+                payload["plan"] = plan
+        try:
+            get_slow_query_logger().info(json.dumps(payload, ensure_ascii=False, default=str))
+        except Exception:  # pylint: disable=broad-except
+            # ログ出力で本体処理を止めない
+            pass
+
+    def __getattr__(self, item):
+        return getattr(self._cursor, item)
+
+    def __setattr__(self, key, value) -> None:
+        # itersize などはラップ元のカーソルへ設定する
+        if key in self._own_attrs:
+            object.__setattr__(self, key, value)
+        else:
+            setattr(self._cursor, key, value)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self) -> "TracedCursor":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._cursor.close()
+
+
+def traced_cursor(conn, name: str, server_side: Optional[str] = None) -> TracedCursor:
+    """conn.cursor() の代わりに使う。server_side を渡すと名前付きカーソルを作る。"""
+    cursor = conn.cursor(name=server_side) if server_side else conn.cursor()
+    return TracedCursor(cursor, name)
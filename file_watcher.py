@@ -0,0 +1,262 @@
+"""Watch files for external changes: inotify on Linux, mtime polling elsewhere.
+
+ファイルそのものではなく親ディレクトリを inotify で監視する（エディタや os.replace による
+差し替えでも inode が変わっても検知できる）。inotify が使えない環境（Linux 以外・
+inotify の上限超過など）では stat の (mtime, サイズ, inode) を一定間隔で比較する。
+通知を受けたら callback(path) を呼ぶだけで、読み直しは呼び出し側が行う。
+
+WatchService は複数の監視対象（計画 CSV・API トークン・工程設定など）を 1 つの
+FileWatcher（inotify の fd 1 つ）にまとめ、短時間に続く変更（USB 同期で複数ファイルを
+コピーする場合など）を debounce 秒だけ待ってから種類ごとの ChangeEvent として配る。
+
+eventlet / gevent の monkey patch 下でも止まらないよう、inotify の読み出しは
+select() で待ってから行う（select はパッチ済みの協調版になる）。
+"""
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# IN_MODIFY は開いたまま書き込む SQLite ファイル用（連続する通知は WatchService がまとめる）
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_ATTRIB
+_EVENT_HEADER = struct.Struct("iIII")
+
+Signature = Optional[Tuple[int, int, int]]
+
+
+def file_signature(path: Path) -> Signature:
+    """(mtime_ns, size, inode)。ファイルがなければ None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _load_libc():
+    name = ctypes.util.find_library("c")
+    if not name:
+        return None
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+        libc.inotify_init1  # pylint: disable=pointless-statement
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class FileWatcher:
+    """Call ``callback(path)`` when one of ``paths`` is created, changed, replaced or removed."""
+
+    def __init__(
+        self,
+        paths: Iterable[Path],
+        callback: Callable[[Path], None],
+        poll_interval: float = 2.0,
+        use_inotify: bool = True,
+        name: str = "file-watcher",
+    ) -> None:
+        self.paths = [Path(path) for path in paths]
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.name = name
+        self.backend: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._fd: Optional[int] = None
+        self._dirs: Dict[int, Path] = {}
+        self._signatures: Dict[Path, Signature] = {}
+
+    def start(self) -> "FileWatcher":
+        if self._thread is not None:
+            return self
+        if not (self.use_inotify and self._open_inotify()):
+            self.backend = "polling"
+            # 起動直後の変更を取りこぼさないよう、基準は start() の時点で取る
+            self._signatures = {path: file_signature(path) for path in self.paths}
+        target = self._run_inotify if self.backend == "inotify" else self._run_polling
+        self._thread = threading.Thread(target=target, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _notify(self, path: Path) -> None:
+        try:
+            self.callback(path)
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f"[{self.name}] change handler failed for {path}: {exc}")
+
+    # --- inotify ---
+    def _open_inotify(self) -> bool:
+        libc = _load_libc()
+        if libc is None:
+            return False
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return False
+        self._dirs = {}
+        for directory in sorted({path.parent for path in self.paths}):
+            wd = libc.inotify_add_watch(fd, os.fsencode(str(directory)), WATCH_MASK)
+            if wd < 0:
+                # ディレクトリがない・監視数の上限など。ポーリングに切り替える
+                os.close(fd)
+                return False
+            self._dirs[wd] = directory
+        self._fd = fd
+        self.backend = "inotify"
+        return True
+
+    def _run_inotify(self) -> None:
+        watched = {(path.parent, path.name): path for path in self.paths}
+        fd = self._fd
+        while not self._stop.is_set():
+            readable, _, _ = select.select([fd], [], [], 1.0)
+            if not readable:
+                continue
+            try:
+                data = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                break
+            changed = []
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, _mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+                offset += length
+                path = watched.get((self._dirs.get(wd), name))
+                if path is not None and path not in changed:
+                    changed.append(path)
+            for path in changed:
+                self._notify(path)
+
+    # --- polling ---
+    def _run_polling(self) -> None:
+        signatures = self._signatures
+        while not self._stop.wait(self.poll_interval):
+            for path in self.paths:
+                current = file_signature(path)
+                if current != signatures[path]:
+                    signatures[path] = current
+                    self._notify(path)
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """A debounced change of one watched kind (e.g. "plan", "api_token", "station_config")."""
+
+    kind: str
+    paths: Tuple[Path, ...]
+
+
+class WatchService:
+    """One watcher for every subscribed file, dispatching debounced, typed change events."""
+
+    def __init__(self, debounce: float = 0.5, poll_interval: float = 2.0, use_inotify: bool = True) -> None:
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self._kinds_by_path: Dict[Path, List[str]] = {}
+        self._handlers: Dict[str, List[Callable[[ChangeEvent], None]]] = {}
+        self._pending: Dict[str, Set[Path]] = {}
+        self._last_change = 0.0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._watcher: Optional[FileWatcher] = None
+        self._dispatcher: Optional[threading.Thread] = None
+
+    @property
+    def backend(self) -> Optional[str]:
+        return self._watcher.backend if self._watcher is not None else None
+
+    @property
+    def running(self) -> bool:
+        return self._watcher is not None
+
+    def subscribe(self, kind: str, paths: Iterable[Path], handler: Callable[[ChangeEvent], None]) -> None:
+        """start() の前に呼ぶ（監視対象は起動時に確定する）"""
+        if self._watcher is not None:
+            raise RuntimeError("WatchService is already running")
+        for path in paths:
+            kinds = self._kinds_by_path.setdefault(Path(path), [])
+            if kind not in kinds:
+                kinds.append(kind)
+        self._handlers.setdefault(kind, []).append(handler)
+
+    def start(self) -> "WatchService":
+        if self._watcher is not None:
+            return self
+        self._watcher = FileWatcher(
+            list(self._kinds_by_path), self._on_change,
+            poll_interval=self.poll_interval, use_inotify=self.use_inotify, name="watch-service",
+        ).start()
+        self._dispatcher = threading.Thread(target=self._run_dispatch, name="watch-dispatch", daemon=True)
+        self._dispatcher.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._watcher is not None:
+            self._watcher.stop(timeout)
+            self._watcher = None
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout)
+            self._dispatcher = None
+
+    def _on_change(self, path: Path) -> None:
+        with self._cond:
+            for kind in self._kinds_by_path.get(path, ()):
+                self._pending.setdefault(kind, set()).add(path)
+            self._last_change = time.monotonic()
+            self._cond.notify_all()
+
+    def _run_dispatch(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                while not self._pending and not self._stop.is_set():
+                    self._cond.wait(1.0)
+                # 最後の変更から debounce 秒、新しい変更がなくなるまで待つ
+                while not self._stop.is_set():
+                    remaining = self._last_change + self.debounce - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, {}
+            for kind, paths in batch.items():
+                event = ChangeEvent(kind, tuple(sorted(paths)))
+                for handler in self._handlers.get(kind, ()):
+                    try:
+                        handler(event)
+                    except Exception as exc:  # pylint: disable=broad-except
+                        print(f"[watch-service] {kind} handler failed: {exc}")
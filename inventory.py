@@ -0,0 +1,177 @@
+"""Per tool_master name inventory: total, available and on-loan counts.
+
+「トルクレンチは今いくつ工具室にあるか」に答えるには tool_master・tools・貸出中の
+loans の結合が必要になる。ここでは起動時に 1 度だけ読み込んだ内容から工具名ごとの
+件数を持ち、工具名の追加・削除、工具の登録（名前の付け替え）、貸出・返却のたびに
+該当する工具名の件数だけを増減する。1 件の参照は工具名の数によらず O(1)。
+
+- total: その工具名で登録されている工具（tools）の数
+- on_loan: そのうち貸出中の工具の数（同じ工具に貸出中レコードが重複していても 1 本）
+- available: total - on_loan
+
+貸出・返却は OpenLoanView の listener（loans_changed）として受け取る。
+変更があった工具名の集計は on_change(summaries) に渡す（Socket.IO 配信用）。
+"""
+from __future__ import annotations
+
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from open_loans import OpenLoan
+
+
+class ToolInventory:
+    """Incrementally maintained inventory counts per tool name (thread-safe)."""
+
+    def __init__(self, on_change: Optional[Callable[[List[Dict[str, object]]], None]] = None) -> None:
+        self.on_change = on_change
+        self._lock = threading.RLock()
+        self._name_of: Dict[str, str] = {}
+        self._total: Dict[str, int] = {}
+        self._on_loan: Dict[str, int] = {}
+        self._open_loans: Dict[str, int] = {}
+        self._out = 0  # 貸出中の登録済み工具の総数（totals() を O(1) にするため）
+        self._summaries: Optional[List[Dict[str, object]]] = None
+        self.loaded = False
+
+    # --- 読み込み ---
+    def load(
+        self,
+        names: Iterable[str],
+        tools: Iterable[Tuple[str, str]],
+        open_tool_uids: Iterable[str] = (),
+    ) -> None:
+        """tool_master の名前・tools の (uid, name)・貸出中の工具 UID で全体を置き換える"""
+        with self._lock:
+            previous = {name: self._summary(name) for name in self._total}
+            self._name_of = {}
+            self._total = {str(name): 0 for name in names}
+            self._on_loan = {name: 0 for name in self._total}
+            self._open_loans = {}
+            self._out = 0
+            for uid, name in tools:
+                self._name_of[uid] = name
+                self._total[name] = self._total.get(name, 0) + 1
+                self._on_loan.setdefault(name, 0)
+            for uid in open_tool_uids:
+                self._open(uid)
+            self.loaded = True
+            changed = [name for name in self._total if previous.get(name) != self._summary(name)]
+            changed += [name for name in previous if name not in self._total]
+            self._summaries = None
+            summaries = [self._summary(name) for name in changed]
+        self._emit(summaries)
+
+    # --- 増分更新 ---
+    def add_name(self, name: str) -> None:
+        with self._lock:
+            if name in self._total:
+                return
+            self._total[name] = 0
+            self._on_loan[name] = 0
+            summaries = self._touch({name})
+        self._emit(summaries)
+
+    def remove_name(self, name: str) -> None:
+        """tool_master から削除された名前（割当済みの工具がないことは DB 側で確認済み）"""
+        with self._lock:
+            if name not in self._total:
+                return
+            del self._total[name]
+            del self._on_loan[name]
+            summaries = self._touch({name})
+        self._emit(summaries)
+
+    def register_tool(self, tool_uid: str, name: str) -> None:
+        """工具の登録・名前の付け替え"""
+        with self._lock:
+            old = self._name_of.get(tool_uid)
+            if old == name:
+                return
+            out = self._open_loans.get(tool_uid, 0) > 0
+            if old is not None:
+                self._total[old] -= 1
+                self._on_loan[old] -= out
+            self._name_of[tool_uid] = name
+            self._total[name] = self._total.get(name, 0) + 1
+            self._on_loan[name] = self._on_loan.get(name, 0) + out
+            if old is None:
+                self._out += out
+            summaries = self._touch({name} | ({old} if old is not None else set()))
+        self._emit(summaries)
+
+    def loans_changed(self, opened: Sequence[OpenLoan], closed: Sequence[OpenLoan]) -> None:
+        """OpenLoanView の listener。貸出中になった行・外れた行で件数を増減する"""
+        delta: Dict[str, int] = {}
+        for loan in closed:
+            delta[loan.tool_uid] = delta.get(loan.tool_uid, 0) - 1
+        for loan in opened:
+            delta[loan.tool_uid] = delta.get(loan.tool_uid, 0) + 1
+        with self._lock:
+            # 同じ工具の行の差し替え（名前の変更など）は増減が打ち消し合うので何もしない
+            touched: Set[str] = set()
+            for tool_uid, change in delta.items():
+                for _ in range(-change):
+                    touched.update(self._close(tool_uid))
+                for _ in range(change):
+                    touched.update(self._open(tool_uid))
+            summaries = self._touch(touched)
+        self._emit(summaries)
+
+    def _open(self, tool_uid: str) -> List[str]:
+        count = self._open_loans.get(tool_uid, 0)
+        self._open_loans[tool_uid] = count + 1
+        name = self._name_of.get(tool_uid)
+        if count or name is None:
+            return []
+        self._on_loan[name] += 1
+        self._out += 1
+        return [name]
+
+    def _close(self, tool_uid: str) -> List[str]:
+        count = self._open_loans.get(tool_uid, 0)
+        if count <= 0:
+            return []
+        if count > 1:
+            self._open_loans[tool_uid] = count - 1
+            return []
+        del self._open_loans[tool_uid]
+        name = self._name_of.get(tool_uid)
+        if name is None:
+            return []
+        self._on_loan[name] -= 1
+        self._out -= 1
+        return [name]
+
+    def _touch(self, names: Set[str]) -> List[Dict[str, object]]:
+        if names:
+            self._summaries = None
+        return [self._summary(name) for name in sorted(names)]
+
+    def _emit(self, summaries: List[Dict[str, object]]) -> None:
+        if summaries and self.on_change is not None:
+            self.on_change(summaries)
+
+    # --- 参照 ---
+    def _summary(self, name: str) -> Dict[str, object]:
+        if name not in self._total:
+            return {"name": name, "total": 0, "available": 0, "on_loan": 0, "deleted": True}
+        total = self._total[name]
+        on_loan = self._on_loan.get(name, 0)
+        return {"name": name, "total": total, "available": total - on_loan, "on_loan": on_loan}
+
+    def summary(self, name: str) -> Optional[Dict[str, object]]:
+        with self._lock:
+            return self._summary(name) if name in self._total else None
+
+    def summaries(self) -> List[Dict[str, object]]:
+        """工具名順の全件（変更後の最初の参照で 1 度だけ組み立てる）"""
+        with self._lock:
+            if self._summaries is None:
+                self._summaries = [self._summary(name) for name in sorted(self._total)]
+            return self._summaries
+
+    def totals(self) -> Dict[str, int]:
+        with self._lock:
+            total = len(self._name_of)
+            return {"names": len(self._total), "total": total, "available": total - self._out, "on_loan": self._out}
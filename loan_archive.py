@@ -0,0 +1,143 @@
+"""Hot/cold split of loans: move old returned loans into loans_archive.
+
+loans には開始以来のすべての貸出が残るが、タップ処理・貸出中一覧・直近の履歴が
+参照するのは貸出中と最近返却された行だけである。返却から LOANS_ARCHIVE_AFTER_DAYS 日を
+過ぎた行を loans_archive に移し、loans（と索引）を shared_buffers に収まる大きさに保つ。
+
+- archive_returned_loans(): 1 トランザクションで 1 工具分・最大 batch_size 行を移す。
+  移す前に工具ごとの advisory lock（tool_lock()）を取る。borrow_or_return() も同じ
+  lock を取ってから貸出中の行を探すので、移動と貸出・返却が同じ工具で交差しない。
+  移すのは返却済みの行だけで、貸出中の行（returned_at IS NULL）は loans に残る。
+- ALL_LOANS_SQL: loans と loans_archive を合わせた行。履歴のエクスポートや集計の
+  作り直しなど、古い行まで必要な参照はこれを FROM に使う。
+
+loans_archive の id は loans の id をそのまま使う（連番は loans_id_seq のまま）。
+"""
+from __future__ import annotations
+
+import os
+from typing import Dict, Optional
+
+from db_trace import traced_cursor
+
+# 返却からこの日数を過ぎた行を移す（0 以下で移さない）
+LOANS_ARCHIVE_AFTER_DAYS = int(os.getenv("LOANS_ARCHIVE_AFTER_DAYS", "90"))
+LOANS_ARCHIVE_BATCH = int(os.getenv("LOANS_ARCHIVE_BATCH", "500"))
+# 1 回の実行で処理するバッチ数の上限（0 以下で上限なし）
+LOANS_ARCHIVE_MAX_BATCHES = int(os.getenv("LOANS_ARCHIVE_MAX_BATCHES", "200"))
+# 工具ごとの advisory lock の名前空間（pg_advisory_xact_lock(int, int) の 1 つ目）
+TOOL_LOCK_NAMESPACE = 4_707_002
+TOOL_LOCK_SQL = "SELECT pg_advisory_xact_lock(%s, hashtext(%s))"
+
+COLUMNS = "id, tool_uid, borrower_uid, loaned_at, return_user_uid, returned_at"
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS loans_archive(
+      id BIGINT PRIMARY KEY,
+      tool_uid TEXT NOT NULL,
+      borrower_uid TEXT NOT NULL,
+      loaned_at TIMESTAMPTZ NOT NULL,
+      return_user_uid TEXT,
+      returned_at TIMESTAMPTZ NOT NULL,
+      archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    # 履歴（返却の新しい順）・エクスポート（貸出日の範囲）・集計の作り直しで使う
+    "CREATE INDEX IF NOT EXISTS loans_archive_returned_at_idx ON loans_archive (returned_at DESC)",
+    "CREATE INDEX IF NOT EXISTS loans_archive_loaned_at_idx ON loans_archive (loaned_at DESC)",
+)
+
+ALL_LOANS_SQL = f"(SELECT {COLUMNS} FROM loans UNION ALL SELECT {COLUMNS} FROM loans_archive)"
+
+# 1 工具分を移す。DELETE ... RETURNING をそのまま INSERT するので、行は必ずどちらか一方にある
+MOVE_SQL = f"""
+  WITH batch AS (
+    SELECT id FROM loans
+     WHERE tool_uid = %(tool_uid)s
+       AND returned_at IS NOT NULL
+       AND returned_at < now() - make_interval(days => %(days)s)
+  ORDER BY returned_at
+     LIMIT %(limit)s
+  ), moved AS (
+    DELETE FROM loans l USING batch b
+     WHERE l.id = b.id
+ RETURNING l.id, l.tool_uid, l.borrower_uid, l.loaned_at, l.return_user_uid, l.returned_at
+  )
+  INSERT INTO loans_archive({COLUMNS})
+  SELECT {COLUMNS} FROM moved
+"""
+
+
+def ensure_loan_archive(cur) -> None:
+    """ensure_tables() のカーソルで loans_archive と索引を作る"""
+    for statement in SCHEMA:
+        cur.execute(statement, name="ensure_tables.loan_archive")
+
+
+def tool_lock(cur, tool_uid: str) -> None:
+    """工具ごとの advisory lock をトランザクションの終わりまで取る"""
+    cur.execute(TOOL_LOCK_SQL, (TOOL_LOCK_NAMESPACE, tool_uid), name="loan_archive.tool_lock")
+
+
+def archive_returned_loans(
+    conn,
+    older_than_days: int = LOANS_ARCHIVE_AFTER_DAYS,
+    batch_size: int = LOANS_ARCHIVE_BATCH,
+    max_batches: Optional[int] = LOANS_ARCHIVE_MAX_BATCHES,
+) -> Dict[str, int]:
+    """返却から older_than_days 日を過ぎた行を、1 工具・batch_size 行ずつ loans_archive に移す"""
+    moved = batches = 0
+    if older_than_days <= 0:
+        return {"moved": moved, "batches": batches}
+    limit = max_batches if max_batches and max_batches > 0 else None
+    while limit is None or batches < limit:
+        with conn, traced_cursor(conn, "loan_archive") as cur:
+            cur.execute(
+                """
+                SELECT tool_uid FROM loans
+                 WHERE returned_at IS NOT NULL
+                   AND returned_at < now() - make_interval(days => %s)
+                 LIMIT 1
+                """,
+                (older_than_days,),
+                name="loan_archive.next_tool",
+            )
+            row = cur.fetchone()
+            if row is None:
+                break
+            tool_lock(cur, row[0])
+            cur.execute(
+                MOVE_SQL,
+                {"tool_uid": row[0], "days": older_than_days, "limit": batch_size},
+                name="loan_archive.move",
+            )
+            count = max(cur.rowcount, 0)
+        if count == 0:
+            break
+        moved += count
+        batches += 1
+    if moved:
+        # 行数が大きく変わったので、実行計画の見積もりを更新しておく
+        with conn, traced_cursor(conn, "loan_archive") as cur:
+            cur.execute("ANALYZE loans", name="loan_archive.analyze")
+            cur.execute("ANALYZE loans_archive", name="loan_archive.analyze")
+    return {"moved": moved, "batches": batches}
+
+
+def archive_status(cur) -> Dict[str, int]:
+    """loans / loans_archive の行数（統計上の推定値）と、索引を含むディスク上の大きさ"""
+    cur.execute(
+        """
+        SELECT c.relname, GREATEST(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid)
+          FROM pg_class c
+         WHERE c.oid IN (to_regclass('loans'), to_regclass('loans_archive'))
+        """,
+        name="loan_archive.status",
+    )
+    status = {}
+    for relname, rows, size in cur.fetchall():
+        key = "hot" if relname == "loans" else "archive"
+        status[f"{key}_rows"] = int(rows)
+        status[f"{key}_bytes"] = int(size)
+    return status
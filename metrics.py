@@ -0,0 +1,242 @@
+"""Minimal Prometheus text-format metrics registry.
+
+prometheus_client を依存に追加せず、/metrics で必要な Counter / Histogram だけを実装する。
+ラベル付きの値はスレッドセーフに保持し、render_latest() でテキスト形式 (0.0.4) に出力する。
+"""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in pairs) + "}"
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ラベルが一致しません (expected {self.labelnames}, got {tuple(labels)})")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(self._values.get(key, 0.0)) + amount
+
+    def value(self, **labels: object) -> float:
+        with self._lock:
+            return float(self._values.get(self._key(labels), 0.0))
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_number(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._values[key] = state
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][index] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        """with / デコレータの両方で使える経過時間計測"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: object) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return int(state["count"]) if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(
+                (key, {"counts": list(state["counts"]), "sum": state["sum"], "count": state["count"]})
+                for key, state in self._values.items()
+            )
+        lines: List[str] = []
+        for key, state in items:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                bucket_pairs = pairs + [("le", _format_number(bound))]
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_pairs)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_number(state['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {state['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # importlib.reload() されても同じインスタンスを使い回す
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+
+def render_latest() -> str:
+    return REGISTRY.render()
+
+
+# --- アプリ共通メトリクス ---
+HTTP_REQUEST_SECONDS = histogram(
+    "toolmgmt_http_request_duration_seconds",
+    "HTTP request latency by route.",
+    ("method", "route", "status"),
+)
+DB_QUERY_SECONDS = histogram(
+    "toolmgmt_db_query_duration_seconds",
+    "Database query latency by logical query name.",
+    ("query",),
+)
+DB_STATEMENT_SECONDS = histogram(
+    "toolmgmt_db_statement_duration_seconds",
+    "Latency of individual SQL statements by traced statement name.",
+    ("statement",),
+)
+DB_SLOW_QUERIES_TOTAL = counter(
+    "toolmgmt_db_slow_queries_total",
+    "SQL statements that exceeded the slow-query threshold.",
+    ("statement",),
+)
+DB_CONNECT_SECONDS = histogram(
+    "toolmgmt_db_connect_duration_seconds",
+    "Time spent acquiring a database connection.",
+)
+SOCKETIO_EMITS_TOTAL = counter(
+    "toolmgmt_socketio_emits_total",
+    "Socket.IO events emitted by the server.",
+    ("event",),
+)
+PLAN_CACHE_LOOKUPS_TOTAL = counter(
+    "toolmgmt_plan_cache_lookups_total",
+    "Plan cache lookups by result (hit, refresh, error).",
+    ("result",),
+)
+SCAN_STAGE_SECONDS = histogram(
+    "toolmgmt_scan_stage_duration_seconds",
+    "NFC scan pipeline latency by stage.",
+    ("stage",),
+)
+FRAGMENT_CACHE_LOOKUPS_TOTAL = counter(
+    "toolmgmt_fragment_cache_lookups_total",
+    "Rendered HTML fragment cache lookups by fragment and result (hit, miss).",
+    ("fragment", "result"),
+)
+OPEN_LOANS_RECONCILE_TOTAL = counter(
+    "toolmgmt_open_loans_reconcile_total",
+    "Open-loan view reconciliations against the database by result (in_sync, drift, skipped, error).",
+    ("result",),
+)
+LOANS_OVERDUE_TOTAL = counter(
+    "toolmgmt_loans_overdue_total",
+    "Open loans that crossed their tool-name maximum loan duration.",
+)
@@ -0,0 +1,173 @@
+"""NFC reader backends.
+
+scan_monitor() や手動スキャン API は get_reader().read_one_uid() 経由でタグを読む。
+既定は PC/SC（pyscard）。NFC_READER_BACKEND=simulated にすると、タップトレース
+（uid, 到着間隔）を再生する疑似リーダーになり、実機なしで負荷試験ができる。
+"""
+from __future__ import annotations
+
+import csv
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+GET_UID = [0xFF, 0xCA, 0x00, 0x00, 0x00]  # PC/SC: GET DATA (UID/IDm)
+
+
+@dataclass
+class Tap:
+    uid: str
+    interval: float  # 直前のタップからの秒数
+
+
+class PcscReader:
+    """pyscard CardRequest を使う実機リーダー"""
+
+    name = "pcsc"
+
+    def read_one_uid(self, timeout: float = 3) -> Optional[str]:
+        from smartcard.CardRequest import CardRequest  # pylint: disable=import-outside-toplevel
+        from smartcard.util import toHexString  # pylint: disable=import-outside-toplevel
+
+        try:
+            cs = CardRequest(timeout=timeout, newcardonly=True).waitforcard()
+            if cs is None:
+                return None
+            cs.connection.connect()
+            data, sw1, sw2 = cs.connection.transmit(GET_UID)
+            cs.connection.disconnect()
+            if ((sw1 << 8) | sw2) == 0x9000 and data:
+                return toHexString(data).replace(" ", "")
+        except Exception as e:
+            # タイムアウトエラーは表示しない（正常動作）
+            if "Time-out" not in str(e) and "Command timeout" not in str(e):
+                print(f"スキャンエラー: {e}")
+        return None
+
+
+class SimulatedReader:
+    """タップトレースを rate 倍速で再生する疑似リーダー。
+
+    各タップの予定時刻は再生開始時刻から積算した到着間隔で決まる。処理が遅れて
+    予定時刻を過ぎた場合は即座に返し、last_tap_at には予定時刻を入れる（滞留も
+    レイテンシとして計測できるようにするため）。
+    """
+
+    name = "simulated"
+
+    def __init__(self, taps: Iterable[Tap], rate: float = 1.0, loop: bool = False) -> None:
+        if rate <= 0:
+            raise ValueError("rate は正の値で指定してください")
+        self._taps: List[Tap] = list(taps)
+        self.rate = rate
+        self.loop = loop
+        self._index = 0
+        self._lock = threading.Lock()
+        self._next_due: Optional[float] = None
+        self.last_tap_at: Optional[float] = None
+
+    @property
+    def exhausted(self) -> bool:
+        return not self.loop and self._index >= len(self._taps)
+
+    def read_one_uid(self, timeout: float = 3) -> Optional[str]:
+        with self._lock:
+            if not self._taps or self.exhausted:
+                time.sleep(timeout)
+                return None
+            tap = self._taps[self._index % len(self._taps)]
+            now = time.perf_counter()
+            if self._next_due is None:
+                self._next_due = now + tap.interval / self.rate
+            wait = self._next_due - now
+            if wait > timeout:
+                time.sleep(timeout)
+                return None
+            if wait > 0:
+                time.sleep(wait)
+            self.last_tap_at = self._next_due
+            self._index += 1
+            if not self.exhausted:
+                following = self._taps[self._index % len(self._taps)]
+                self._next_due += following.interval / self.rate
+            return tap.uid
+
+
+def load_trace(path: Path) -> List[Tap]:
+    """CSV (uid,interval_ms) を読み込む。"""
+    taps: List[Tap] = []
+    with Path(path).open("r", encoding="utf-8-sig", newline="") as fh:
+        for row in csv.DictReader(fh):
+            uid = (row.get("uid") or "").strip()
+            if not uid:
+                continue
+            taps.append(Tap(uid=uid, interval=float(row.get("interval_ms") or 0) / 1000.0))
+    return taps
+
+
+def save_trace(path: Path, taps: Iterable[Tap]) -> None:
+    with Path(path).open("w", encoding="utf-8", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["uid", "interval_ms"])
+        for tap in taps:
+            writer.writerow([tap.uid, round(tap.interval * 1000, 3)])
+
+
+def generate_trace(
+    transactions: int,
+    users: int = 20,
+    tools: int = 200,
+    taps_per_second: float = 1.0,
+    user_prefix: str = "SIMUSER",
+    tool_prefix: str = "SIMTOOL",
+    seed: int = 0,
+) -> List[Tap]:
+    """ユーザー→工具の順にタップする取引をポアソン到着で生成する。"""
+    rng = random.Random(seed)
+    taps: List[Tap] = []
+    for _ in range(transactions):
+        user = f"{user_prefix}{rng.randrange(users):04d}"
+        tool = f"{tool_prefix}{rng.randrange(tools):05d}"
+        taps.append(Tap(uid=user, interval=rng.expovariate(taps_per_second)))
+        taps.append(Tap(uid=tool, interval=rng.expovariate(taps_per_second)))
+    return taps
+
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def create_reader(backend: Optional[str] = None):
+    backend = (backend or os.getenv("NFC_READER_BACKEND", "pcsc")).strip().lower()
+    if backend == "pcsc":
+        return PcscReader()
+    if backend == "simulated":
+        trace_path = os.getenv("NFC_SIM_TRACE", "").strip()
+        rate = float(os.getenv("NFC_SIM_RATE", "1.0"))
+        if trace_path:
+            taps = load_trace(Path(trace_path))
+        else:
+            taps = generate_trace(int(os.getenv("NFC_SIM_TRANSACTIONS", "100")))
+        return SimulatedReader(taps, rate=rate, loop=os.getenv("NFC_SIM_LOOP", "0") == "1")
+    raise ValueError(f"未対応の NFC_READER_BACKEND です: {backend}")
+
+
+def get_reader():
+    """Return the process-wide reader, creating it on first use."""
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                _reader = create_reader()
+    return _reader
+
+
+def set_reader(reader) -> None:
+    """テストや負荷試験ハーネスからリーダーを差し替える。"""
+    global _reader
+    with _reader_lock:
+        _reader = reader
@@ -0,0 +1,224 @@
+"""In-process materialized view of open loans (tools currently out).
+
+貸出中の工具は数十〜数百件で、変わるのは貸出・返却のときだけなのに、/api/loans は
+ポーリングのたびに loans / tools / users の 3 表結合を実行していた。ここでは貸出中の
+一覧を起動時に 1 度だけ読み込み、貸出・返却・手動返却・削除の各処理がコミットした後に
+メモリ上へ反映する。DB が正であることは変わらず、定期的な reconcile() で突き合わせる
+（他プロセスや手作業の SQL による変更もここで取り込まれる）。
+
+- 一覧（貸出日時の新しい順）: list()
+- 工具 X を誰が持っているか: holder_of(tool_uid)
+- ユーザー Y が持っている工具: held_by(user_uid)
+
+add_listener() で登録した関数には、貸出中になった行・外れた行を変更のたびに渡す
+（在庫集計などの派生データを同じタイミングで更新するため）。
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+
+@dataclass(frozen=True)
+class OpenLoan:
+    """One open loan, with tool and borrower names resolved at load time."""
+
+    id: int
+    tool_uid: str
+    tool_name: str
+    borrower_uid: str
+    borrower_name: str
+    loaned_at: datetime
+
+    @classmethod
+    def from_row(cls, row: Sequence[object]) -> "OpenLoan":
+        """(id, tool_uid, tool_name, borrower_uid, borrower_name, loaned_at) の行から作る"""
+        loan_id, tool_uid, tool_name, borrower_uid, borrower_name, loaned_at = row
+        return cls(int(loan_id), str(tool_uid), str(tool_name or tool_uid),
+                   str(borrower_uid), str(borrower_name or borrower_uid), loaned_at)
+
+    def as_dict(self) -> Dict[str, object]:
+        """/api/loans の open_loans と同じ形"""
+        return {
+            "id": self.id,
+            "tool_uid": self.tool_uid,
+            "tool": self.tool_name,
+            "borrower_uid": self.borrower_uid,
+            "borrower": self.borrower_name,
+            "loaned_at": self.loaned_at.isoformat(),
+        }
+
+
+# listener(opened, closed): 貸出中になった行と、貸出中でなくなった行
+LoanListener = Callable[[List[OpenLoan], List[OpenLoan]], None]
+
+
+def _newest_first(loans: Iterable[OpenLoan]) -> List[OpenLoan]:
+    return sorted(loans, key=lambda loan: (loan.loaned_at, loan.id), reverse=True)
+
+
+class OpenLoanView:
+    """Open loans indexed by loan id, tool UID and borrower UID (thread-safe).
+
+    変更（add / remove / rename）のたびに sequence が 1 つ進む。reconcile() には DB を
+    読む直前の sequence を渡し、読んでいる間に変更が入っていればその結果は捨てる
+    （コミット済みの貸出を古いスナップショットで消さないため）。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._by_id: Dict[int, OpenLoan] = {}
+        self._by_tool: Dict[str, Set[int]] = {}
+        self._by_borrower: Dict[str, Set[int]] = {}
+        self._ordered: Optional[List[OpenLoan]] = None
+        self._sequence = 0
+        self._listeners: List[LoanListener] = []
+        self.loaded = False
+
+    @property
+    def sequence(self) -> int:
+        return self._sequence
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def add_listener(self, listener: LoanListener) -> None:
+        """変更の通知先を登録する（ロック内で呼ぶので、通知先からビューを更新しないこと）"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def replay(self, fn: Callable[[List[OpenLoan]], None]) -> None:
+        """ロック内で現在の貸出中の行を fn に渡す（派生データを作り直す間に変更が割り込まないように）"""
+        with self._lock:
+            fn(list(self._by_id.values()))
+
+    def _notify(self, opened: List[OpenLoan], closed: List[OpenLoan]) -> None:
+        if not (opened or closed):
+            return
+        for listener in self._listeners:
+            listener(opened, closed)
+
+    # --- 読み込み・突き合わせ ---
+    def load(self, rows: Iterable[Sequence[object]]) -> None:
+        """DB から読んだ貸出中の行で全体を置き換える"""
+        with self._lock:
+            self._replace([OpenLoan.from_row(row) for row in rows])
+
+    def reconcile(self, rows: Iterable[Sequence[object]], since: Optional[int] = None) -> Optional[Dict[str, int]]:
+        """DB の行と突き合わせて置き換え、差分 {added, removed, changed} を返す。
+
+        since（DB を読む前の sequence）以降にメモリ側の変更があった場合は何もせず None。
+        """
+        loans = {loan.id: loan for loan in map(OpenLoan.from_row, rows)}
+        with self._lock:
+            if since is not None and since != self._sequence:
+                return None
+            current = self._by_id
+            diff = {
+                "added": sum(1 for loan_id in loans if loan_id not in current),
+                "removed": sum(1 for loan_id in current if loan_id not in loans),
+                "changed": sum(1 for loan_id, loan in loans.items()
+                               if loan_id in current and current[loan_id] != loan),
+            }
+            if any(diff.values()) or not self.loaded:
+                self._replace(list(loans.values()))
+            return diff
+
+    def _replace(self, loans: List[OpenLoan]) -> None:
+        previous = self._by_id
+        replaced = {loan.id: loan for loan in loans}
+        self._by_id = {}
+        self._by_tool = {}
+        self._by_borrower = {}
+        for loan in loans:
+            self._index(loan)
+        self._ordered = None
+        self._sequence += 1
+        self.loaded = True
+        self._notify(
+            [loan for loan in loans if previous.get(loan.id) != loan],
+            [loan for loan_id, loan in previous.items() if replaced.get(loan_id) != loan],
+        )
+
+    # --- 更新（DB のコミット後に呼ぶ） ---
+    def add(self, loan: OpenLoan) -> None:
+        with self._lock:
+            previous = self._by_id.get(loan.id)
+            if previous is not None:
+                self._unindex(previous)
+            self._index(loan)
+            self._changed()
+            if previous != loan:
+                self._notify([loan], [previous] if previous is not None else [])
+
+    def remove(self, loan_id: int) -> Optional[OpenLoan]:
+        with self._lock:
+            loan = self._by_id.get(loan_id)
+            if loan is not None:
+                self._unindex(loan)
+                self._notify([], [loan])
+            self._changed()
+            return loan
+
+    def rename_tool(self, tool_uid: str, name: str) -> None:
+        """工具の登録名が変わったときに表示名を差し替える"""
+        with self._lock:
+            self._rename(self._by_tool.get(tool_uid, ()), tool_name=name)
+
+    def rename_user(self, user_uid: str, name: str) -> None:
+        """ユーザーの氏名が変わったときに表示名を差し替える"""
+        with self._lock:
+            self._rename(self._by_borrower.get(user_uid, ()), borrower_name=name)
+
+    def _rename(self, loan_ids: Iterable[int], **names: str) -> None:
+        # 通知先には差し替えた行を「外れた行 + 貸出中になった行」として渡す
+        closed = [self._by_id[loan_id] for loan_id in loan_ids]
+        opened = [replace(loan, **names) for loan in closed]
+        for loan in opened:
+            self._by_id[loan.id] = loan
+        self._changed()
+        changed = [(new, old) for new, old in zip(opened, closed) if new != old]
+        self._notify([new for new, _ in changed], [old for _, old in changed])
+
+    def _index(self, loan: OpenLoan) -> None:
+        self._by_id[loan.id] = loan
+        self._by_tool.setdefault(loan.tool_uid, set()).add(loan.id)
+        self._by_borrower.setdefault(loan.borrower_uid, set()).add(loan.id)
+
+    def _unindex(self, loan: OpenLoan) -> None:
+        del self._by_id[loan.id]
+        for index, key in ((self._by_tool, loan.tool_uid), (self._by_borrower, loan.borrower_uid)):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(loan.id)
+                if not ids:
+                    del index[key]
+
+    def _changed(self) -> None:
+        self._ordered = None
+        self._sequence += 1
+
+    # --- 参照 ---
+    def list(self, limit: Optional[int] = None) -> List[OpenLoan]:
+        """貸出日時の新しい順（並べ替えは変更後の最初の参照で 1 度だけ）"""
+        with self._lock:
+            if self._ordered is None:
+                self._ordered = _newest_first(self._by_id.values())
+            ordered = self._ordered
+        return ordered[:limit] if limit is not None else list(ordered)
+
+    def get(self, loan_id: int) -> Optional[OpenLoan]:
+        return self._by_id.get(loan_id)
+
+    def holder_of(self, tool_uid: str) -> Optional[OpenLoan]:
+        """工具の貸出中レコード（重複していれば最も新しいもの）"""
+        with self._lock:
+            loans = [self._by_id[loan_id] for loan_id in self._by_tool.get(tool_uid, ())]
+        return _newest_first(loans)[0] if loans else None
+
+    def held_by(self, user_uid: str) -> List[OpenLoan]:
+        with self._lock:
+            loans = [self._by_id[loan_id] for loan_id in self._by_borrower.get(user_uid, ())]
+        return _newest_first(loans)
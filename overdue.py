@@ -0,0 +1,195 @@
+"""Overdue loan detection with per tool-name maximum loan durations.
+
+貸出中の各レコードに期限（貸出日時 + 工具名ごとの上限時間）を付け、期限順のヒープに
+積む。tick() は先頭から期限を過ぎたものだけを取り出すので、1 回の確認で見るのは
+その間に期限を迎えた貸出だけ（貸出中の件数・loans 表の大きさによらない）。
+
+貸出・返却は OpenLoanView の listener（loans_changed）として受け取る。返却された
+貸出はヒープから即座には消さず、取り出したときに無効なら読み捨てる（遅延削除）。
+上限時間を変えたときだけ全件の期限を計算し直す。
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from open_loans import OpenLoan
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# 上限時間として扱う最大値（1 年）。これを超える値・NaN・無限大は読み捨てる
+MAX_LIMIT_HOURS = 24 * 366
+
+
+def _hours(value: Optional[float]) -> Optional[timedelta]:
+    if value is None:
+        return None
+    try:
+        hours = float(value)
+    except (TypeError, ValueError):
+        hours = math.nan
+    if not math.isfinite(hours) or hours > MAX_LIMIT_HOURS:
+        # DB に不正な値が残っていても起動・突き合わせを止めない
+        print(f"[overdue] ignoring loan limit {value!r} (must be a finite number up to {MAX_LIMIT_HOURS} hours)")
+        return None
+    if hours <= 0:
+        return None
+    return timedelta(hours=hours)
+
+
+class OverdueEngine:
+    """Deadline heap over open loans; tick() reports loans that just became overdue.
+
+    limits は {工具名: 上限時間}。載っていない工具名には default_hours を使う
+    （None または 0 以下なら期限なし）。
+    """
+
+    def __init__(
+        self,
+        default_hours: Optional[float] = None,
+        limits: Optional[Mapping[str, float]] = None,
+        clock: Callable[[], datetime] = _utcnow,
+    ) -> None:
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._default = _hours(default_hours)
+        self._limits: Dict[str, timedelta] = {}
+        self._loans: Dict[int, Tuple[OpenLoan, datetime]] = {}
+        self._heap: List[Tuple[datetime, int]] = []
+        self._overdue: Dict[int, Tuple[OpenLoan, datetime]] = {}
+        self._set_limits(limits or {})
+
+    # --- 上限時間 ---
+    def limit_for(self, tool_name: str) -> Optional[timedelta]:
+        return self._limits.get(tool_name, self._default)
+
+    def limits(self) -> Dict[str, float]:
+        with self._lock:
+            return {name: limit.total_seconds() / 3600 for name, limit in sorted(self._limits.items())}
+
+    @property
+    def default_hours(self) -> Optional[float]:
+        return self._default.total_seconds() / 3600 if self._default is not None else None
+
+    def set_limits(self, limits: Mapping[str, float], default_hours: Optional[float] = None) -> None:
+        """上限時間を置き換え、貸出中の期限をすべて計算し直す"""
+        with self._lock:
+            if default_hours is not None:
+                self._default = _hours(default_hours)
+            self._set_limits(limits)
+            self._reschedule()
+
+    def set_limit(self, tool_name: str, hours: Optional[float]) -> None:
+        """1 工具名の上限時間を変える（None で既定値に戻す）"""
+        with self._lock:
+            limits = self.limits()
+            limits.pop(tool_name, None)
+            if hours is not None:
+                limits[tool_name] = hours
+            self._set_limits(limits)
+            self._reschedule()
+
+    def _set_limits(self, limits: Mapping[str, float]) -> None:
+        self._limits = {}
+        for name, hours in limits.items():
+            limit = _hours(hours)
+            if limit is not None:
+                self._limits[name] = limit
+
+    def _reschedule(self) -> None:
+        loans = [loan for loan, _deadline in self._loans.values()]
+        overdue = self._overdue
+        self._loans = {}
+        self._heap = []
+        self._overdue = {}
+        now = self.clock()
+        for loan in loans:
+            deadline = self._track(loan)
+            if deadline is not None:
+                self._heap.append((deadline, loan.id))
+            # 期限を過ぎたままの貸出は通知済みとして残す（上限変更で再通知しない）
+            if deadline is not None and loan.id in overdue and deadline <= now:
+                self._overdue[loan.id] = (loan, deadline)
+        heapq.heapify(self._heap)
+
+    # --- 貸出中の変更 ---
+    def loans_changed(self, opened: Sequence[OpenLoan], closed: Sequence[OpenLoan]) -> None:
+        """OpenLoanView の listener"""
+        with self._lock:
+            was_overdue = set()
+            for loan in closed:
+                self._loans.pop(loan.id, None)
+                if self._overdue.pop(loan.id, None) is not None:
+                    was_overdue.add(loan.id)
+            now = self.clock() if was_overdue else None
+            for loan in opened:
+                deadline = self._track(loan)
+                if deadline is None:
+                    continue
+                heapq.heappush(self._heap, (deadline, loan.id))
+                # 名前の変更などで同じ貸出が入れ替わった場合は、期限切れのままなら再通知しない
+                if loan.id in was_overdue and deadline <= now:
+                    self._overdue[loan.id] = self._loans[loan.id]
+
+    def _track(self, loan: OpenLoan) -> Optional[datetime]:
+        limit = self.limit_for(loan.tool_name)
+        if limit is None:
+            return None
+        deadline = loan.loaned_at + limit
+        self._loans[loan.id] = (loan, deadline)
+        return deadline
+
+    # --- 確認 ---
+    def tick(self, now: Optional[datetime] = None) -> List[Dict[str, object]]:
+        """前回から期限を過ぎた貸出を返す（同じ貸出は 1 度だけ）"""
+        now = now or self.clock()
+        newly: List[Dict[str, object]] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, loan_id = heapq.heappop(self._heap)
+                tracked = self._loans.get(loan_id)
+                if tracked is None or tracked[1] != deadline or loan_id in self._overdue:
+                    continue  # 返却済み・期限の変更前に積んだもの・通知済み
+                self._overdue[loan_id] = tracked
+                newly.append(self._entry(tracked, now))
+        return newly
+
+    def retry(self, loan_id: int) -> None:
+        """tick() で返した貸出を未通知に戻す（通知に失敗したとき。次の tick() で改めて返す）"""
+        with self._lock:
+            tracked = self._overdue.pop(loan_id, None)
+            if tracked is not None and self._loans.get(loan_id) == tracked:
+                heapq.heappush(self._heap, (tracked[1], loan_id))
+
+    def overdue(self, now: Optional[datetime] = None) -> List[Dict[str, object]]:
+        """期限を過ぎている貸出（期限の古い順）。tick() で検出済みのもの"""
+        now = now or self.clock()
+        with self._lock:
+            tracked = sorted(self._overdue.values(), key=lambda item: (item[1], item[0].id))
+        return [self._entry(item, now) for item in tracked]
+
+    def next_deadline(self) -> Optional[datetime]:
+        with self._lock:
+            while self._heap:
+                deadline, loan_id = self._heap[0]
+                tracked = self._loans.get(loan_id)
+                if tracked is not None and tracked[1] == deadline and loan_id not in self._overdue:
+                    return deadline
+                heapq.heappop(self._heap)
+        return None
+
+    def _entry(self, tracked: Tuple[OpenLoan, datetime], now: datetime) -> Dict[str, object]:
+        loan, deadline = tracked
+        entry = loan.as_dict()
+        entry.update({
+            "due_at": deadline.isoformat(),
+            "overdue_seconds": int((now - deadline).total_seconds()),
+            "max_hours": self.limit_for(loan.tool_name).total_seconds() / 3600,
+        })
+        return entry
@@ -12,6 +12,9 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict
 
+from metrics import PLAN_CACHE_LOOKUPS_TOTAL
+from plan_store import compile_snapshot
+
 PLAN_DATA_DIR = Path(os.getenv("PLAN_DATA_DIR", "/var/lib/toolmgmt/plan"))
 REMOTE_BASE = os.getenv("PLAN_REMOTE_BASE_URL", "").rstrip("/")
 REMOTE_TOKEN = os.getenv("PLAN_REMOTE_TOKEN", "")
@@ -83,12 +86,30 @@ def _download_dataset(filename: str) -> bytes:
         return response.read()
 
 
+def compile_plan_snapshots(logger=print) -> Dict[str, bool]:
+    """Compile each plan CSV into its binary snapshot (called after USB import / download)."""
+    results: Dict[str, bool] = {}
+    for key, filename in DATASETS.items():
+        path = PLAN_DATA_DIR / filename
+        if not path.exists():
+            continue
+        try:
+            results[key] = compile_snapshot(path) is not None
+        except Exception as exc:  # pylint: disable=broad-except
+            # スナップショットが作れなくても CSV から読めるので処理は続ける
+            logger(f"[plan-cache] snapshot compile failed for {filename}: {exc}")
+            results[key] = False
+    return results
+
+
 def maybe_refresh_plan_cache(logger=print) -> None:
     meta = RefreshMeta.load()
     if not _should_refresh(meta):
+        PLAN_CACHE_LOOKUPS_TOTAL.inc(result="hit")
         return
 
     if not REMOTE_BASE:
+        PLAN_CACHE_LOOKUPS_TOTAL.inc(result="hit")
         return
 
     logger("[plan-cache] remote refresh start")
@@ -110,9 +131,12 @@ def maybe_refresh_plan_cache(logger=print) -> None:
             meta.dataset_meta[key] = time.time()
             logger(f"[plan-cache] updated {filename} ({len(data)} bytes)")
 
+        compile_plan_snapshots(logger)
         meta.fetched_at = time.time()
         meta.save()
+        PLAN_CACHE_LOOKUPS_TOTAL.inc(result="refresh")
         logger("[plan-cache] remote refresh finished")
     except Exception as exc:  # pylint: disable=broad-except
+        PLAN_CACHE_LOOKUPS_TOTAL.inc(result="error")
         logger(f"[plan-cache] refresh aborted: {exc}")
 
@@ -0,0 +1,116 @@
+"""Due-date capacity timeline: machine hours due per process per day.
+
+生産計画と標準工数を (部品番号, 工程名) で結合した 個数 × 機械標準工数 を、
+納期 × 工程名 ごとに集計する。計画データのバージョンごとに 1 度だけ構築し、
+工程ごとに「納期（ordinal）の昇順配列・日別工数・累積和」を持つため、任意の期間の
+日別内訳は二分探索 + スライス、合計は累積和の差で求まる（行数によらずミリ秒以下）。
+"""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+from plan_index import NO_MATCH, PlanIndex, iter_joined_hours
+from plan_store import NO_DUE
+
+
+class _Series:
+    """One process: sorted due ordinals, hours per day and prefix sums."""
+
+    __slots__ = ("days", "hours", "prefix")
+
+    def __init__(self, per_day: Dict[int, float]) -> None:
+        self.days = array("i", sorted(per_day))
+        self.hours = array("d", (per_day[day] for day in self.days))
+        self.prefix = array("d", [0.0])
+        running = 0.0
+        for value in self.hours:
+            running += value
+            self.prefix.append(running)
+
+    def bounds(self, start: Optional[int], end: Optional[int]) -> tuple:
+        lo = 0 if start is None else bisect_left(self.days, start)
+        hi = len(self.days) if end is None else bisect_right(self.days, end)
+        return lo, max(lo, hi)
+
+
+class CapacityTimeline:
+    """納期 × 工程名 の工数集計（構築後は読み取り専用）"""
+
+    def __init__(self, index: PlanIndex) -> None:
+        per_code: Dict[int, Dict[int, float]] = {}
+        undated_code: Dict[int, float] = {}
+        plan = index.plan
+        if plan:
+            due = plan.due
+            process_codes = plan.codes["工程名"]
+            for row_id, hours in iter_joined_hours(index):
+                code = process_codes[row_id]
+                ordinal = due[row_id]
+                if ordinal == NO_DUE:
+                    undated_code[code] = undated_code.get(code, 0.0) + hours
+                    continue
+                per_day = per_code.get(code)
+                if per_day is None:
+                    per_day = per_code[code] = {}
+                per_day[ordinal] = per_day.get(ordinal, 0.0) + hours
+            strings = plan.strings
+        else:
+            strings = []
+        self.series: Dict[str, _Series] = {strings[code]: _Series(per_day) for code, per_day in per_code.items()}
+        # 納期が空・解析不能な行の工数（期間指定の集計には含めない）
+        self.undated: Dict[str, float] = {strings[code]: hours for code, hours in undated_code.items()}
+        # 標準工数と結合できなかった生産計画の行数
+        self.unmatched_rows = sum(1 for std_id in index.standard_for_plan if std_id == NO_MATCH)
+
+    @property
+    def processes(self) -> List[str]:
+        return sorted(set(self.series) | set(self.undated))
+
+    def first_day(self) -> Optional[date]:
+        days = [series.days[0] for series in self.series.values() if series.days]
+        return date.fromordinal(min(days)) if days else None
+
+    def last_day(self) -> Optional[date]:
+        days = [series.days[-1] for series in self.series.values() if series.days]
+        return date.fromordinal(max(days)) if days else None
+
+    def query(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        processes: Optional[Iterable[str]] = None,
+    ) -> Dict[str, object]:
+        """[start, end]（両端を含む・None は制限なし）の日別工数を工程ごとに返す"""
+        start_ord = start.toordinal() if start else None
+        end_ord = end.toordinal() if end else None
+        names = self.processes if processes is None else [name for name in processes if name]
+        rows = []
+        total = 0.0
+        for name in names:
+            series = self.series.get(name)
+            days: List[Dict[str, object]] = []
+            subtotal = 0.0
+            if series is not None:
+                lo, hi = series.bounds(start_ord, end_ord)
+                subtotal = series.prefix[hi] - series.prefix[lo]
+                days = [
+                    {"date": date.fromordinal(day).isoformat(), "hours": round(hours, 4)}
+                    for day, hours in zip(series.days[lo:hi], series.hours[lo:hi])
+                ]
+            total += subtotal
+            rows.append({
+                "process": name,
+                "total_hours": round(subtotal, 4),
+                "undated_hours": round(self.undated.get(name, 0.0), 4),
+                "days": days,
+            })
+        return {
+            "from": start.isoformat() if start else None,
+            "to": end.isoformat() if end else None,
+            "total_hours": round(total, 4),
+            "processes": rows,
+            "unmatched_rows": self.unmatched_rows,
+        }
@@ -0,0 +1,156 @@
+"""Hash indexes over the plan datasets and the plan ⇔ standard-time join.
+
+計画データのバージョンごとに 1 度だけ構築し、部品番号・製番（製造オーダー番号）から
+該当行を O(1) で引けるようにする。生産計画の各行には (部品番号, 工程名) が一致する
+標準工数の行を結合する（候補が複数あれば 製造オーダー番号 = 製番 の行を優先）。
+"""
+from __future__ import annotations
+
+import math
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from plan_store import PlanTable
+
+NO_MATCH = -1
+
+
+def _bucket(table: PlanTable, column: str) -> Dict[str, array]:
+    """値 → 行番号配列。文字列表の番号でまとめてから文字列に戻す（行ごとの文字列比較をしない）"""
+    by_code: Dict[int, array] = {}
+    for row_id, code in enumerate(table.codes[column]):
+        ids = by_code.get(code)
+        if ids is None:
+            ids = by_code[code] = array("l")
+        ids.append(row_id)
+    strings = table.strings
+    return {strings[code]: ids for code, ids in by_code.items() if strings[code]}
+
+
+def _number(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+class PlanIndex:
+    """部品番号 / 製番 の索引と、生産計画 → 標準工数 の結合結果。"""
+
+    def __init__(self, plan: Optional[PlanTable], standard: Optional[PlanTable]) -> None:
+        self.plan = plan
+        self.standard = standard
+        self.plan_by_part = _bucket(plan, "部品番号") if plan else {}
+        self.plan_by_order = _bucket(plan, "製番") if plan else {}
+        self.standard_by_part = _bucket(standard, "部品番号") if standard else {}
+        self.standard_by_order = _bucket(standard, "製造オーダー番号") if standard else {}
+        self.standard_for_plan = self._join()
+
+    def _join(self) -> array:
+        """生産計画の行ごとに結合する標準工数の行番号（なければ NO_MATCH）"""
+        joined = array("l")
+        if not self.plan:
+            return joined
+        if not self.standard:
+            joined.extend([NO_MATCH] * len(self.plan))
+            return joined
+
+        standard = self.standard
+        std_orders = standard.column("製造オーダー番号")
+        by_key: Dict[Tuple[str, str], List[int]] = {}
+        for row_id, (part, process) in enumerate(zip(standard.column("部品番号"), standard.column("工程名"))):
+            by_key.setdefault((part, process), []).append(row_id)
+
+        plan = self.plan
+        strings = plan.strings
+        # 同じ (部品番号, 工程名) のコード組は同じ候補になるので 1 度だけ引く
+        candidates_by_codes: Dict[Tuple[int, int], List[int]] = {}
+        for part_code, process_code, order_code in zip(
+            plan.codes["部品番号"], plan.codes["工程名"], plan.codes["製番"]
+        ):
+            codes = (part_code, process_code)
+            candidates = candidates_by_codes.get(codes)
+            if candidates is None:
+                candidates = candidates_by_codes[codes] = by_key.get((strings[part_code], strings[process_code]), [])
+            if not candidates:
+                joined.append(NO_MATCH)
+                continue
+            choice = candidates[0]
+            if len(candidates) > 1:
+                order = strings[order_code]
+                for candidate in candidates:
+                    if std_orders[candidate] == order:
+                        choice = candidate
+                        break
+            joined.append(choice)
+        return joined
+
+    # --- 参照 ---
+    def plan_rows(self, part: str = "", order: str = "") -> List[int]:
+        return _select(self.plan_by_part, self.plan_by_order, part, order)
+
+    def standard_rows(self, part: str = "", order: str = "") -> List[int]:
+        return _select(self.standard_by_part, self.standard_by_order, part, order)
+
+    def plan_record(self, row_id: int) -> Dict[str, object]:
+        """生産計画の 1 行に、結合した標準工数と 機械標準工数 × 個数 を付けた dict"""
+        row = self.plan[row_id]
+        record: Dict[str, object] = row.to_dict()
+        quantity = _number(row.number("個数"))
+        std_id = self.standard_for_plan[row_id] if self.standard_for_plan else NO_MATCH
+        if std_id == NO_MATCH:
+            record.update({"製造オーダー番号": None, "機械標準工数": None, "標準工数合計": None})
+            return record
+        std_row = self.standard[std_id]
+        std_hours = _number(std_row.number("機械標準工数"))
+        record.update({
+            "製造オーダー番号": std_row["製造オーダー番号"],
+            "機械標準工数": std_hours,
+            "標準工数合計": (
+                round(quantity * std_hours, 4) if quantity is not None and std_hours is not None else None
+            ),
+        })
+        return record
+
+    def standard_record(self, row_id: int) -> Dict[str, object]:
+        row = self.standard[row_id]
+        record: Dict[str, object] = row.to_dict()
+        record["機械標準工数"] = _number(row.number("機械標準工数"))
+        return record
+
+    def lookup(self, part: str = "", order: str = "") -> Dict[str, object]:
+        plan_records = [self.plan_record(row_id) for row_id in self.plan_rows(part, order)]
+        standard_records = [self.standard_record(row_id) for row_id in self.standard_rows(part, order)]
+        return {
+            "part": part or None,
+            "order": order or None,
+            "plan_rows": plan_records,
+            "standard_rows": standard_records,
+            "total_standard_hours": round(
+                sum(record["標準工数合計"] or 0.0 for record in plan_records), 4
+            ),
+        }
+
+
+def _select(by_part: Dict[str, array], by_order: Dict[str, array], part: str, order: str) -> List[int]:
+    """part と order の両方があれば積集合、片方ならその索引だけを引く"""
+    if part and order:
+        order_ids = set(by_order.get(order, ()))
+        return [row_id for row_id in by_part.get(part, ()) if row_id in order_ids]
+    if part:
+        return list(by_part.get(part, ()))
+    if order:
+        return list(by_order.get(order, ()))
+    return []
+
+
+def iter_joined_hours(index: PlanIndex) -> Iterable[Tuple[int, float]]:
+    """(生産計画の行番号, 機械標準工数 × 個数) を結合できた行について返す"""
+    plan, standard = index.plan, index.standard
+    if not plan or not standard:
+        return
+    quantities = plan.numbers["個数"]
+    std_hours = standard.numbers["機械標準工数"]
+    for row_id, std_id in enumerate(index.standard_for_plan):
+        if std_id == NO_MATCH:
+            continue
+        value = quantities[row_id] * std_hours[std_id]
+        if not math.isnan(value):
+            yield row_id, value
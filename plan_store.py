@@ -0,0 +1,443 @@
+"""Compact in-memory store for production plan / standard time CSVs.
+
+行ごとの dict（日本語キー文字列 × 行数）を持つ代わりに、列ごとの配列で保持する。
+
+- 文字列はテーブル単位の文字列表に 1 度だけ持ち、各列は文字列番号の array('I')（辞書符号化）
+- 数値列（個数・機械標準工数）は読み込み時に 1 度だけ解析し array('d') に保持（解析不能は NaN）
+- 納期は date.toordinal() の array('i') に保持（空・解析不能は 0）
+- 並べ替えは行を複製せず、行番号の配列（PlanView）で表す
+
+同じ配置をそのままファイルに書いたものがスナップショット（<csv>.snapshot）で、
+load_table() は mmap して配列をコピーせずに参照する（CSV の解析・strptime が不要）。
+CSV が正本で、スナップショットは CSV の内容ハッシュが一致する場合だけ使う。
+スナップショットは CSV の隣に置く。PLAN_SNAPSHOT_DIR を設定するとそのディレクトリに置く
+（CSV のディレクトリが読み取り専用・USB 同期の対象の場合）。
+
+テンプレートや既存コードからは row['部品番号'] / row.get(...) の形でそのまま参照できる。
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+NUMERIC_COLUMNS = ("個数", "機械標準工数")
+DUE_COLUMN = "納期"
+DUE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d")
+NO_DUE = 0
+
+SNAPSHOT_SUFFIX = ".snapshot"
+# スナップショットの置き場所（空なら CSV と同じディレクトリ）
+SNAPSHOT_DIR = os.getenv("PLAN_SNAPSHOT_DIR", "")
+SNAPSHOT_MAGIC = b"TMPLSNAP"
+SNAPSHOT_FORMAT = 1
+_ALIGN = 8
+_STRING_SEP = "\x00"
+
+
+class PlanHeaderError(ValueError):
+    """CSV のヘッダーが想定の列と一致しない"""
+
+    def __init__(self, headers: Sequence[str]) -> None:
+        super().__init__(f"unexpected header: {list(headers)}")
+        self.headers = list(headers)
+
+
+def parse_number(value: str) -> float:
+    try:
+        return float(value.replace(",", "")) if value else math.nan
+    except ValueError:
+        return math.nan
+
+
+def parse_due_ordinal(value: str) -> int:
+    if not value:
+        return NO_DUE
+    for fmt in DUE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).toordinal()
+        except ValueError:
+            continue
+    return NO_DUE
+
+
+class PlanRow:
+    """Read-only view of one row (mapping-like, no per-row dict)."""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "PlanTable", index: int) -> None:
+        self._table = table
+        self._index = index
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    def __getitem__(self, column: str) -> str:
+        table = self._table
+        return table.strings[table.codes[column][self._index]]
+
+    def get(self, column: str, default=None):
+        table = self._table
+        codes = table.codes.get(column)
+        return default if codes is None else table.strings[codes[self._index]]
+
+    def keys(self) -> List[str]:
+        return list(self._table.column_names)
+
+    def __contains__(self, column: object) -> bool:
+        return column in self._table.codes
+
+    def number(self, column: str) -> float:
+        return self._table.numbers[column][self._index]
+
+    @property
+    def due_ordinal(self) -> int:
+        return self._table.due[self._index] if self._table.due is not None else NO_DUE
+
+    def to_dict(self) -> Dict[str, str]:
+        return {name: self[name] for name in self._table.column_names}
+
+    def __repr__(self) -> str:
+        return f"PlanRow({self.to_dict()!r})"
+
+
+class Column:
+    """Sequence of decoded values for one dictionary-encoded column."""
+
+    __slots__ = ("strings", "codes")
+
+    def __init__(self, strings: List[str], codes: Sequence[int]) -> None:
+        self.strings = strings
+        self.codes = codes
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index: int) -> str:
+        return self.strings[self.codes[index]]
+
+    def __iter__(self) -> Iterator[str]:
+        strings = self.strings
+        for code in self.codes:
+            yield strings[code]
+
+
+class PlanTable:
+    """Columnar table: dictionary-encoded strings and typed numeric/due arrays."""
+
+    __slots__ = ("column_names", "strings", "codes", "numbers", "due", "source", "_length", "_mmap")
+
+    def __init__(self, column_names: Sequence[str]) -> None:
+        self.column_names = tuple(column_names)
+        self.strings: List[str] = []
+        self.codes: Dict[str, Sequence[int]] = {name: array("I") for name in self.column_names}
+        self.numbers: Dict[str, Sequence[float]] = {
+            name: array("d") for name in NUMERIC_COLUMNS if name in self.column_names
+        }
+        self.due: Optional[Sequence[int]] = array("i") if DUE_COLUMN in self.column_names else None
+        self.source = "csv"
+        self._length = 0
+        self._mmap = None
+
+    @classmethod
+    def from_rows(cls, column_names: Sequence[str], rows: Iterable[Sequence[str]]) -> "PlanTable":
+        """Build from positional rows (same order as column_names)."""
+        table = cls(column_names)
+        string_ids: Dict[str, int] = {}
+        strings = table.strings
+        targets = [table.codes[name] for name in table.column_names]
+        width = len(targets)
+        numeric = [(table.column_names.index(name), values) for name, values in table.numbers.items()]
+        due_pos = table.column_names.index(DUE_COLUMN) if table.due is not None else None
+        # 同じ文字列（個数・納期）は解析結果を使い回す
+        number_cache: Dict[str, float] = {}
+        due_cache: Dict[str, int] = {}
+        count = 0
+        for row in rows:
+            cells = list(row[:width])
+            if len(cells) < width:
+                cells.extend([""] * (width - len(cells)))
+            for target, value in zip(targets, cells):
+                code = string_ids.get(value)
+                if code is None:
+                    code = string_ids[value] = len(strings)
+                    strings.append(value)
+                target.append(code)
+            for pos, values in numeric:
+                raw = cells[pos]
+                number = number_cache.get(raw)
+                if number is None:
+                    number = number_cache[raw] = parse_number(raw)
+                values.append(number)
+            if due_pos is not None:
+                raw = cells[due_pos]
+                ordinal = due_cache.get(raw)
+                if ordinal is None:
+                    ordinal = due_cache[raw] = parse_due_ordinal(raw)
+                table.due.append(ordinal)
+            count += 1
+        table._length = count
+        return table
+
+    @classmethod
+    def from_csv(cls, fh, column_names: Sequence[str]) -> "PlanTable":
+        """Read a CSV whose header must equal column_names (PlanHeaderError otherwise)."""
+        reader = csv.reader(fh)
+        headers = next(reader, [])
+        if list(headers) != list(column_names):
+            raise PlanHeaderError(headers)
+        return cls.from_rows(column_names, (row for row in reader if row))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[PlanRow]:
+        for index in range(self._length):
+            yield PlanRow(self, index)
+
+    def __getitem__(self, index: int) -> PlanRow:
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return PlanRow(self, index)
+
+    def column(self, name: str) -> Column:
+        return Column(self.strings, self.codes[name])
+
+    def sorted_view(self, key: Callable[[int], object]) -> "PlanView":
+        order = array("l", sorted(range(self._length), key=key))
+        return PlanView(self, order)
+
+
+class PlanView:
+    """Rows of a PlanTable in a given order (row numbers only, no copies)."""
+
+    __slots__ = ("table", "order")
+
+    def __init__(self, table: PlanTable, order: Optional[array] = None) -> None:
+        self.table = table
+        self.order = order if order is not None else array("l", range(len(table)))
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __iter__(self) -> Iterator[PlanRow]:
+        table = self.table
+        for index in self.order:
+            yield PlanRow(table, index)
+
+    def __getitem__(self, position: int) -> PlanRow:
+        return PlanRow(self.table, self.order[position])
+
+
+def sort_plan(table: PlanTable) -> PlanView:
+    """生産計画: 納期（空は末尾）→ 製番"""
+    due = table.due
+    seiban = table.column("製番")
+    last = math.inf
+    return table.sorted_view(lambda i: (due[i] or last, seiban[i]))
+
+
+def sort_standard_times(table: PlanTable) -> PlanView:
+    """標準工数: 部品番号 → 工程名"""
+    parts = table.column("部品番号")
+    processes = table.column("工程名")
+    return table.sorted_view(lambda i: (parts[i], processes[i]))
+
+
+def partition_view(view: PlanView, column: str) -> Dict[str, PlanView]:
+    """Split a view by the value of ``column`` keeping the view's order (row numbers only)."""
+    table = view.table
+    codes = table.codes[column]
+    by_code: Dict[int, array] = {}
+    for index in view.order:
+        code = codes[index]
+        order = by_code.get(code)
+        if order is None:
+            order = by_code[code] = array("l")
+        order.append(index)
+    return {table.strings[code]: PlanView(table, order) for code, order in by_code.items()}
+
+
+# =========================
+# バイナリスナップショット
+# =========================
+# [MAGIC 8B][ヘッダー長 uint32][ヘッダー JSON][8B 境界に揃えた各セクション]
+# セクション: strings（NUL 区切り UTF-8）, codes:<列>（uint32）, numbers:<列>（float64）, due（int32）
+
+
+def snapshot_path_for(csv_path: Path) -> Path:
+    csv_path = Path(csv_path)
+    if SNAPSHOT_DIR:
+        return Path(SNAPSHOT_DIR) / (csv_path.name + SNAPSHOT_SUFFIX)
+    return csv_path.with_name(csv_path.name + SNAPSHOT_SUFFIX)
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with Path(path).open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def write_snapshot(table: PlanTable, csv_path: Path, snapshot_path: Optional[Path] = None) -> Optional[Path]:
+    """Write table as the snapshot of csv_path. Returns None if the data cannot be encoded."""
+    csv_path = Path(csv_path)
+    snapshot_path = Path(snapshot_path or snapshot_path_for(csv_path))
+    if any(_STRING_SEP in value for value in table.strings):
+        return None
+
+    sections: List[Tuple[str, bytes]] = [("strings", _STRING_SEP.join(table.strings).encode("utf-8"))]
+    for name in table.column_names:
+        sections.append((f"codes:{name}", array("I", table.codes[name]).tobytes()))
+    for name, values in table.numbers.items():
+        sections.append((f"numbers:{name}", array("d", values).tobytes()))
+    if table.due is not None:
+        sections.append(("due", array("i", table.due).tobytes()))
+
+    st = csv_path.stat()
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "byteorder": sys.byteorder,
+        "source_sha256": file_sha256(csv_path),
+        "source_size": st.st_size,
+        "source_mtime_ns": st.st_mtime_ns,
+        "columns": list(table.column_names),
+        "rows": len(table),
+        "string_count": len(table.strings),
+        "sections": {},
+    }
+    # セクション位置はヘッダー長に依存するため、長さが変わらなくなるまで計算し直す
+    header_bytes = b""
+    while True:
+        offset = _aligned(len(SNAPSHOT_MAGIC) + 4 + len(header_bytes))
+        for name, payload in sections:
+            header["sections"][name] = [offset, len(payload)]
+            offset = _aligned(offset + len(payload))
+        encoded = json.dumps(header, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        if len(encoded) == len(header_bytes):
+            break
+        header_bytes = encoded
+
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = snapshot_path.with_name(f".{snapshot_path.name}.{os.getpid()}.tmp")
+    with tmp_path.open("wb") as fh:
+        fh.write(SNAPSHOT_MAGIC)
+        fh.write(struct.pack("<I", len(header_bytes)))
+        fh.write(header_bytes)
+        for name, payload in sections:
+            fh.write(b"\0" * (header["sections"][name][0] - fh.tell()))
+            fh.write(payload)
+    os.replace(tmp_path, snapshot_path)
+    return snapshot_path
+
+
+def _read_snapshot_header(mm: mmap.mmap) -> Optional[dict]:
+    if mm[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        return None
+    start = len(SNAPSHOT_MAGIC)
+    (length,) = struct.unpack("<I", mm[start:start + 4])
+    try:
+        header = json.loads(mm[start + 4:start + 4 + length].decode("utf-8"))
+    except ValueError:
+        return None
+    if header.get("format") != SNAPSHOT_FORMAT or header.get("byteorder") != sys.byteorder:
+        return None
+    return header
+
+
+def _snapshot_is_current(header: dict, csv_path: Path) -> bool:
+    """CSV が変わっていなければ True。mtime が違っても内容ハッシュが同じなら有効。"""
+    try:
+        st = csv_path.stat()
+    except OSError:
+        return False
+    if st.st_size != header.get("source_size"):
+        return False
+    if st.st_mtime_ns == header.get("source_mtime_ns"):
+        return True
+    return file_sha256(csv_path) == header.get("source_sha256")
+
+
+def load_snapshot(csv_path: Path, snapshot_path: Optional[Path] = None) -> Optional[PlanTable]:
+    """Map the snapshot of csv_path, or return None when missing, stale or unreadable."""
+    csv_path = Path(csv_path)
+    snapshot_path = Path(snapshot_path or snapshot_path_for(csv_path))
+    try:
+        with snapshot_path.open("rb") as fh:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        header = _read_snapshot_header(mm)
+    except struct.error:
+        header = None
+    if header is None or not _snapshot_is_current(header, csv_path):
+        mm.close()
+        return None
+
+    view = memoryview(mm)
+    sections = header["sections"]
+
+    def section(name: str, fmt: str):
+        offset, length = sections[name]
+        return view[offset:offset + length].cast(fmt)
+
+    table = PlanTable(header["columns"])
+    offset, length = sections["strings"]
+    # 文字列表（ユニーク値のみ）だけはデコードする。列・数値・納期は mmap を直接参照
+    if header["string_count"]:
+        table.strings = bytes(view[offset:offset + length]).decode("utf-8").split(_STRING_SEP)
+    table.codes = {name: section(f"codes:{name}", "I") for name in table.column_names}
+    table.numbers = {name: section(f"numbers:{name}", "d") for name in table.numbers}
+    if table.due is not None:
+        table.due = section("due", "i")
+    table.source = "snapshot"
+    table._length = header["rows"]
+    table._mmap = mm
+    return table
+
+
+def compile_snapshot(csv_path: Path) -> Optional[Path]:
+    """Parse csv_path (columns taken from its own header) and write its snapshot."""
+    csv_path = Path(csv_path)
+    with csv_path.open("r", encoding="utf-8-sig", newline="") as fh:
+        headers = next(csv.reader(fh), [])
+        fh.seek(0)
+        table = PlanTable.from_csv(fh, headers)
+    return write_snapshot(table, csv_path)
+
+
+def load_table(csv_path: Path, column_names: Sequence[str], write_back: bool = True) -> PlanTable:
+    """Load csv_path via its snapshot when current, else parse the CSV (and refresh the snapshot)."""
+    table = load_snapshot(csv_path)
+    if table is not None:
+        if list(table.column_names) != list(column_names):
+            raise PlanHeaderError(table.column_names)
+        return table
+    with Path(csv_path).open("r", encoding="utf-8-sig", newline="") as fh:
+        table = PlanTable.from_csv(fh, column_names)
+    if write_back:
+        try:
+            write_snapshot(table, csv_path)
+        except OSError as exc:
+            # 書き込み権限がなくても CSV から読めていれば表示は続ける
+            print(f"[plan-store] snapshot not written for {csv_path}: {exc}")
+    return table
@@ -0,0 +1,122 @@
+"""Registry of prepared statements for the hot SQL paths.
+
+タップ処理で毎回送る SQL（氏名・工具名の参照、scan_events への insert、貸出・返却、
+貸出中一覧）は、同じ文でも送るたびに Postgres が構文解析と実行計画の作成をやり直す。
+ここでは文を名前付きで登録しておき、prepare(conn) で接続ごとに 1 度だけ PREPARE し、
+以後は EXECUTE <名前>(...) で実行する。
+
+- SQL は psycopg2 と同じ %s の位置パラメータで書く（PREPARE 用に $1, $2 ... へ変換する）。
+- prepare() していない接続、PREPARE に失敗した接続（pgbouncer の transaction モードなど）
+  では、登録した SQL をそのまま実行する。リクエストごとに開いて閉じる接続は
+  PREPARE の往復の方が高くつくため、prepare() は使い回す接続にだけ呼ぶ。
+- 文の計時・スロークエリログは traced_cursor の名前（登録名）で記録される。
+"""
+from __future__ import annotations
+
+import re
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+from db_trace import traced_cursor
+
+_PLACEHOLDER = re.compile(r"%s")
+# prepared statement が消えていた（DEALLOCATE / DISCARD ALL / 接続の付け替え）
+INVALID_STATEMENT_NAME = "26000"
+
+
+@dataclass(frozen=True)
+class Statement:
+    """One registered statement: plain SQL with %s and its PREPARE form."""
+
+    name: str
+    sql: str
+    param_types: Tuple[str, ...]
+
+    @property
+    def prepare_sql(self) -> str:
+        counter = iter(range(1, len(self.param_types) + 1))
+        body = _PLACEHOLDER.sub(lambda _match: f"${next(counter)}", self.sql)
+        types = f"({', '.join(self.param_types)})" if self.param_types else ""
+        return f'PREPARE "{self.name}"{types} AS {body}'
+
+    @property
+    def execute_sql(self) -> str:
+        if not self.param_types:
+            return f'EXECUTE "{self.name}"'
+        return f'EXECUTE "{self.name}"({", ".join(["%s"] * len(self.param_types))})'
+
+
+class StatementRegistry:
+    """Named statements, PREPAREd once per connection and executed by name."""
+
+    def __init__(self) -> None:
+        self._statements: Dict[str, Statement] = {}
+        # 接続ごとの PREPARE 済みの名前（接続が閉じられて破棄されれば消える）
+        self._prepared: "weakref.WeakKeyDictionary[object, frozenset]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def register(self, name: str, sql: str, param_types: Sequence[str] = ()) -> Statement:
+        if "%(" in sql:
+            raise ValueError(f"{name}: 名前付きパラメータは PREPARE できません")
+        if len(_PLACEHOLDER.findall(sql)) != len(param_types):
+            raise ValueError(f"{name}: %s の数と param_types の数が一致しません")
+        statement = Statement(name, sql, tuple(param_types))
+        self._statements[name] = statement
+        return statement
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._statements
+
+    def names(self) -> Tuple[str, ...]:
+        return tuple(self._statements)
+
+    def prepared_on(self, conn) -> frozenset:
+        try:
+            with self._lock:
+                return self._prepared.get(conn, frozenset())
+        except TypeError:  # 弱参照できない接続
+            return frozenset()
+
+    def _remember(self, conn, names: frozenset) -> None:
+        try:
+            with self._lock:
+                self._prepared[conn] = names
+        except TypeError:
+            pass
+
+    def prepare(self, conn) -> bool:
+        """未 PREPARE の登録文を 1 トランザクションで PREPARE する（接続直後など、トランザクション外で呼ぶ）"""
+        done = self.prepared_on(conn)
+        pending = [s for name, s in self._statements.items() if name not in done]
+        if not pending:
+            return True
+        try:
+            with conn, traced_cursor(conn, "prepare") as cur:
+                for statement in pending:
+                    cur.execute(statement.prepare_sql, name=f"prepare.{statement.name}")
+        except Exception as exc:  # pylint: disable=broad-except
+            # 以後この接続では SQL をそのまま実行する
+            print(f"[prepared] PREPARE failed, falling back to plain SQL: {exc}")
+            return False
+        self._remember(conn, done | {s.name for s in pending})
+        return True
+
+    def forget(self, conn) -> None:
+        """接続の PREPARE 済みの記録を消す（以後は再度 prepare() するまで SQL をそのまま実行）"""
+        self._remember(conn, frozenset())
+
+    def execute(self, cur, name: str, params: Optional[Sequence] = None):
+        """登録名で実行する。cur は traced_cursor() のカーソル"""
+        statement = self._statements[name]
+        params = tuple(params or ())
+        if name not in self.prepared_on(cur.connection):
+            return cur.execute(statement.sql, params or None, name=name)
+        try:
+            return cur.execute(statement.execute_sql, params or None, name=name)
+        except Exception as exc:
+            if getattr(exc, "pgcode", None) == INVALID_STATEMENT_NAME:
+                # このトランザクションは失敗扱いのまま。次から SQL をそのまま実行する
+                self.forget(cur.connection)
+            raise
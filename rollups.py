@@ -0,0 +1,180 @@
+"""Hourly / daily usage rollups of loans and scan_events for Grafana.
+
+Grafana の利用率グラフが loans / scan_events の生データを毎回集計すると、月を追うごとに
+遅くなり、キオスクと同じ Pi の CPU を取り合う。ここでは集計済みの表を持ち、
+ダッシュボードはそれだけを参照する。
+
+- loan_usage_rollup: 粒度（hour / day）× 時間帯 × 次元（tool / tool_name / borrower）ごとの
+  貸出件数（loaned_at の時間帯）、返却件数と貸出時間の合計・中央値（returned_at の時間帯）
+- scan_tap_rollup: 粒度 × 時間帯 × ステーションごとのタップ数（ユーザー / 工具の内訳付き）
+
+rollup_state の watermark より前の時間帯は確定済みとみなし、refresh_rollups() は
+watermark − 猶予（コミットの遅れ分）を含む時間帯から後だけを生データから作り直す。
+中央値は足し合わせられないため、日次も時間次から合成せず生データから集計する。
+古い貸出を削除・修正したときは mark_rollups_dirty() で watermark を戻す。
+時間帯の区切りは DB のタイムゾーン（apply_db_tuning.sql で Asia/Tokyo）に従う。
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from db_trace import traced_cursor
+from loan_archive import ALL_LOANS_SQL
+
+GRAINS = ("hour", "day")
+STATE_NAME = "usage"
+# 同時に 2 つの集計が走らないようにする advisory lock の番号
+ADVISORY_LOCK_KEY = 4_707_001
+# NOW() はトランザクション開始時刻なので、集計より後にコミットされた行が watermark より
+# 前の時刻を持つことがある。その分だけ前の時間帯から作り直す
+ROLLUP_LATE_MARGIN = timedelta(minutes=float(os.getenv("ROLLUP_LATE_MARGIN_MINUTES", "5")))
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS loan_usage_rollup(
+      grain TEXT NOT NULL CHECK (grain IN ('hour','day')),
+      bucket_start TIMESTAMPTZ NOT NULL,
+      dimension TEXT NOT NULL CHECK (dimension IN ('tool','tool_name','borrower')),
+      key TEXT NOT NULL,
+      label TEXT NOT NULL,
+      loans INTEGER NOT NULL DEFAULT 0,
+      returns INTEGER NOT NULL DEFAULT 0,
+      total_duration_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+      median_duration_seconds DOUBLE PRECISION,
+      PRIMARY KEY (grain, dimension, bucket_start, key)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS scan_tap_rollup(
+      grain TEXT NOT NULL CHECK (grain IN ('hour','day')),
+      bucket_start TIMESTAMPTZ NOT NULL,
+      station_id TEXT NOT NULL,
+      taps INTEGER NOT NULL DEFAULT 0,
+      user_taps INTEGER NOT NULL DEFAULT 0,
+      tool_taps INTEGER NOT NULL DEFAULT 0,
+      PRIMARY KEY (grain, bucket_start, station_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_state(
+      name TEXT PRIMARY KEY,
+      watermark TIMESTAMPTZ NOT NULL,
+      refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    # 作り直す範囲を時刻で引くための索引（loans の 2 つは apply_db_tuning.sql と同じ定義）
+    "CREATE INDEX IF NOT EXISTS loans_loaned_at_idx ON loans (loaned_at DESC)",
+    "CREATE INDEX IF NOT EXISTS loans_returned_at_idx ON loans (returned_at DESC)",
+    "CREATE INDEX IF NOT EXISTS scan_events_ts_idx ON scan_events (ts)",
+)
+
+# 初回・戻した watermark からの作り直しでは古い行も要るので loans_archive も含める
+LOAN_ROLLUP_SQL = f"""
+  WITH events AS (
+    SELECT date_trunc(%(grain)s, l.loaned_at) AS bucket, TRUE AS started,
+           l.tool_uid, l.borrower_uid, NULL::double precision AS duration
+      FROM {ALL_LOANS_SQL} l
+     WHERE l.loaned_at >= %(since)s
+    UNION ALL
+    SELECT date_trunc(%(grain)s, l.returned_at), FALSE,
+           l.tool_uid, l.borrower_uid, EXTRACT(EPOCH FROM l.returned_at - l.loaned_at)::double precision
+      FROM {ALL_LOANS_SQL} l
+     WHERE l.returned_at >= %(since)s
+  )
+  INSERT INTO loan_usage_rollup(grain, bucket_start, dimension, key, label,
+                                loans, returns, total_duration_seconds, median_duration_seconds)
+  SELECT %(grain)s, e.bucket, d.dimension, d.key, max(d.label),
+         count(*) FILTER (WHERE e.started),
+         count(*) FILTER (WHERE NOT e.started),
+         COALESCE(sum(e.duration), 0),
+         percentile_cont(0.5) WITHIN GROUP (ORDER BY e.duration)
+    FROM events e
+    LEFT JOIN tools t ON t.uid = e.tool_uid
+    LEFT JOIN users u ON u.uid = e.borrower_uid
+   CROSS JOIN LATERAL (VALUES
+         ('tool', e.tool_uid, COALESCE(t.name, e.tool_uid)),
+         ('tool_name', COALESCE(t.name, e.tool_uid), COALESCE(t.name, e.tool_uid)),
+         ('borrower', e.borrower_uid, COALESCE(u.full_name, e.borrower_uid))
+       ) AS d(dimension, key, label)
+GROUP BY e.bucket, d.dimension, d.key
+"""
+
+SCAN_ROLLUP_SQL = """
+  INSERT INTO scan_tap_rollup(grain, bucket_start, station_id, taps, user_taps, tool_taps)
+  SELECT %(grain)s, date_trunc(%(grain)s, ts), station_id,
+         count(*),
+         count(*) FILTER (WHERE role_hint = 'user'),
+         count(*) FILTER (WHERE role_hint = 'tool')
+    FROM scan_events
+   WHERE ts >= %(since)s
+GROUP BY 2, 3
+"""
+
+
+def ensure_rollup_tables(cur) -> None:
+    """ensure_tables() のカーソルで集計表と索引を作る"""
+    for statement in SCHEMA:
+        cur.execute(statement, name="ensure_tables.rollups")
+
+
+def mark_rollups_dirty(cur, since: datetime) -> None:
+    """since 以降の時間帯を次回の refresh_rollups() で作り直させる（同じトランザクション内で呼ぶ）"""
+    cur.execute(
+        "UPDATE rollup_state SET watermark = LEAST(watermark, %s) WHERE name = %s",
+        (since, STATE_NAME),
+        name="rollups.mark_dirty",
+    )
+
+
+def refresh_rollups(conn, margin: Optional[timedelta] = None) -> Dict[str, object]:
+    """watermark 以降の時間帯を作り直し、watermark を集計時刻まで進める。
+
+    初回（rollup_state が空）は loans / scan_events の最古の行から作る。
+    別の集計が実行中ならその回は何もしない（{"skipped": True}）。
+    """
+    margin = ROLLUP_LATE_MARGIN if margin is None else margin
+    with conn, traced_cursor(conn, "refresh_rollups") as cur:
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (ADVISORY_LOCK_KEY,), name="rollups.lock")
+        if not cur.fetchone()[0]:
+            return {"skipped": True}
+        cur.execute("SELECT now()", name="rollups.now")
+        upper = cur.fetchone()[0]
+        cur.execute("SELECT watermark FROM rollup_state WHERE name = %s", (STATE_NAME,), name="rollups.watermark")
+        row = cur.fetchone()
+        if row is not None:
+            start = row[0] - margin
+        else:
+            cur.execute(
+                f"SELECT LEAST((SELECT min(loaned_at) FROM {ALL_LOANS_SQL} l), (SELECT min(ts) FROM scan_events))",
+                name="rollups.oldest",
+            )
+            start = cur.fetchone()[0] or upper
+
+        rows = 0
+        for grain in GRAINS:
+            cur.execute("SELECT date_trunc(%s, %s::timestamptz)", (grain, start), name="rollups.align")
+            params = {"grain": grain, "since": cur.fetchone()[0]}
+            cur.execute(
+                "DELETE FROM loan_usage_rollup WHERE grain = %(grain)s AND bucket_start >= %(since)s",
+                params, name=f"rollups.loans_{grain}.clear",
+            )
+            cur.execute(LOAN_ROLLUP_SQL, params, name=f"rollups.loans_{grain}")
+            rows += max(cur.rowcount, 0)
+            cur.execute(
+                "DELETE FROM scan_tap_rollup WHERE grain = %(grain)s AND bucket_start >= %(since)s",
+                params, name=f"rollups.scans_{grain}.clear",
+            )
+            cur.execute(SCAN_ROLLUP_SQL, params, name=f"rollups.scans_{grain}")
+            rows += max(cur.rowcount, 0)
+
+        cur.execute(
+            """
+            INSERT INTO rollup_state(name, watermark, refreshed_at) VALUES (%s, %s, now())
+            ON CONFLICT (name) DO UPDATE SET watermark = EXCLUDED.watermark, refreshed_at = EXCLUDED.refreshed_at
+            """,
+            (STATE_NAME, upper),
+            name="rollups.advance",
+        )
+    return {"skipped": False, "from": start, "watermark": upper, "rows": rows}
@@ -0,0 +1,217 @@
+"""Monthly range partitions of scan_events with retention and archival.
+
+scan_events はタップのたびに 1 行増え、履歴が長くなっても insert と直近の参照が
+遅くならないよう、ts の月単位で分割した表（PARTITION BY RANGE (ts)）として持つ。
+
+- ensure_scan_events(): 親表がなければ作成し、従来の（分割していない）scan_events が
+  あれば scan_events_legacy に名前を変えて「最古〜翌月初め」のパーティションとして
+  取り込む（行は移動しない）。続けて今月から premake_months か月先までを作る。
+- apply_retention(): retention_months より古い月のパーティションを、行単位の DELETE では
+  なくパーティションごと処理する。mode="archive" は CSV（gzip）に書き出してから
+  切り離して削除、mode="detach" は切り離して独立した表として残すだけ。
+
+月の区切りは DB のタイムゾーン（apply_db_tuning.sql で Asia/Tokyo）に従う。
+"""
+from __future__ import annotations
+
+import gzip
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from db_trace import traced_cursor
+
+PARENT = "scan_events"
+LEGACY = "scan_events_legacy"
+RETENTION_MODES = ("archive", "detach")
+
+SCAN_EVENTS_PREMAKE_MONTHS = int(os.getenv("SCAN_EVENTS_PREMAKE_MONTHS", "3"))
+# 0 以下で保持期限なし
+SCAN_EVENTS_RETENTION_MONTHS = int(os.getenv("SCAN_EVENTS_RETENTION_MONTHS", "24"))
+SCAN_EVENTS_RETENTION_MODE = os.getenv("SCAN_EVENTS_RETENTION_MODE", "archive").strip().lower()
+SCAN_EVENTS_ARCHIVE_DIR = Path(os.getenv("SCAN_EVENTS_ARCHIVE_DIR", "/var/lib/toolmgmt/archive"))
+
+# 列・制約は従来の scan_events と同じ（名前も同じなので従来の表をそのまま取り込める）。
+# 分割表の主キーには分割キーを含める必要があるため (id, ts)
+PARENT_DDL = """
+  CREATE TABLE scan_events(
+    id BIGINT NOT NULL DEFAULT nextval('scan_events_id_seq'),
+    ts TIMESTAMPTZ NOT NULL DEFAULT now(),
+    station_id TEXT NOT NULL DEFAULT 'pi1',
+    tag_uid TEXT NOT NULL,
+    role_hint TEXT CONSTRAINT scan_events_role_hint_check CHECK (role_hint IN ('user','tool') OR role_hint IS NULL),
+    PRIMARY KEY (id, ts)
+  ) PARTITION BY RANGE (ts)
+"""
+
+_BOUND = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+@dataclass(frozen=True)
+class Partition:
+    """One partition of scan_events; None bounds mean MINVALUE / MAXVALUE."""
+
+    name: str
+    lower: Optional[datetime]
+    upper: Optional[datetime]
+
+    def overlaps(self, lower: datetime, upper: datetime) -> bool:
+        return (self.lower is None or self.lower < upper) and (self.upper is None or lower < self.upper)
+
+
+def _bound_value(text: str) -> Optional[datetime]:
+    text = text.strip()
+    if text.upper() in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(text.strip("'"))
+
+
+def parse_partition_bound(name: str, expr: str) -> Optional[Partition]:
+    """pg_get_expr(relpartbound) の "FOR VALUES FROM (...) TO (...)" を読む（DEFAULT は None）"""
+    match = _BOUND.search(expr or "")
+    if match is None:
+        return None
+    return Partition(name, _bound_value(match.group(1)), _bound_value(match.group(2)))
+
+
+def partition_name(month_start: datetime) -> str:
+    return f"{PARENT}_{month_start:%Y%m}"
+
+
+def missing_partitions(month_starts: Sequence[datetime], existing: Sequence[Partition]) -> List[Partition]:
+    """month_starts（連続する月初め）の各月のうち、既存のどのパーティションとも重ならない月"""
+    missing = []
+    for lower, upper in zip(month_starts, month_starts[1:]):
+        if not any(partition.overlaps(lower, upper) for partition in existing):
+            missing.append(Partition(partition_name(lower), lower, upper))
+    return missing
+
+
+def expired_partitions(existing: Sequence[Partition], cutoff: datetime) -> List[Partition]:
+    """上限が cutoff 以前（すべての行が cutoff より古い）パーティション"""
+    return [p for p in existing if p.upper is not None and p.upper <= cutoff]
+
+
+# --- DB 操作（ensure_tables() / 保守ジョブのカーソルで呼ぶ） ---
+def table_kind(cur) -> Optional[str]:
+    """scan_events の relkind: 'p'（分割表）/ 'r'（従来の表）/ None（未作成）"""
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (PARENT,), name="scan_partitions.kind")
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def list_partitions(cur) -> List[Partition]:
+    cur.execute(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+          FROM pg_inherits i
+          JOIN pg_class c ON c.oid = i.inhrelid
+         WHERE i.inhparent = to_regclass(%s)
+      ORDER BY c.relname
+        """,
+        (PARENT,),
+        name="scan_partitions.list",
+    )
+    partitions = [parse_partition_bound(name, expr) for name, expr in cur.fetchall()]
+    return [partition for partition in partitions if partition is not None]
+
+
+def _convert_legacy(cur) -> None:
+    """従来の scan_events を親表の下に scan_events_legacy として取り込む"""
+    cur.execute(f"ALTER TABLE {PARENT} RENAME TO {LEGACY}", name="scan_partitions.legacy_rename")
+    # 索引名はスキーマ内で一意なので、親表と同じ名前になるものを付け替える
+    cur.execute(f"ALTER TABLE {LEGACY} RENAME CONSTRAINT {PARENT}_pkey TO {LEGACY}_pkey",
+                name="scan_partitions.legacy_rename")
+    cur.execute(f"ALTER INDEX IF EXISTS {PARENT}_ts_idx RENAME TO {LEGACY}_ts_idx",
+                name="scan_partitions.legacy_rename")
+    cur.execute(PARENT_DDL, name="scan_partitions.create_parent")
+    # 連番は従来の表と同じものを使い続ける
+    cur.execute(f"ALTER SEQUENCE {PARENT}_id_seq OWNED BY {PARENT}.id", name="scan_partitions.sequence")
+    cur.execute(
+        f"SELECT date_trunc('month', GREATEST(max(ts), now())) + interval '1 month' FROM {LEGACY}",
+        name="scan_partitions.legacy_bound",
+    )
+    upper = cur.fetchone()[0]
+    cur.execute(
+        f"ALTER TABLE {PARENT} ATTACH PARTITION {LEGACY} FOR VALUES FROM (MINVALUE) TO (%s)",
+        (upper,),
+        name="scan_partitions.legacy_attach",
+    )
+
+
+def ensure_scan_events(cur, premake_months: int = SCAN_EVENTS_PREMAKE_MONTHS) -> List[str]:
+    """分割した scan_events を用意し、今月から premake_months か月先までのパーティションを作る"""
+    kind = table_kind(cur)
+    if kind is None:
+        cur.execute(f"CREATE SEQUENCE IF NOT EXISTS {PARENT}_id_seq", name="scan_partitions.sequence")
+        cur.execute(PARENT_DDL, name="scan_partitions.create_parent")
+        cur.execute(f"ALTER SEQUENCE {PARENT}_id_seq OWNED BY {PARENT}.id", name="scan_partitions.sequence")
+    elif kind == "r":
+        _convert_legacy(cur)
+    return ensure_future_partitions(cur, premake_months)
+
+
+def ensure_future_partitions(cur, premake_months: int = SCAN_EVENTS_PREMAKE_MONTHS) -> List[str]:
+    cur.execute(
+        "SELECT date_trunc('month', now()) + make_interval(months => g) FROM generate_series(0, %s) AS g",
+        (max(premake_months, 0) + 1,),
+        name="scan_partitions.months",
+    )
+    month_starts = [row[0] for row in cur.fetchall()]
+    created = []
+    for partition in missing_partitions(month_starts, list_partitions(cur)):
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {partition.name} PARTITION OF {PARENT} FOR VALUES FROM (%s) TO (%s)",
+            (partition.lower, partition.upper),
+            name="scan_partitions.create",
+        )
+        created.append(partition.name)
+    return created
+
+
+def archive_partition(cur, partition: Partition, archive_dir: Path) -> Path:
+    """パーティションの行を <archive_dir>/<名前>.csv.gz に書き出す"""
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"{partition.name}.csv.gz"
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with gzip.open(tmp_path, "wt", encoding="utf-8", newline="") as fh:
+        cur.copy_expert(f"COPY (SELECT * FROM {partition.name} ORDER BY ts, id) TO STDOUT WITH (FORMAT csv, HEADER)", fh)
+    os.replace(tmp_path, path)
+    return path
+
+
+def apply_retention(
+    conn,
+    retention_months: int = SCAN_EVENTS_RETENTION_MONTHS,
+    mode: str = SCAN_EVENTS_RETENTION_MODE,
+    archive_dir: Path = SCAN_EVENTS_ARCHIVE_DIR,
+) -> List[Dict[str, object]]:
+    """保持期限を過ぎたパーティションを 1 つずつ（1 トランザクションずつ）処理する"""
+    if retention_months <= 0:
+        return []
+    if mode not in RETENTION_MODES:
+        raise ValueError(f"SCAN_EVENTS_RETENTION_MODE は {RETENTION_MODES} のいずれかです: {mode}")
+    with conn, traced_cursor(conn, "scan_partitions.retention") as cur:
+        cur.execute(
+            "SELECT date_trunc('month', now()) - make_interval(months => %s)",
+            (retention_months,),
+            name="scan_partitions.cutoff",
+        )
+        cutoff = cur.fetchone()[0]
+        expired = expired_partitions(list_partitions(cur), cutoff)
+
+    results = []
+    for partition in expired:
+        result: Dict[str, object] = {"partition": partition.name, "mode": mode}
+        with conn, traced_cursor(conn, "scan_partitions.retention") as cur:
+            if mode == "archive":
+                result["archive"] = str(archive_partition(cur, partition, archive_dir))
+            cur.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {partition.name}", name="scan_partitions.detach")
+            if mode == "archive":
+                cur.execute(f"DROP TABLE {partition.name}", name="scan_partitions.drop")
+        results.append(result)
+    return results
+
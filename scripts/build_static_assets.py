@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""Fingerprint and precompress static assets into static/dist/.
+
+デプロイ（git pull）後とアプリ起動前に実行する。brotli パッケージがあれば .br も作成する。
+
+    python3 scripts/build_static_assets.py
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from static_assets import DIST_DIR, STATIC_DIR, build_assets  # noqa: E402
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="静的ファイルのハッシュ付与と事前圧縮")
+    parser.add_argument("--static-dir", default=str(STATIC_DIR), help="入力ディレクトリ")
+    parser.add_argument("--dist-dir", default=str(DIST_DIR), help="出力ディレクトリ")
+    args = parser.parse_args(argv)
+    build_assets(Path(args.static_dir), Path(args.dist_dir))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
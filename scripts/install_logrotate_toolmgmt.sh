@@ -4,7 +4,7 @@ set -euo pipefail
 CONFIG_PATH="/etc/logrotate.d/toolmgmt"
 
 read -r -d '' CONFIG <<'CFG'
-/var/log/toolmgmt/usbsync.log /var/log/toolmgmt/api_actions.log /var/log/document-viewer/import.log {
+/var/log/toolmgmt/usbsync.log /var/log/toolmgmt/api_actions.log /var/log/toolmgmt/slow_queries.log /var/log/document-viewer/import.log {
     daily
     rotate 14
     compress
@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
-"""Manage API tokens (multiple entries supported)."""
+"""Manage API tokens (multiple entries supported).
+
+保存先は API_TOKEN_BACKEND（sqlite / json）か --backend で選ぶ。
+api_token.json 形式の入出力は export / import サブコマンドで行う。
+"""
 from __future__ import annotations
 
 import argparse
@@ -11,14 +15,19 @@ ROOT_DIR = Path(__file__).resolve().parent.parent
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
+import api_token_store  # noqa: E402
 from api_token_store import (  # noqa: E402
-    generate_token,
+    BACKENDS,
+    backend_name,
+    compact_tokens,
+    export_tokens,
     get_token_info,
+    import_tokens,
     list_tokens,
     issue_token,
     revoke_token,
     delete_token_file,
-    API_TOKEN_FILE,
+    token_store_path,
 )
 
 
@@ -28,7 +37,8 @@ def cmd_show(args: argparse.Namespace) -> int:
     result = {
         "summary": {k: v for k, v in summary.items() if k != "token" or args.reveal},
         "tokens": tokens,
-        "file": str(API_TOKEN_FILE),
+        "backend": backend_name(),
+        "file": str(token_store_path()),
     }
     json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
     sys.stdout.write("\n")
@@ -73,7 +83,7 @@ def cmd_rotate(args: argparse.Namespace) -> int:
 def cmd_revoke(args: argparse.Namespace) -> int:
     if args.file:
         delete_token_file()
-        print(f"トークンファイル {API_TOKEN_FILE} を削除しました")
+        print(f"保存先 {token_store_path()} のトークンをすべて削除しました")
         return 0
 
     if not (args.token or args.station_id or args.all):
@@ -85,8 +95,32 @@ def cmd_revoke(args: argparse.Namespace) -> int:
     return 0
 
 
+def cmd_export(args: argparse.Namespace) -> int:
+    target = export_tokens(Path(args.output) if args.output else None)
+    print(f"{target} に書き出しました")
+    return 0
+
+
+def cmd_import(args: argparse.Namespace) -> int:
+    source = Path(args.input) if args.input else None
+    try:
+        count = import_tokens(source, replace=args.replace)
+    except (OSError, ValueError) as exc:
+        print(f"取り込みに失敗しました: {exc}", file=sys.stderr)
+        return 1
+    print(f"{count} 件のトークンを取り込みました（保存先: {backend_name()} {token_store_path()}）")
+    return 0
+
+
+def cmd_compact(args: argparse.Namespace) -> int:
+    removed = compact_tokens(args.days)
+    print(f"保持期間を過ぎた無効化済みトークンを {removed} 件削除しました")
+    return 0
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="API トークンを管理します")
+    parser.add_argument("--backend", choices=BACKENDS, help="保存先 (既定: API_TOKEN_BACKEND または sqlite)")
     sub = parser.add_subparsers(dest="command", required=True)
 
     show_p = sub.add_parser("show", help="現在のトークン一覧を表示")
@@ -111,15 +145,30 @@ def build_parser() -> argparse.ArgumentParser:
     revoke_p.add_argument("--token", help="無効化するトークン文字列")
     revoke_p.add_argument("--station-id", help="指定ステーションのトークンを無効化")
     revoke_p.add_argument("--all", action="store_true", help="全トークンを無効化")
-    revoke_p.add_argument("--file", action="store_true", help="ファイルごと削除")
+    revoke_p.add_argument("--file", action="store_true", help="保存先のトークンをすべて削除 (json はファイルごと削除)")
     revoke_p.set_defaults(func=cmd_revoke)
 
+    export_p = sub.add_parser("export", help="api_token.json 形式で書き出す")
+    export_p.add_argument("--output", help="出力先 (既定: API_TOKEN_FILE)")
+    export_p.set_defaults(func=cmd_export)
+
+    import_p = sub.add_parser("import", help="api_token.json 形式のファイルを取り込む")
+    import_p.add_argument("--input", help="入力ファイル (既定: API_TOKEN_FILE)")
+    import_p.add_argument("--replace", action="store_true", help="既存のトークンを消してから取り込む")
+    import_p.set_defaults(func=cmd_import)
+
+    compact_p = sub.add_parser("compact", help="保持期間を過ぎた無効化済みトークンを削除")
+    compact_p.add_argument("--days", type=int, help="保持日数 (既定: API_TOKEN_RETENTION_DAYS または 90)")
+    compact_p.set_defaults(func=cmd_compact)
+
     return parser
 
 
 def main(argv: list[str] | None = None) -> int:
     parser = build_parser()
     args = parser.parse_args(argv)
+    if args.backend:
+        api_token_store.API_TOKEN_BACKEND = args.backend
     return args.func(args)
 
 
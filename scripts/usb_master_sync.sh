@@ -14,7 +14,15 @@ DB_NAME="sensordb"
 DB_USER="app"
 DB_HOST="127.0.0.1"
 
+# --mount / --unmount: run_usb_sync() が 1 回だけマウントし、各取り込みステップで共有する
+MODE="sync"
+case "${1:-}" in
+  --mount) MODE="mount"; shift ;;
+  --unmount) MODE="unmount"; shift ;;
+esac
+
 DEVICE="${1:-}"
+OWNS_MOUNT=0
 if [[ -z "${DEVICE}" ]]; then
   echo "[$LOG_TAG] USB デバイスパスが指定されていません" >&2
   exit 1
@@ -36,7 +44,7 @@ log() {
 
 cleanup() {
   sync || true
-  if mountpoint -q "$MOUNT_POINT"; then
+  if (( OWNS_MOUNT == 1 )) && mountpoint -q "$MOUNT_POINT"; then
     umount "$MOUNT_POINT" || log "アンマウントに失敗: $MOUNT_POINT"
   fi
 }
@@ -48,8 +56,26 @@ mkdir -p "$(dirname "$LOG_FILE")"
 touch "$LOG_FILE"
 chmod 640 "$LOG_FILE" || true
 
-log "USB デバイス $DEVICE を $MOUNT_POINT にマウント"
-mount "$DEVICE" "$MOUNT_POINT"
+if [[ "$MODE" == "unmount" ]]; then
+  if mountpoint -q "$MOUNT_POINT"; then
+    OWNS_MOUNT=1
+    log "USB デバイス $DEVICE を $MOUNT_POINT からアンマウント"
+  fi
+  exit 0
+fi
+
+if mountpoint -q "$MOUNT_POINT"; then
+  log "マウント済みの $MOUNT_POINT を利用します"
+else
+  log "USB デバイス $DEVICE を $MOUNT_POINT にマウント"
+  mount "$DEVICE" "$MOUNT_POINT"
+  OWNS_MOUNT=1
+fi
+
+if [[ "$MODE" == "mount" ]]; then
+  OWNS_MOUNT=0
+  exit 0
+fi
 
 if [[ ! -d "$USB_DIR" ]]; then
   log "USB 内に master ディレクトリが見つかりません ($USB_DIR)"
@@ -0,0 +1,94 @@
+"""Serving mode selection for app_flask (werkzeug / eventlet / gevent).
+
+TOOLMGMT_SERVER_MODE で選択する（既定 werkzeug = 従来の OS スレッド）。eventlet / gevent は
+明示的に指定したときだけ使い、auto は eventlet → gevent → werkzeug の順に利用可能なものを使う。eventlet / gevent は他モジュールの import より前に
+prepare() で monkey patch する必要があるため、app_flask.py の先頭で呼び出す。
+
+- psycopg2: eventlet は monkey_patch(psycopg=True)、gevent は wait callback で協調化
+- subprocess: 各ライブラリの monkey patch で協調化
+- pyscard など C 拡張のブロッキング呼び出し: offload() で OS スレッドプールへ逃がす
+"""
+from __future__ import annotations
+
+import importlib.util
+import os
+from typing import Callable, Optional, TypeVar
+
+SERVER_MODES = ("werkzeug", "eventlet", "gevent")
+T = TypeVar("T")
+
+_active_mode = "werkzeug"
+
+
+def resolve_mode(requested: Optional[str] = None) -> str:
+    mode = (requested or os.getenv("TOOLMGMT_SERVER_MODE", "werkzeug")).strip().lower()
+    if mode == "auto":
+        for candidate in ("eventlet", "gevent"):
+            if importlib.util.find_spec(candidate) is not None:
+                return candidate
+        return "werkzeug"
+    if mode not in SERVER_MODES:
+        raise ValueError(f"未対応の TOOLMGMT_SERVER_MODE です: {mode} ({', '.join(SERVER_MODES)})")
+    return mode
+
+
+def _gevent_wait_callback(conn, timeout=None):
+    """psycopg2 の非同期 I/O を gevent のハブで待つ"""
+    from gevent.socket import wait_read, wait_write  # pylint: disable=import-outside-toplevel
+    from psycopg2 import OperationalError, extensions  # pylint: disable=import-outside-toplevel
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        if state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError(f"Bad result from poll: {state!r}")
+
+
+def prepare(mode: str) -> str:
+    """Monkey patch for the selected mode. Must run before flask/psycopg2 are imported."""
+    global _active_mode
+    if mode == "eventlet":
+        import eventlet  # pylint: disable=import-outside-toplevel
+
+        eventlet.monkey_patch()
+    elif mode == "gevent":
+        from gevent import monkey  # pylint: disable=import-outside-toplevel
+
+        monkey.patch_all()
+        try:
+            import psycopg2.extensions  # pylint: disable=import-outside-toplevel
+
+            psycopg2.extensions.set_wait_callback(_gevent_wait_callback)
+        except ImportError:
+            pass
+    elif mode != "werkzeug":
+        raise ValueError(f"未対応のサーバーモードです: {mode}")
+    _active_mode = mode
+    return mode
+
+
+def active_mode() -> str:
+    return _active_mode
+
+
+def socketio_async_mode() -> str:
+    """Flask-SocketIO の async_mode 名（werkzeug は threading）"""
+    return "threading" if _active_mode == "werkzeug" else _active_mode
+
+
+def offload(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking call on an OS thread pool when serving with eventlet/gevent."""
+    if _active_mode == "eventlet":
+        from eventlet import tpool  # pylint: disable=import-outside-toplevel
+
+        return tpool.execute(func, *args, **kwargs)
+    if _active_mode == "gevent":
+        import gevent  # pylint: disable=import-outside-toplevel
+
+        return gevent.get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
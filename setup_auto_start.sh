@@ -41,6 +41,10 @@ Environment=LC_ALL=ja_JP.UTF-8
 Environment=PYTHONIOENCODING=utf-8
 Environment=PYTHONUNBUFFERED=1
 Environment=TZ=Asia/Tokyo
+# eventlet で動かす場合だけ有効にする（RUNBOOK 3.13。既定は werkzeug）
+#Environment=TOOLMGMT_SERVER_MODE=eventlet
+# 静的ファイルのハッシュ付与・事前圧縮（変更がなければ数十 ms で終わる）
+ExecStartPre=__PROJECT_DIR__/venv/bin/python __PROJECT_DIR__/scripts/build_static_assets.py
 # アプリ起動
 ExecStart=__PROJECT_DIR__/venv/bin/python __PROJECT_DIR__/app_flask.py
 Restart=always
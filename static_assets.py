@@ -0,0 +1,182 @@
+"""Fingerprinted, precompressed static assets.
+
+ビルド時（scripts/build_static_assets.py）に static/ 配下のファイルを内容ハッシュ付きの
+名前で static/dist/ へ書き出し、gzip / brotli（brotli パッケージがあれば）の圧縮版も
+作っておく。実行時は manifest.json を引いて asset_url() がハッシュ付き URL（/assets/...）
+を返し、/assets/ は Accept-Encoding に応じて圧縮済みファイルをそのまま返す。
+ハッシュが変わると URL も変わるため、応答は immutable として長期キャッシュできる。
+ビルドしていない環境では従来の /static/<path> にフォールバックする。
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path, PurePosixPath
+from typing import Dict, Optional, Set, Tuple
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+DIST_DIR = Path(os.getenv("STATIC_DIST_DIR", str(STATIC_DIR / "dist")))
+MANIFEST_NAME = "manifest.json"
+URL_PREFIX = "/assets"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+COMPRESSIBLE_SUFFIXES = {".js", ".css", ".svg", ".json", ".html", ".txt", ".map"}
+MIN_COMPRESS_BYTES = 256
+# Accept-Encoding の優先順（圧縮率の高い順）
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_manifest_lock = threading.Lock()
+_manifest_cache: Dict[str, object] = {"key": None, "data": {"version": "", "assets": {}}}
+
+
+def _hashed_name(rel: PurePosixPath, digest: str) -> str:
+    return str(rel.with_name(f"{rel.stem}.{digest}{rel.suffix}"))
+
+
+def _compress_brotli(data: bytes) -> Optional[bytes]:
+    try:
+        import brotli  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=11)
+
+
+def build_assets(static_dir: Path = STATIC_DIR, dist_dir: Optional[Path] = None, logger=print) -> Dict[str, object]:
+    """Fingerprint and precompress every file under static_dir into dist_dir.
+
+    既存の dist は manifest に載らなくなったファイルを削除して作り直す。
+    戻り値は書き出した manifest（{"version": ..., "assets": {元のパス: ハッシュ付きパス}}）。
+    """
+    dist_dir = Path(dist_dir or DIST_DIR)
+    static_dir = Path(static_dir)
+    assets: Dict[str, str] = {}
+    written = set()
+    brotli_missing = False
+
+    for source in sorted(static_dir.rglob("*")):
+        if not source.is_file() or source.name.startswith("."):
+            continue
+        if dist_dir == source or dist_dir in source.parents:
+            continue
+        rel = PurePosixPath(source.relative_to(static_dir).as_posix())
+        data = source.read_bytes()
+        hashed = _hashed_name(rel, hashlib.sha256(data).hexdigest()[:12])
+        target = dist_dir / hashed
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if not target.exists():
+            target.write_bytes(data)
+        written.add(target)
+
+        if rel.suffix in COMPRESSIBLE_SUFFIXES and len(data) >= MIN_COMPRESS_BYTES:
+            gz_path = target.with_name(target.name + ".gz")
+            if not gz_path.exists():
+                # mtime=0 で同じ入力からは同じバイト列になる
+                gz_path.write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+            written.add(gz_path)
+            br_path = target.with_name(target.name + ".br")
+            if not br_path.exists():
+                compressed = _compress_brotli(data)
+                if compressed is None:
+                    brotli_missing = True
+                else:
+                    br_path.write_bytes(compressed)
+            if br_path.exists():
+                written.add(br_path)
+        assets[str(rel)] = hashed
+
+    version = hashlib.sha256(json.dumps(assets, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    manifest = {"version": version, "assets": assets}
+    manifest_path = dist_dir / MANIFEST_NAME
+    dist_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp_path, manifest_path)
+
+    removed = 0
+    for stale in sorted(dist_dir.rglob("*"), reverse=True):
+        if stale.is_file() and stale != manifest_path and stale not in written:
+            stale.unlink()
+            removed += 1
+    if brotli_missing:
+        logger("[assets] brotli が未インストールのため .br は作成しません（gzip のみ）")
+    logger(f"[assets] {len(assets)} files fingerprinted (version {version}, {removed} stale removed)")
+    return manifest
+
+
+def load_manifest() -> Dict[str, object]:
+    """manifest.json を読み込む（mtime が変わったときだけ読み直す）"""
+    manifest_path = DIST_DIR / MANIFEST_NAME
+    try:
+        st = manifest_path.stat()
+        key = (str(manifest_path), st.st_mtime_ns, st.st_size)
+    except OSError:
+        key = (str(manifest_path), None, None)
+    with _manifest_lock:
+        if _manifest_cache["key"] == key:
+            return _manifest_cache["data"]
+        data: Dict[str, object] = {"version": "", "assets": {}}
+        if key[1] is not None:
+            try:
+                loaded = json.loads(manifest_path.read_text(encoding="utf-8"))
+                data = {"version": str(loaded.get("version", "")), "assets": dict(loaded.get("assets", {}))}
+            except Exception as exc:  # pylint: disable=broad-except
+                print(f"[assets] manifest を読み込めませんでした: {exc}")
+        _manifest_cache.update({"key": key, "data": data})
+        return data
+
+
+def manifest_version() -> str:
+    return str(load_manifest()["version"])
+
+
+def asset_url(path: str) -> str:
+    """Template helper: hashed URL when built, plain /static/ URL otherwise."""
+    path = path.lstrip("/")
+    hashed = load_manifest()["assets"].get(path)
+    if hashed:
+        return f"{URL_PREFIX}/{hashed}"
+    return f"/static/{path}"
+
+
+def accepted_encodings(accept_encoding: str) -> Set[str]:
+    """Accept-Encoding から q > 0 の符号化を返す（q=0 は拒否。* は列挙していない符号化に適用）"""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.lower()] = q
+    accepted = {coding for coding, q in weights.items() if q > 0 and coding != "*"}
+    if weights.get("*", 0) > 0:
+        accepted.update(encoding for encoding, _suffix in ENCODINGS if encoding not in weights)
+    return accepted
+
+
+def resolve_asset(hashed_path: str, accept_encoding: str = "") -> Optional[Tuple[Path, Optional[str]]]:
+    """Return (file to send, Content-Encoding) for a fingerprinted asset, or None.
+
+    manifest に載っているパスだけを返す（任意パスの読み出しを防ぐ）。
+    """
+    if hashed_path not in set(load_manifest()["assets"].values()):
+        return None
+    target = DIST_DIR / hashed_path
+    accepted = accepted_encodings(accept_encoding)
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted:
+            candidate = target.with_name(target.name + suffix)
+            if candidate.is_file():
+                return candidate, encoding
+    if target.is_file():
+        return target, None
+    return None
@@ -1,11 +1,15 @@
 """Station configuration utilities for process selection."""
 from __future__ import annotations
 
+import copy
 import json
 import os
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
+
+from file_watcher import ChangeEvent, Signature, WatchService, file_signature
 
 
 def _is_writable(path: Path) -> bool:
@@ -29,7 +33,8 @@ def _now_iso() -> str:
     return datetime.now().isoformat(timespec="seconds")
 
 
-def _default_config() -> Dict[str, object]:
+def _default_config(path: Optional[Path] = None) -> Dict[str, object]:
+    path = path or STATION_CONFIG_PATH
     env_process = os.getenv("STATION_PROCESS", "").strip()
     base = {
         "process": env_process,
@@ -37,8 +42,8 @@ def _default_config() -> Dict[str, object]:
         "updated_at": None,
         "source": "env" if env_process else "default",
         "error": None,
-        "path": str(STATION_CONFIG_PATH),
-        "writable": _is_writable(STATION_CONFIG_PATH),
+        "path": str(path),
+        "writable": _is_writable(path),
     }
     if env_process:
         base["available"] = [env_process]
@@ -58,10 +63,22 @@ def _sanitize_available(values: Optional[List[str]]) -> List[str]:
     return cleaned
 
 
-def load_station_config() -> Dict[str, object]:
+def _write_json(path: Path, payload: Dict[str, object]) -> None:
+    """一時ファイルに書いてから置き換える（監視側が書きかけの JSON を読まないように）"""
+    text = json.dumps(payload, ensure_ascii=False, indent=2)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    try:
+        tmp_path.write_text(text, encoding='utf-8')
+        os.replace(tmp_path, path)
+    except PermissionError:
+        # ディレクトリに書き込めずファイルだけ書ける場合は直接上書きする
+        path.write_text(text, encoding='utf-8')
+
+
+def load_station_config(path: Optional[Path] = None) -> Dict[str, object]:
     """Load station configuration with fallbacks."""
-    config = _default_config()
-    path = STATION_CONFIG_PATH
+    path = path or STATION_CONFIG_PATH
+    config = _default_config(path)
 
     if not path.exists():
         config["writable"] = _is_writable(path)
@@ -98,19 +115,29 @@ def load_station_config() -> Dict[str, object]:
     return config
 
 
-def save_station_config(process: Optional[str] = None, available: Optional[List[str]] = None) -> Dict[str, object]:
-    """Persist station configuration and return the updated structure."""
-    if not _is_writable(STATION_CONFIG_PATH):
-        raise PermissionError(f"station.json に書き込みできません: {STATION_CONFIG_PATH}")
-    current = load_station_config()
+def save_station_config(
+    process: Optional[str] = None,
+    available: Optional[List[str]] = None,
+    path: Optional[Path] = None,
+    current: Optional[Dict[str, object]] = None,
+) -> Dict[str, object]:
+    """Persist station configuration and return the updated structure.
+
+    current を渡すとファイルを読み直さずにそれを現在の設定として使う（StationConfigStore 用）。
+    """
+    path = path or STATION_CONFIG_PATH
+    if not _is_writable(path):
+        raise PermissionError(f"station.json に書き込みできません: {path}")
+    if current is None:
+        current = load_station_config(path)
     if current.get("source") == "error":
-        current = _default_config()
+        current = _default_config(path)
 
     new_process = current.get("process", "")
     if process is not None:
         new_process = process.strip()
 
-    new_available = current.get("available", [])
+    new_available = list(current.get("available", []))
     if available is not None:
         new_available = _sanitize_available(available)
     if new_process:
@@ -125,14 +152,13 @@ def save_station_config(process: Optional[str] = None, available: Optional[List[
         "updated_at": _now_iso(),
     }
 
-    with STATION_CONFIG_PATH.open('w', encoding='utf-8') as fh:
-        json.dump(payload, fh, ensure_ascii=False, indent=2)
+    _write_json(path, payload)
 
     payload_with_meta = dict(payload)
     payload_with_meta.update({
         "source": "file",
         "error": None,
-        "path": str(STATION_CONFIG_PATH),
+        "path": str(path),
         "writable": True,
     })
     return payload_with_meta
@@ -145,3 +171,73 @@ def ensure_process(process: str) -> None:
     if process not in available:
         available.append(process)
         save_station_config(config.get("process", ""), available)
+
+
+class StationConfigStore:
+    """In-memory station configuration with write-through saves and change watching.
+
+    get() はメモリ上の設定を返すだけでファイルには触れない。save() はファイルへ書いてから
+    メモリを更新する。外部（CLI・手作業）での編集は watch() で登録した監視サービスの
+    通知で読み直し、内容が変わったときだけ on_change(config) を呼ぶ。
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        # None のときは呼び出し時点の STATION_CONFIG_PATH を使う
+        self.path = Path(path) if path is not None else None
+        self._lock = threading.RLock()
+        self._config: Optional[Dict[str, object]] = None
+        self._signature: Signature = None
+
+    def _resolved_path(self) -> Path:
+        return self.path if self.path is not None else STATION_CONFIG_PATH
+
+    def _load(self) -> Dict[str, object]:
+        path = self._resolved_path()
+        signature = file_signature(path)
+        config = load_station_config(path)
+        self._signature = signature
+        self._config = config
+        return config
+
+    def get(self) -> Dict[str, object]:
+        with self._lock:
+            config = self._config if self._config is not None else self._load()
+            return copy.deepcopy(config)
+
+    def reload(self) -> bool:
+        """ファイルを読み直し、内容が変わっていれば True"""
+        with self._lock:
+            if self._config is not None and file_signature(self._resolved_path()) == self._signature:
+                # 自分の save() による書き込み、または内容に関係のない通知
+                return False
+            previous = self._config
+            current = self._load()
+            return previous is None or _comparable(previous) != _comparable(current)
+
+    def save(self, process: Optional[str] = None, available: Optional[List[str]] = None) -> Dict[str, object]:
+        with self._lock:
+            current = self._config if self._config is not None else self._load()
+            config = save_station_config(process, available, path=self._resolved_path(), current=current)
+            self._config = config
+            self._signature = file_signature(self._resolved_path())
+            return copy.deepcopy(config)
+
+    def ensure_process(self, process: str) -> None:
+        with self._lock:
+            available = list(self.get().get("available", []))
+            if process not in available:
+                available.append(process)
+                self.save(available=available)
+
+    def watch(self, service: WatchService, on_change: Callable[[Dict[str, object]], None]) -> None:
+        """監視サービスに station.json を登録し、外部での変更を読み直して on_change(config) を呼ぶ"""
+        def handle(_event: ChangeEvent) -> None:
+            if self.reload():
+                on_change(self.get())
+
+        self.get()
+        service.subscribe("station_config", [self._resolved_path()], handle)
+
+
+def _comparable(config: Dict[str, object]) -> tuple:
+    return (config.get("process"), list(config.get("available") or []), config.get("updated_at"), config.get("error"))
@@ -0,0 +1,64 @@
+import importlib
+import io
+import logging
+import sys
+from pathlib import Path
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+SAMPLE_DIR = repo_root / "docs" / "sample-data"
+PLAN_COLUMNS = ["納期", "個数", "部品番号", "部品名", "製番", "工程名"]
+STANDARD_COLUMNS = ["部品名", "機械標準工数", "製造オーダー番号", "部品番号", "工程名"]
+
+
+def _close_audit_handlers():
+    audit_logger = logging.getLogger("api_audit")
+    for handler in list(audit_logger.handlers):
+        audit_logger.removeHandler(handler)
+        handler.close()
+
+
+@pytest.fixture(autouse=True)
+def audit_log_in_tmp_path(tmp_path, monkeypatch):
+    """監査ログ（log_api_action）を repo の logs/ ではなく tmp_path に書く"""
+    log_path = tmp_path / "api_actions.log"
+    monkeypatch.setenv("API_AUDIT_LOG", str(log_path))
+    if "app_flask" in sys.modules:
+        monkeypatch.setattr(sys.modules["app_flask"], "LOG_PATH", log_path)
+    _close_audit_handlers()
+    yield log_path
+    _close_audit_handlers()
+
+
+def plan_table(text, columns):
+    """CSV テキストから PlanTable を作る"""
+    from plan_store import PlanTable
+
+    return PlanTable.from_csv(io.StringIO(text), columns)
+
+
+def write_plan_csvs(directory, plan=None, standard=None):
+    """directory に production_plan.csv / standard_times.csv を書く（省略時は docs/sample-data の内容）"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for file_name, text in (("production_plan.csv", plan), ("standard_times.csv", standard)):
+        if text is None:
+            text = (SAMPLE_DIR / file_name).read_text(encoding="utf-8")
+        (directory / file_name).write_text(text, encoding="utf-8")
+    return directory
+
+
+@pytest.fixture
+def plan_app(tmp_path, monkeypatch):
+    """サンプルの計画 CSV を tmp_path から読む app_flask（リモート取得は無効）"""
+    pytest.importorskip("flask")
+    write_plan_csvs(tmp_path)
+    app_flask = importlib.import_module("app_flask")
+    monkeypatch.setattr(app_flask, "PLAN_DATA_DIR", tmp_path)
+    monkeypatch.setattr(app_flask, "maybe_refresh_plan_cache", lambda: None)
+    app_flask.clear_fragment_cache()
+    return app_flask
@@ -0,0 +1,77 @@
+import json
+import sys
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+import api_token_store  # noqa: E402
+
+
+def test_store_cache_is_used_only_while_enabled(tmp_path, monkeypatch):
+    token_file = tmp_path / "api_token.json"
+    monkeypatch.setattr(api_token_store, "API_TOKEN_FILE", token_file)
+    monkeypatch.setattr(api_token_store, "API_TOKEN_BACKEND", "json")
+    api_token_store.issue_token("ST-1", token="first-token")
+    try:
+        api_token_store.enable_store_cache()
+        assert api_token_store.get_token_info()["token"] == "first-token"
+
+        # 外部からの書き換えは通知（invalidate）まで見えない
+        data = json.loads(token_file.read_text(encoding="utf-8"))
+        data["tokens"][0]["token"] = "edited-token"
+        token_file.write_text(json.dumps(data), encoding="utf-8")
+        assert api_token_store.get_token_info()["token"] == "first-token"
+        api_token_store.invalidate_store_cache()
+        assert api_token_store.get_token_info()["token"] == "edited-token"
+
+        # 自分の書き込みはその場で反映される
+        api_token_store.issue_token("ST-2", token="second-token")
+        assert api_token_store.get_token_info()["token"] == "second-token"
+    finally:
+        api_token_store.enable_store_cache(False)
+
+
+def _use_sqlite(tmp_path, monkeypatch):
+    monkeypatch.setattr(api_token_store, "API_TOKEN_BACKEND", "sqlite")
+    monkeypatch.setattr(api_token_store, "API_TOKEN_FILE", tmp_path / "api_token.json")
+    monkeypatch.setattr(api_token_store, "API_TOKEN_DB", tmp_path / "api_tokens.db")
+    monkeypatch.delenv("API_AUTH_TOKEN", raising=False)
+
+
+def test_sqlite_backend_issue_revoke_and_lookup(tmp_path, monkeypatch):
+    _use_sqlite(tmp_path, monkeypatch)
+    api_token_store.issue_token("ST-1", token="token-one")
+    api_token_store.issue_token("ST-2", token="token-two", keep_existing=True)
+
+    assert api_token_store.find_active_token("token-two")["station_id"] == "ST-2"
+    assert api_token_store.find_active_token("nope") is None
+    assert api_token_store.revoke_token(station_id="ST-1") == 1
+    assert api_token_store.find_active_token("token-one") is None
+    assert [entry["station_id"] for entry in api_token_store.get_active_tokens()] == ["ST-2"]
+    assert api_token_store.get_token_info()["source"] == "sqlite"
+    assert len(api_token_store.list_tokens()) == 2
+
+    # 既定の発行は既存を無効化する
+    api_token_store.issue_token("ST-3", token="token-three")
+    assert [entry["token"] for entry in api_token_store.get_active_tokens()] == ["token-three"]
+
+
+def test_sqlite_backend_imports_json_and_compacts(tmp_path, monkeypatch):
+    _use_sqlite(tmp_path, monkeypatch)
+    (tmp_path / "api_token.json").write_text(json.dumps({"version": 1, "tokens": [
+        {"token": "old", "station_id": "ST-1", "issued_at": "2020-01-01T00:00:00",
+         "note": None, "revoked_at": "2020-01-02T00:00:00"},
+        {"token": "live", "station_id": "ST-1", "issued_at": "2024-01-01T00:00:00",
+         "note": None, "revoked_at": None},
+    ]}), encoding="utf-8")
+
+    # 初回の参照で既存の JSON を取り込む
+    assert api_token_store.find_active_token("live")["station_id"] == "ST-1"
+    assert len(api_token_store.list_tokens()) == 2
+    assert api_token_store.compact_tokens(retention_days=30) == 1
+    assert [entry["token"] for entry in api_token_store.list_tokens(with_token=True)] == ["live"]
+
+    exported = api_token_store.export_tokens(tmp_path / "export.json")
+    assert [entry["token"] for entry in json.loads(exported.read_text(encoding="utf-8"))["tokens"]] == ["live"]
@@ -0,0 +1,52 @@
+import csv
+import sys
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+from benchmarks import bench_plan  # noqa: E402
+
+
+def test_generate_plan_files_uses_expected_headers(tmp_path):
+    bench_plan.generate_plan_files(tmp_path, 50)
+    with (tmp_path / "production_plan.csv").open(encoding="utf-8", newline="") as fh:
+        rows = list(csv.reader(fh))
+    assert rows[0] == bench_plan.PLAN_HEADER
+    assert len(rows) == 51
+    with (tmp_path / "standard_times.csv").open(encoding="utf-8", newline="") as fh:
+        assert next(csv.reader(fh)) == bench_plan.STANDARD_HEADER
+
+
+def test_compare_flags_time_and_memory_regressions():
+    baseline = {"1k": {"build_production_view": {"seconds": 0.10, "peak_mb": 10.0}}}
+    ok = {"1k": {"build_production_view": {"seconds": 0.12, "peak_mb": 11.0}}}
+    slow = {"1k": {"build_production_view": {"seconds": 0.20, "peak_mb": 20.0}}}
+
+    assert bench_plan.compare(ok, baseline, 0.25, 0.15) == []
+    assert len(bench_plan.compare(slow, baseline, 0.25, 0.15)) == 2
+
+
+def test_compare_flags_bytes_per_row_regression():
+    baseline = {"1k": {"load_plan_dataset": {"seconds": 0.1, "peak_mb": 10.0, "bytes_per_row": 100.0}}}
+    grown = {"1k": {"load_plan_dataset": {"seconds": 0.1, "peak_mb": 10.0, "bytes_per_row": 200.0}}}
+    assert len(bench_plan.compare(grown, baseline, 0.25, 0.15)) == 1
+
+
+def test_missing_baseline_fails_unless_allowed(tmp_path, monkeypatch):
+    baseline_file = tmp_path / "baselines.json"
+    baseline_file.write_text('{"reference": {"1k": {"render_index": {"seconds": 1.0, "peak_mb": 1.0}}}}', encoding="utf-8")
+    monkeypatch.setattr(bench_plan, "BASELINE_FILE", baseline_file)
+    monkeypatch.setattr(bench_plan, "run_size", lambda *_args: {"render_index": {"seconds": 0.5, "peak_mb": 0.5}})
+
+    assert bench_plan.main(["--sizes", "1k", "--profile", "reference"]) == 0
+    assert bench_plan.main(["--sizes", "1k,100k", "--profile", "reference"]) == 1
+    assert bench_plan.main(["--sizes", "1k", "--profile", "other"]) == 1
+    assert bench_plan.main(["--sizes", "1k", "--profile", "other", "--allow-missing-baseline"]) == 0
+
+
+def test_reference_baseline_is_committed():
+    import json
+    baselines = json.loads(bench_plan.BASELINE_FILE.read_text(encoding="utf-8"))
+    assert {"1k", "100k"} <= set(baselines[bench_plan.REFERENCE_PROFILE])
@@ -0,0 +1,93 @@
+import json
+import logging
+import sys
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+import db_trace  # noqa: E402
+from metrics import DB_STATEMENT_SECONDS  # noqa: E402
+
+
+class FakeCursor:
+    name = None
+
+    def __init__(self, conn):
+        self.connection = conn
+        self.itersize = 0
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        self.connection.executed.append(sql)
+        if sql.startswith("EXPLAIN"):
+            self._rows = [("Seq Scan on loans",), ("Execution Time: 1.0 ms",)]
+        else:
+            self._rows = [(1,)]
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    autocommit = False
+
+    def __init__(self):
+        self.executed = []
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+
+def test_slow_statement_logged_with_explain(tmp_path, monkeypatch):
+    log_path = tmp_path / "slow.log"
+    monkeypatch.setattr(db_trace, "SLOW_QUERY_MS", 0.0)
+    monkeypatch.setattr(db_trace, "EXPLAIN_SLOW_QUERIES", True)
+    monkeypatch.setattr(db_trace, "SLOW_QUERY_LOG", log_path)
+    monkeypatch.setattr(db_trace, "_last_explained", {})
+    logger = logging.getLogger("db_slow_query")
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    conn = FakeConn()
+    before = DB_STATEMENT_SECONDS.count(statement="delete_open_loan.delete")
+    with db_trace.traced_cursor(conn, "delete_open_loan") as cur:
+        cur.itersize = 10
+        cur.execute("DELETE FROM loans\n WHERE id=%s", (1,), name="delete_open_loan.delete")
+        assert cur.itersize == 10
+
+    assert DB_STATEMENT_SECONDS.count(statement="delete_open_loan.delete") == before + 1
+    # 更新系は ANALYZE で再実行せず EXPLAIN のみ（SAVEPOINT 内で実行し必ずロールバックする）
+    assert conn.executed[1:] == [
+        "SAVEPOINT toolmgmt_explain",
+        "EXPLAIN DELETE FROM loans\n WHERE id=%s",
+        "ROLLBACK TO SAVEPOINT toolmgmt_explain",
+    ]
+
+    for handler in logger.handlers:
+        handler.flush()
+    entry = json.loads(log_path.read_text(encoding="utf-8").strip().split("\t", 1)[1])
+    assert entry["statement"] == "delete_open_loan.delete"
+    assert entry["sql"] == "DELETE FROM loans WHERE id=%s"
+    assert entry["plan"][0] == "Seq Scan on loans"
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def test_explain_analyze_only_for_read_only_selects():
+    cases = {
+        "SELECT name FROM tool_master WHERE name=%s": "EXPLAIN (ANALYZE, BUFFERS) ",
+        "WITH t AS (SELECT 1) SELECT * FROM t": "EXPLAIN (ANALYZE, BUFFERS) ",
+        "WITH ins AS (INSERT INTO loans(tool_uid) VALUES (%s) RETURNING id) SELECT id FROM ins": "EXPLAIN ",
+        "SELECT id FROM loans WHERE tool_uid=%s FOR UPDATE": "EXPLAIN ",
+        "UPDATE loans SET returned_at=now() WHERE id=%s": "EXPLAIN ",
+    }
+    for sql, prefix in cases.items():
+        conn = FakeConn()
+        assert db_trace._capture_explain(conn, sql, None)[0] == "Seq Scan on loans"
+        assert conn.executed[1] == prefix + sql
@@ -0,0 +1,38 @@
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+
+def test_export_range_rejects_unrepresentable_end_date():
+    pytest.importorskip("flask")
+    app_flask = importlib.import_module("app_flask")
+
+    start, end = app_flask._parse_export_range({"from": "2025-04-01", "to": "2025-09-30"})
+    assert (start.date().isoformat(), end.date().isoformat()) == ("2025-04-01", "2025-10-01")
+    with pytest.raises(ValueError):
+        app_flask._parse_export_range({"to": "9999-12-31"})
+
+    with app_flask.app.test_request_context("/api/export/loans.csv?to=9999-12-31"):
+        _body, status = app_flask._export_response("loans", "export_loans")
+    assert status == 400
+
+
+def test_export_errors_keep_their_own_message():
+    pytest.importorskip("flask")
+    app_flask = importlib.import_module("app_flask")
+
+    cases = {
+        "from=2025/04/01": "日付は YYYY-MM-DD 形式で指定してください: 2025/04/01",
+        "from=2025-04-02&to=2025-04-01": "to は from 以降の日付を指定してください",
+        "to=9999-12-31": "to は 9999-12-30 以前の日付を指定してください",
+    }
+    for query, message in cases.items():
+        with app_flask.app.test_request_context(f"/api/export/loans.csv?{query}"):
+            body, status = app_flask._export_response("loans", "export_loans")
+            assert status == 400 and body.get_json() == {"error": message}
@@ -0,0 +1,76 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+from file_watcher import ChangeEvent, WatchService  # noqa: E402
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watch_service_debounces_bursts_into_typed_events(tmp_path, use_inotify):
+    plan_a, plan_b, token = tmp_path / "a.csv", tmp_path / "b.csv", tmp_path / "token.json"
+    events = []
+    done = threading.Event()
+
+    def record(event):
+        events.append(event)
+        done.set()
+
+    service = WatchService(debounce=0.3, poll_interval=0.05, use_inotify=use_inotify)
+    service.subscribe("plan", [plan_a, plan_b], record)
+    service.subscribe("api_token", [token], lambda event: None)
+    service.start()
+    try:
+        if use_inotify and service.backend != "inotify":
+            pytest.skip("inotify が使えない環境")
+        for _ in range(3):
+            plan_a.write_text("x", encoding="utf-8")
+            plan_b.write_text("y", encoding="utf-8")
+        (tmp_path / "unrelated.txt").write_text("z", encoding="utf-8")
+        assert done.wait(3.0)
+        threading.Event().wait(0.5)
+    finally:
+        service.stop()
+
+    assert len(events) == 1, "連続した変更は 1 回にまとめる"
+    assert events[0].kind == "plan"
+    assert events[0].paths == (plan_a, plan_b)
+
+
+class _RecordingWatch:
+    backend = "fake"
+
+    def __init__(self):
+        self.callbacks = {}
+
+    def subscribe(self, kind, paths, callback):
+        self.callbacks[kind] = callback
+
+    def start(self):
+        pass
+
+
+def test_token_file_change_is_pushed_to_socket_clients(monkeypatch):
+    pytest.importorskip("flask")
+    import app_flask
+
+    watch = _RecordingWatch()
+    monkeypatch.setattr(app_flask, "file_watch", watch)
+    monkeypatch.setattr(app_flask, "_plan_version_state", dict(app_flask._plan_version_state))
+    monkeypatch.setattr(app_flask, "enable_store_cache", lambda: None)
+    app_flask.start_file_watch(app_flask.app)
+
+    socket_client = app_flask.socketio.test_client(app_flask.app)
+    socket_client.get_received()
+    watch.callbacks["api_token"](ChangeEvent("api_token", ()))
+    assert [event["name"] for event in socket_client.get_received()] == ["api_token_updated"]
+
+    # broadcast を渡されても Server.emit() には渡さない
+    app_flask.emit_event("station_config_updated", {"process": "研磨"}, broadcast=True)
+    assert [event["name"] for event in socket_client.get_received()] == ["station_config_updated"]
+    socket_client.disconnect()
@@ -0,0 +1,93 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+from inventory import ToolInventory  # noqa: E402
+from open_loans import OpenLoan, OpenLoanView  # noqa: E402
+
+TOOLS = [("T-1", "トルクレンチ"), ("T-2", "トルクレンチ"), ("T-3", "ノギス")]
+
+
+def _loan(loan_id, tool_uid):
+    return OpenLoan(loan_id, tool_uid, tool_uid, "U-1", "山田", datetime(2025, 10, 1, 9, loan_id))
+
+
+def test_inventory_counts_follow_open_loan_view():
+    events = []
+    inventory = ToolInventory(on_change=events.append)
+    view = OpenLoanView()
+    view.add_listener(inventory.loans_changed)
+    view.load([(1, "T-1", "トルクレンチ", "U-1", "山田", datetime(2025, 10, 1))])
+    view.replay(lambda loans: inventory.load(["トルクレンチ", "ノギス", "スパナ"], TOOLS, [l.tool_uid for l in loans]))
+
+    assert inventory.summary("トルクレンチ") == {"name": "トルクレンチ", "total": 2, "available": 1, "on_loan": 1}
+    assert inventory.summary("スパナ")["total"] == 0
+    assert inventory.totals() == {"names": 3, "total": 3, "available": 2, "on_loan": 1}
+
+    events.clear()
+    view.add(_loan(2, "T-3"))
+    assert events == [[{"name": "ノギス", "total": 1, "available": 0, "on_loan": 1}]]
+    # 同じ工具に貸出中レコードが重複しても 1 本として数える
+    view.add(_loan(3, "T-3"))
+    view.remove(2)
+    assert inventory.summary("ノギス")["on_loan"] == 1
+    view.remove(3)
+    view.remove(1)
+    assert inventory.totals()["on_loan"] == 0
+    assert [row["name"] for row in inventory.summaries()] == ["スパナ", "トルクレンチ", "ノギス"]
+
+
+def test_register_and_name_changes_move_counts():
+    inventory = ToolInventory()
+    inventory.load(["トルクレンチ", "ノギス"], TOOLS, ["T-2"])
+    inventory.register_tool("T-2", "ノギス")
+    assert inventory.summary("トルクレンチ") == {"name": "トルクレンチ", "total": 1, "available": 1, "on_loan": 0}
+    assert inventory.summary("ノギス") == {"name": "ノギス", "total": 2, "available": 1, "on_loan": 1}
+    inventory.register_tool("T-9", "ノギス")
+    inventory.add_name("スパナ")
+    assert inventory.totals() == {"names": 3, "total": 4, "available": 3, "on_loan": 1}
+    inventory.remove_name("スパナ")
+    assert inventory.summary("スパナ") is None
+
+
+def test_inventory_changes_are_pushed_to_socket_clients(monkeypatch):
+    pytest.importorskip("flask")
+    import app_flask
+
+    inventory = ToolInventory(on_change=app_flask.emit_inventory_update)
+    monkeypatch.setattr(app_flask, "tool_inventory", inventory)
+    inventory.load(["ノギス"], [("T-3", "ノギス")])
+    socket_client = app_flask.socketio.test_client(app_flask.app)
+    socket_client.get_received()
+
+    inventory.loans_changed([_loan(1, "T-3")], [])
+    events = socket_client.get_received()
+    assert [event["name"] for event in events] == ["inventory_updated"]
+    payload = events[0]["args"][0]
+    assert payload["tools"] == [{"name": "ノギス", "total": 1, "available": 0, "on_loan": 1}]
+    assert payload["totals"]["on_loan"] == 1
+    socket_client.disconnect()
+
+
+def test_usb_sync_reloads_open_loans_and_inventory(monkeypatch):
+    pytest.importorskip("flask")
+    import app_flask
+
+    calls = []
+    monkeypatch.setattr(app_flask, "run_usb_sync", lambda device: {"returncode": 0, "steps": []})
+    monkeypatch.setattr(app_flask, "compile_plan_snapshots", lambda: None)
+    monkeypatch.setattr(app_flask, "reload_after_master_sync", lambda: calls.append("reload"))
+    with app_flask.app.test_request_context("/api/usb_sync", method="POST"):
+        _response, status = app_flask.api_usb_sync.__wrapped__()
+    assert status == 200 and calls == ["reload"]
+
+    monkeypatch.setattr(app_flask, "run_usb_sync", lambda device: {"returncode": 1, "steps": []})
+    with app_flask.app.test_request_context("/api/usb_sync", method="POST"):
+        _response, status = app_flask.api_usb_sync.__wrapped__()
+    assert status == 500 and calls == ["reload"]
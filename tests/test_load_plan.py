@@ -29,3 +29,71 @@ def test_load_plan_dataset(tmp_path, monkeypatch):
 
     assert data["entries"], "生産計画のエントリが読み込めていません"
     assert data["standard_entries"], "標準工数のエントリが読み込めていません"
+
+
+def test_production_view_is_versioned_and_cached(plan_app, tmp_path):
+    app_flask = plan_app
+    client = app_flask.app.test_client()
+
+    shell = client.get("/")
+    assert shell.status_code == 200
+    assert "P-001".encode() not in shell.data, "画面シェルに計画データを埋め込まない"
+
+    first = client.get("/api/production_view")
+    assert first.status_code == 200
+    assert "productionPlanTable" in first.get_json()["html"]
+    etag = first.headers["ETag"]
+    assert client.get("/api/production_view", headers={"If-None-Match": etag}).status_code == 304
+
+    with (tmp_path / "production_plan.csv").open("a", encoding="utf-8") as fh:
+        fh.write("2099-01-01,1,PX-1,追加部品,S-999,研削\n")
+    changed = client.get("/api/production_view", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.get_json()["version"] != first.get_json()["version"]
+
+
+def test_plan_lookup_api(plan_app):
+    app_flask = plan_app
+    client = app_flask.app.test_client()
+
+    assert client.get("/api/plan/lookup").status_code == 400
+    data = client.get("/api/plan/lookup?part=P-001").get_json()
+    assert data["plan_rows"][0]["製番"] == "SO-1001"
+    assert data["plan_rows"][0]["標準工数合計"] == 50.0
+    assert data["version"] == app_flask.plan_data_version()
+
+
+def test_production_view_serves_station_process(plan_app, monkeypatch):
+    app_flask = plan_app
+    monkeypatch.setattr(app_flask.station_store, "get", lambda: {"process": "研磨"})
+    client = app_flask.app.test_client()
+
+    station = client.get("/api/production_view").get_json()
+    assert station["process"] == "研磨"
+    assert "P-002" in station["html"] and "P-001" not in station["html"]
+    everything = client.get("/api/production_view?all=1").get_json()
+    assert everything["plan_count"] > station["plan_count"]
+
+
+def test_plan_capacity_api(plan_app):
+    app_flask = plan_app
+    client = app_flask.app.test_client()
+
+    data = client.get("/api/plan/capacity?from=2025-10-10&days=1&process=切削").get_json()
+    assert data["processes"] == [
+        {"process": "切削", "total_hours": 50.0, "undated_hours": 0.0, "days": [{"date": "2025-10-10", "hours": 50.0}]}
+    ]
+    assert client.get("/api/plan/capacity?from=2025-13-01").status_code == 400
+
+
+def test_process_change_pushes_production_view(plan_app):
+    app_flask = plan_app
+    socket_client = app_flask.socketio.test_client(app_flask.app)
+    socket_client.get_received()
+
+    with app_flask.app.app_context():
+        app_flask.emit_production_view_update("研磨")
+    pushed = [event for event in socket_client.get_received() if event["name"] == "production_view_updated"]
+    assert len(pushed) == 1
+    assert pushed[0]["args"][0]["process"] == "研磨" and "P-002" in pushed[0]["args"][0]["html"]
+    socket_client.disconnect()
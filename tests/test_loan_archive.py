@@ -0,0 +1,85 @@
+import sys
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+import loan_archive  # noqa: E402
+import rollups  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = -1
+        self._row = None
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.conn.executed.append((sql, params))
+        if sql.startswith("SELECT tool_uid FROM loans"):
+            # 移す行が残っている工具を 1 つ返す
+            self._row = (self.conn.pending[0][0],) if self.conn.pending else None
+        elif sql.startswith("WITH batch AS"):
+            tool_uid, remaining = self.conn.pending[0]
+            self.rowcount = min(remaining, params["limit"])
+            if remaining > params["limit"]:
+                self.conn.pending[0] = (tool_uid, remaining - params["limit"])
+            else:
+                self.conn.pending.pop(0)
+
+    def fetchone(self):
+        return self._row
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, pending):
+        self.pending = list(pending)
+        self.executed = []
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def statements(self, prefix):
+        return [params for sql, params in self.executed if sql.startswith(prefix)]
+
+
+def test_moves_one_tool_per_batch_under_its_lock():
+    conn = FakeConn([("T-1", 5), ("T-2", 2)])
+    result = loan_archive.archive_returned_loans(conn, older_than_days=90, batch_size=3)
+    assert result == {"moved": 7, "batches": 3}
+    moves = conn.statements("WITH batch AS")
+    assert [m["tool_uid"] for m in moves] == ["T-1", "T-1", "T-2"]
+    # 移動の直前に同じ工具の lock を取る
+    sqls = [sql for sql, _params in conn.executed]
+    for index, sql in enumerate(sqls):
+        if sql.startswith("WITH batch AS"):
+            assert sqls[index - 1].startswith("SELECT pg_advisory_xact_lock")
+    locked = conn.statements("SELECT pg_advisory_xact_lock")
+    assert [p[1] for p in locked] == ["T-1", "T-1", "T-2"]
+    assert conn.statements("ANALYZE loans") != []
+
+
+def test_batch_limit_and_disabled_archive():
+    conn = FakeConn([("T-1", 10)])
+    assert loan_archive.archive_returned_loans(conn, 90, batch_size=2, max_batches=2) == {"moved": 4, "batches": 2}
+    assert conn.pending == [("T-1", 6)]
+
+    idle = FakeConn([("T-1", 10)])
+    assert loan_archive.archive_returned_loans(idle, older_than_days=0) == {"moved": 0, "batches": 0}
+    assert idle.executed == []
+    assert loan_archive.archive_returned_loans(FakeConn([]), 90) == {"moved": 0, "batches": 0}
+
+
+def test_rollups_read_archived_loans():
+    assert rollups.LOAN_ROLLUP_SQL.count("loans_archive") == 2
@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+from metrics import Counter, Histogram, Registry  # noqa: E402
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    hist = registry.register(Histogram("demo_seconds", "demo", ("query",), buckets=(0.1, 1.0)))
+    hist.observe(0.05, query="fetch_open_loans")
+    hist.observe(0.5, query="fetch_open_loans")
+    hist.observe(5, query="fetch_open_loans")
+
+    text = registry.render()
+    assert "# TYPE demo_seconds histogram" in text
+    assert 'demo_seconds_bucket{query="fetch_open_loans",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{query="fetch_open_loans",le="1"} 2' in text
+    assert 'demo_seconds_bucket{query="fetch_open_loans",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{query="fetch_open_loans"} 3' in text
+
+
+def test_counter_escapes_label_values_and_decorator_timing():
+    registry = Registry()
+    counter = registry.register(Counter("demo_total", "demo", ("event",)))
+    counter.inc(event='say "hi"')
+    assert 'demo_total{event="say \\"hi\\""} 1' in registry.render()
+
+    hist = registry.register(Histogram("demo_timed_seconds", "demo"))
+
+    @hist.time()
+    def work():
+        return 42
+
+    assert work() == 42 and work() == 42
+    assert hist.count() == 2
+
+
+def test_metrics_endpoint_only_answers_allowed_networks():
+    pytest.importorskip("flask")
+    import app_flask
+
+    client = app_flask.app.test_client()
+    for addr in ("127.0.0.1", "172.17.0.2", "::ffff:172.18.0.5"):
+        response = client.get("/metrics", environ_base={"REMOTE_ADDR": addr})
+        assert response.status_code == 200 and b"toolmgmt_" in response.data
+    for addr in ("192.168.1.20", "10.0.0.7", ""):
+        assert client.get("/metrics", environ_base={"REMOTE_ADDR": addr}).status_code == 403
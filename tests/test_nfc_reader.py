@@ -0,0 +1,41 @@
+import sys
+import time
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+from nfc_reader import SimulatedReader, Tap, generate_trace, load_trace, save_trace  # noqa: E402
+
+
+def test_simulated_reader_replays_trace_at_rate():
+    taps = [Tap("U1", 0.0), Tap("T1", 0.2), Tap("U2", 0.2)]
+    reader = SimulatedReader(taps, rate=2.0)
+
+    started = time.perf_counter()
+    uids = [reader.read_one_uid(timeout=1) for _ in range(3)]
+    elapsed = time.perf_counter() - started
+
+    assert uids == ["U1", "T1", "U2"]
+    assert 0.18 <= elapsed < 0.5, "rate=2 なら 0.4 秒分の間隔が 0.2 秒で再生される"
+    assert reader.exhausted
+    assert reader.read_one_uid(timeout=0.01) is None
+
+
+def test_simulated_reader_times_out_before_next_tap():
+    reader = SimulatedReader([Tap("U1", 5.0)])
+    assert reader.read_one_uid(timeout=0.01) is None
+    assert not reader.exhausted
+
+
+def test_trace_round_trip(tmp_path):
+    taps = generate_trace(5, users=2, tools=3, taps_per_second=10)
+    assert len(taps) == 10
+    assert taps[0].uid.startswith("SIMUSER") and taps[1].uid.startswith("SIMTOOL")
+
+    path = tmp_path / "trace.csv"
+    save_trace(path, taps)
+    loaded = load_trace(path)
+    assert [t.uid for t in loaded] == [t.uid for t in taps]
+    assert abs(loaded[3].interval - taps[3].interval) < 1e-3
@@ -0,0 +1,63 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+from open_loans import OpenLoan, OpenLoanView  # noqa: E402
+
+ROWS = [
+    (1, "T-1", "ドリル", "U-1", "山田", datetime(2025, 10, 1, 9, 0)),
+    (2, "T-2", "レンチ", "U-1", "山田", datetime(2025, 10, 1, 10, 0)),
+    (3, "T-3", None, "U-2", None, datetime(2025, 10, 1, 8, 0)),
+]
+
+
+def _view():
+    view = OpenLoanView()
+    view.load(ROWS)
+    return view
+
+
+def test_view_answers_list_holder_and_user_queries():
+    view = _view()
+    assert [loan.id for loan in view.list()] == [2, 1, 3]
+    assert [loan.id for loan in view.list(limit=1)] == [2]
+    assert view.holder_of("T-1").borrower_name == "山田"
+    assert view.holder_of("T-9") is None
+    assert [loan.tool_uid for loan in view.held_by("U-1")] == ["T-2", "T-1"]
+    # 名前が未登録なら UID を表示名にする（一覧 SQL の COALESCE と同じ）
+    assert view.get(3).as_dict()["tool"] == "T-3" and view.get(3).borrower_name == "U-2"
+
+
+def test_view_applies_mutations_and_renames():
+    view = _view()
+    view.add(OpenLoan(4, "T-4", "ノギス", "U-2", "佐藤", datetime(2025, 10, 2, 9, 0)))
+    assert view.list()[0].id == 4
+    assert view.remove(1).tool_uid == "T-1"
+    assert view.remove(1) is None
+    assert view.holder_of("T-1") is None
+    assert [loan.id for loan in view.held_by("U-1")] == [2]
+    view.rename_user("U-2", "佐藤 次郎")
+    view.rename_tool("T-4", "デジタルノギス")
+    assert {loan.borrower_name for loan in view.held_by("U-2")} == {"佐藤 次郎"}
+    assert view.holder_of("T-4").tool_name == "デジタルノギス"
+
+
+def test_reconcile_reports_drift_and_skips_when_view_changed_meanwhile():
+    view = _view()
+    assert view.reconcile(ROWS) == {"added": 0, "removed": 0, "changed": 0}
+
+    db_rows = [ROWS[0], (2, "T-2", "レンチ", "U-3", "鈴木", ROWS[1][5]),
+               (5, "T-5", "スパナ", "U-2", "佐藤", datetime(2025, 10, 3))]
+    since = view.sequence
+    view.add(OpenLoan(6, "T-6", "ハンマー", "U-1", "山田", datetime(2025, 10, 4)))
+    assert view.reconcile(db_rows, since=since) is None
+    assert view.get(6) is not None
+
+    assert view.reconcile(db_rows, since=view.sequence) == {"added": 1, "removed": 2, "changed": 1}
+    assert sorted(loan.id for loan in view.list()) == [1, 2, 5]
+    assert view.holder_of("T-2").borrower_uid == "U-3"
+    assert view.held_by("U-1")[0].id == 1 and len(view.held_by("U-1")) == 1
@@ -0,0 +1,161 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+from open_loans import OpenLoan, OpenLoanView  # noqa: E402
+from overdue import OverdueEngine  # noqa: E402
+
+T0 = datetime(2025, 10, 1, 9, 0, tzinfo=timezone.utc)
+
+
+def _loan(loan_id, tool_name, hours_after_t0=0):
+    return OpenLoan(loan_id, f"T-{loan_id}", tool_name, "U-1", "山田", T0 + timedelta(hours=hours_after_t0))
+
+
+def _setup(**limits):
+    clock = {"now": T0}
+    engine = OverdueEngine(default_hours=24, limits=limits, clock=lambda: clock["now"])
+    view = OpenLoanView()
+    view.add_listener(engine.loans_changed)
+    return clock, engine, view
+
+
+def test_tick_reports_each_loan_once_when_its_deadline_passes():
+    clock, engine, view = _setup(トルクレンチ=2)
+    view.add(_loan(1, "トルクレンチ"))
+    view.add(_loan(2, "ノギス"))
+    view.add(_loan(3, "トルクレンチ", hours_after_t0=1))
+    assert engine.next_deadline() == T0 + timedelta(hours=2)
+
+    assert engine.tick(T0 + timedelta(hours=1)) == []
+    newly = engine.tick(T0 + timedelta(hours=2, minutes=30))
+    assert [(e["id"], e["max_hours"], e["overdue_seconds"]) for e in newly] == [(1, 2.0, 1800)]
+    view.remove(3)  # 期限前に返却
+    assert [e["id"] for e in engine.tick(T0 + timedelta(hours=30))] == [2]
+    assert engine.tick(T0 + timedelta(hours=40)) == []
+    clock["now"] = T0 + timedelta(hours=40)
+    assert [e["id"] for e in engine.overdue()] == [1, 2]
+    view.remove(1)
+    assert [e["id"] for e in engine.overdue()] == [2]
+    assert engine.next_deadline() is None
+
+
+def test_limit_changes_reschedule_without_renotifying():
+    clock, engine, view = _setup()
+    view.add(_loan(1, "ノギス"))
+    view.add(_loan(2, "スパナ"))
+    clock["now"] = T0 + timedelta(hours=25)
+    assert [e["id"] for e in engine.tick()] == [1, 2]
+
+    engine.set_limit("ノギス", 48)  # 期限内に戻る
+    engine.set_limit("スパナ", 12)  # 期限切れのまま
+    assert [e["id"] for e in engine.overdue()] == [2]
+    assert engine.tick() == []
+    assert engine.limits() == {"スパナ": 12.0, "ノギス": 48.0}
+    # 工具名の変更で行が差し替わっても、期限切れのままなら再通知しない
+    view.rename_tool("T-2", "スパナ（大）")
+    assert engine.tick() == [] and [e["tool"] for e in engine.overdue()] == ["スパナ（大）"]
+    assert [e["id"] for e in engine.tick(T0 + timedelta(hours=49))] == [1]
+
+
+def test_retry_returns_loan_on_next_tick():
+    clock, engine, view = _setup()
+    view.add(_loan(1, "ノギス"))
+    clock["now"] = T0 + timedelta(hours=25)
+    assert [e["id"] for e in engine.tick()] == [1]
+    engine.retry(1)
+    assert engine.overdue() == [] and engine.next_deadline() == T0 + timedelta(hours=24)
+    assert [e["id"] for e in engine.tick()] == [1]
+    assert engine.tick() == []
+    # 再通知の前に返却されたものは返さない
+    view.add(_loan(2, "ノギス"))
+    assert [e["id"] for e in engine.tick()] == [2]
+    engine.retry(2)
+    view.remove(2)
+    assert engine.tick() == []
+
+
+def test_check_overdue_loans_emits_and_retries_failed_emit(monkeypatch):
+    pytest.importorskip("flask")
+    import app_flask
+
+    clock, engine, view = _setup()
+    monkeypatch.setattr(app_flask, "overdue_engine", engine)
+    view.add(_loan(1, "ノギス"))
+    clock["now"] = T0 + timedelta(hours=25)
+
+    real_emit = app_flask.socketio.emit
+
+    def failing_emit(*args, **kwargs):
+        raise RuntimeError("emit failed")
+
+    monkeypatch.setattr(app_flask.socketio, "emit", failing_emit)
+    assert app_flask.check_overdue_loans() == []
+    assert engine.overdue() == []
+
+    monkeypatch.setattr(app_flask.socketio, "emit", real_emit)
+    socket_client = app_flask.socketio.test_client(app_flask.app)
+    socket_client.get_received()
+    assert [e["id"] for e in app_flask.check_overdue_loans()] == [1]
+    events = socket_client.get_received()
+    assert [event["name"] for event in events] == ["loan_overdue"]
+    assert events[0]["args"][0]["id"] == 1 and events[0]["args"][0]["max_hours"] == 24.0
+    assert app_flask.check_overdue_loans() == [] and socket_client.get_received() == []
+    socket_client.disconnect()
+
+
+def test_reload_after_master_sync_reloads_loan_limits(monkeypatch):
+    pytest.importorskip("flask")
+    import app_flask
+
+    class _Conn:
+        def rollback(self):
+            pass
+
+        def close(self):
+            pass
+
+    _clock, engine, _view = _setup()
+    monkeypatch.setattr(app_flask, "overdue_engine", engine)
+    monkeypatch.setattr(app_flask, "get_conn", _Conn)
+    monkeypatch.setattr(app_flask, "fetch_loan_limits", lambda conn: {"トルクレンチ": 8.0})
+    monkeypatch.setattr(app_flask, "reconcile_open_loans", lambda conn=None: None)
+    monkeypatch.setattr(app_flask, "reconcile_inventory", lambda conn=None: None)
+    app_flask.reload_after_master_sync()
+    assert engine.limits() == {"トルクレンチ": 8.0}
+
+
+def test_invalid_limits_are_skipped_instead_of_raising():
+    clock, engine, view = _setup(ノギス=float("nan"), スパナ=1e12)
+    assert engine.limits() == {}
+    engine.set_limit("トルクレンチ", float("inf"))
+    engine.set_limits({"ノギス": 4, "スパナ": float("nan")})
+    assert engine.limits() == {"ノギス": 4.0}
+    view.add(_loan(1, "スパナ"))
+    assert engine.next_deadline() == T0 + timedelta(hours=24)  # 既定値を使う
+
+
+def test_update_loan_limit_rejects_non_finite_and_out_of_range(monkeypatch):
+    pytest.importorskip("flask")
+    import app_flask
+
+    writes = []
+    monkeypatch.setattr(app_flask, "set_loan_limit", lambda conn, name, hours: writes.append((name, hours)))
+    monkeypatch.setattr(app_flask, "get_conn", lambda: type("Conn", (), {"close": lambda self: None})())
+    for value in ("nan", "NaN", "inf", "-Infinity", "1e12", app_flask.MAX_LIMIT_HOURS + 1, 0):
+        with app_flask.app.test_request_context(
+            "/api/loan_limits", method="POST", json={"name": "ノギス", "max_hours": value}
+        ):
+            _body, status = app_flask.update_loan_limit.__wrapped__()
+        assert status == 400, value
+    assert writes == []
+
+    with app_flask.app.test_request_context("/api/loan_limits", method="POST", json={"name": "ノギス", "max_hours": 8}):
+        response = app_flask.update_loan_limit.__wrapped__()
+    assert response.get_json()["max_hours"] == 8.0 and writes == [("ノギス", 8.0)]
@@ -23,3 +23,4 @@ def test_maybe_refresh_plan_cache(tmp_path, monkeypatch):
 
     assert (tmp_path / "production_plan.csv").exists()
     assert (tmp_path / "standard_times.csv").exists()
+    assert (tmp_path / "production_plan.csv.snapshot").exists(), "取り込み時にスナップショットを作る"
@@ -0,0 +1,55 @@
+import sys
+from datetime import date
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+from conftest import PLAN_COLUMNS, STANDARD_COLUMNS, plan_table  # noqa: E402
+from plan_capacity import CapacityTimeline  # noqa: E402
+from plan_index import PlanIndex  # noqa: E402
+
+
+def _timeline():
+    plan = plan_table(
+        "納期,個数,部品番号,部品名,製番,工程名\n"
+        "2025-10-10,20,P-001,ギア,SO-1,切削\n"
+        "2025-10-10,2,P-001,ギア,SO-2,切削\n"
+        "2025-10-12,10,P-002,プレート,SO-3,研磨\n"
+        "2025-10-15,1,P-001,ギア,SO-4,切削\n"
+        ",5,P-001,ギア,SO-5,切削\n"
+        "2025-10-11,9,P-404,不明,SO-6,切削\n",
+        PLAN_COLUMNS,
+    )
+    standard = plan_table(
+        "部品名,機械標準工数,製造オーダー番号,部品番号,工程名\n"
+        "ギア,2.5,SO-1,P-001,切削\n"
+        "プレート,0.5,SO-3,P-002,研磨\n",
+        STANDARD_COLUMNS,
+    )
+    return CapacityTimeline(PlanIndex(plan, standard))
+
+
+def test_timeline_buckets_hours_by_due_date_and_process():
+    result = _timeline().query()
+    by_process = {row["process"]: row for row in result["processes"]}
+    assert by_process["切削"]["days"] == [
+        {"date": "2025-10-10", "hours": 55.0},
+        {"date": "2025-10-15", "hours": 2.5},
+    ]
+    assert by_process["切削"]["undated_hours"] == 12.5
+    assert by_process["研磨"]["total_hours"] == 5.0
+    assert result["total_hours"] == 62.5
+    assert result["unmatched_rows"] == 1
+
+
+def test_timeline_horizon_and_process_filter():
+    timeline = _timeline()
+    assert timeline.first_day() == date(2025, 10, 10) and timeline.last_day() == date(2025, 10, 15)
+    window = timeline.query(date(2025, 10, 11), date(2025, 10, 15), ["切削"])
+    assert [row["process"] for row in window["processes"]] == ["切削"]
+    assert window["processes"][0]["days"] == [{"date": "2025-10-15", "hours": 2.5}]
+    assert window["total_hours"] == 2.5
+    assert timeline.query(date(2026, 1, 1), None)["total_hours"] == 0.0
+    assert timeline.query(processes=["組立"])["processes"][0]["days"] == []
@@ -0,0 +1,62 @@
+import sys
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+from conftest import PLAN_COLUMNS, STANDARD_COLUMNS, plan_table  # noqa: E402
+from plan_index import PlanIndex  # noqa: E402
+from plan_store import PlanTable  # noqa: E402
+
+
+def _index():
+    plan = plan_table(
+        "納期,個数,部品番号,部品名,製番,工程名\n"
+        "2025-10-10,20,P-001,ギア,SO-1001,切削\n"
+        "2025-10-11,4,P-001,ギア,SO-1009,切削\n"
+        "2025-10-12,15,P-002,プレート,SO-1002,研磨\n"
+        "2025-10-13,3,P-003,シャフト,SO-1003,旋削\n",
+        PLAN_COLUMNS,
+    )
+    standard = plan_table(
+        "部品名,機械標準工数,製造オーダー番号,部品番号,工程名\n"
+        "ギア,2.5,SO-1001,P-001,切削\n"
+        "ギア,2.0,SO-1009,P-001,切削\n"
+        "プレート,1.8,SO-1002,P-002,研磨\n",
+        STANDARD_COLUMNS,
+    )
+    return PlanIndex(plan, standard)
+
+
+def test_lookup_by_part_joins_standard_times_preferring_matching_order():
+    result = _index().lookup(part="P-001")
+    rows = {row["製番"]: row for row in result["plan_rows"]}
+    assert rows["SO-1001"]["機械標準工数"] == 2.5 and rows["SO-1001"]["標準工数合計"] == 50.0
+    assert rows["SO-1009"]["機械標準工数"] == 2.0 and rows["SO-1009"]["標準工数合計"] == 8.0
+    assert result["total_standard_hours"] == 58.0
+    assert len(result["standard_rows"]) == 2
+
+
+def test_lookup_by_order_and_intersection_and_missing_join():
+    index = _index()
+    by_order = index.lookup(order="SO-1002")
+    assert [row["部品番号"] for row in by_order["plan_rows"]] == ["P-002"]
+    assert [row["部品番号"] for row in by_order["standard_rows"]] == ["P-002"]
+
+    both = index.lookup(part="P-001", order="SO-1009")
+    assert [row["個数"] for row in both["plan_rows"]] == ["4"]
+    assert index.lookup(part="P-001", order="SO-1002")["plan_rows"] == []
+
+    unmatched = index.lookup(part="P-003")["plan_rows"][0]
+    assert unmatched["機械標準工数"] is None and unmatched["標準工数合計"] is None
+    assert index.lookup(part="P-404") == {
+        "part": "P-404", "order": None, "plan_rows": [], "standard_rows": [], "total_standard_hours": 0.0,
+    }
+
+
+def test_index_without_standard_times():
+    plan = PlanTable.from_rows(PLAN_COLUMNS, [["2025-10-10", "2", "P-001", "ギア", "SO-1", "切削"]])
+    result = PlanIndex(plan, None).lookup(part="P-001")
+    assert result["plan_rows"][0]["標準工数合計"] is None
+    assert PlanIndex(None, None).lookup(order="SO-1")["plan_rows"] == []
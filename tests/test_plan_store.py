@@ -0,0 +1,124 @@
+import math
+import os
+import sys
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+from conftest import PLAN_COLUMNS, STANDARD_COLUMNS, plan_table  # noqa: E402
+import plan_store  # noqa: E402
+from plan_store import (  # noqa: E402
+    PlanHeaderError,
+    load_table,
+    partition_view,
+    snapshot_path_for,
+    sort_plan,
+    sort_standard_times,
+)
+
+
+
+def test_plan_table_parses_typed_columns_and_interns_strings():
+    table = plan_table(
+        "納期,個数,部品番号,部品名,製番,工程名\n"
+        "2025/10/12,15,P-002,プレート,SO-1002,研磨\n"
+        "2025-10-10,abc,P-001,ギア,SO-1001,研磨\n"
+        ",3,P-003,シャフト,SO-1003,切削\n",
+        PLAN_COLUMNS,
+    )
+    assert len(table) == 3
+    assert table[0]["部品番号"] == "P-002" and table[0].get("標準工数_製造オーダー", "") == ""
+    assert table[0].number("個数") == 15.0 and math.isnan(table[1].number("個数"))
+    assert table[1].due_ordinal == date(2025, 10, 10).toordinal() and table[2].due_ordinal == 0
+    assert table.column("工程名")[0] is table.column("工程名")[1]
+    assert table[0].to_dict()["納期"] == "2025/10/12"
+
+
+def test_sorted_views_match_previous_ordering():
+    plan = plan_table(
+        "納期,個数,部品番号,部品名,製番,工程名\n"
+        ",1,P-9,x,SO-0,切削\n"
+        "2025/10/12,1,P-2,x,SO-2,切削\n"
+        "2025-10-12,1,P-1,x,SO-1,切削\n",
+        PLAN_COLUMNS,
+    )
+    assert [row["製番"] for row in sort_plan(plan)] == ["SO-1", "SO-2", "SO-0"]
+
+    standard = plan_table(
+        "部品名,機械標準工数,製造オーダー番号,部品番号,工程名\n"
+        "a,1.5,O-1,P-2,研磨\na,0.5,O-2,P-1,切削\na,2,O-3,P-2,切削\n",
+        STANDARD_COLUMNS,
+    )
+    view = sort_standard_times(standard)
+    assert [row["製造オーダー番号"] for row in view] == ["O-2", "O-3", "O-1"]
+    assert view[0].number("機械標準工数") == 0.5
+
+
+def test_header_mismatch_raises():
+    with pytest.raises(PlanHeaderError) as excinfo:
+        plan_table("納期,個数\n2025-10-01,1\n", PLAN_COLUMNS)
+    assert excinfo.value.headers == ["納期", "個数"]
+
+
+def test_snapshot_round_trip_and_invalidation(tmp_path):
+    csv_path = tmp_path / "production_plan.csv"
+    csv_path.write_text(
+        "納期,個数,部品番号,部品名,製番,工程名\n"
+        "2025-10-12,15,P-002,プレート,SO-1002,研磨\n"
+        "2025/10/10,2.5,P-001,ギア,SO-1001,切削\n",
+        encoding="utf-8",
+    )
+    parsed = load_table(csv_path, PLAN_COLUMNS)
+    assert parsed.source == "csv" and snapshot_path_for(csv_path).exists()
+
+    mapped = load_table(csv_path, PLAN_COLUMNS)
+    assert mapped.source == "snapshot"
+    assert [row.to_dict() for row in mapped] == [row.to_dict() for row in parsed]
+    assert mapped[1].number("個数") == 2.5 and mapped[1].due_ordinal == parsed[1].due_ordinal
+
+    # 内容が同じなら mtime が変わってもスナップショットを使う
+    stat = csv_path.stat()
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10_000_000_000))
+    assert load_table(csv_path, PLAN_COLUMNS).source == "snapshot"
+
+    # 内容が変わったら CSV を解析し直してスナップショットを更新する
+    with csv_path.open("a", encoding="utf-8") as fh:
+        fh.write("2025-10-15,1,P-003,シャフト,SO-1003,研磨\n")
+    reloaded = load_table(csv_path, PLAN_COLUMNS)
+    assert reloaded.source == "csv" and len(reloaded) == 3
+    assert len(load_table(csv_path, PLAN_COLUMNS)) == 3
+
+    with pytest.raises(PlanHeaderError):
+        load_table(csv_path, STANDARD_COLUMNS)
+
+
+def test_snapshot_dir_keeps_csv_directory_untouched(tmp_path, monkeypatch):
+    data_dir = tmp_path / "plan"
+    data_dir.mkdir()
+    csv_path = data_dir / "production_plan.csv"
+    csv_path.write_text("納期,個数,部品番号,部品名,製番,工程名\n2025-10-10,1,P-1,A,SO-1,切削\n", encoding="utf-8")
+    monkeypatch.setattr(plan_store, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+
+    assert load_table(csv_path, PLAN_COLUMNS).source == "csv"
+    assert load_table(csv_path, PLAN_COLUMNS).source == "snapshot"
+    assert snapshot_path_for(csv_path) == tmp_path / "snapshots" / "production_plan.csv.snapshot"
+    assert sorted(p.name for p in data_dir.iterdir()) == ["production_plan.csv"]
+
+
+def test_partition_view_keeps_sorted_order_per_process():
+    table = plan_table(
+        "納期,個数,部品番号,部品名,製番,工程名\n"
+        "2025-10-12,1,P-2,B,SO-2,研磨\n"
+        "2025-10-10,1,P-1,A,SO-1,切削\n"
+        "2025-10-11,1,P-3,C,SO-3,研磨\n",
+        PLAN_COLUMNS,
+    )
+    partitions = partition_view(sort_plan(table), "工程名")
+    assert sorted(partitions) == ["切削", "研磨"]
+    assert [row["製番"] for row in partitions["研磨"]] == ["SO-3", "SO-2"]
+    assert [row["製番"] for row in partitions["切削"]] == ["SO-1"]
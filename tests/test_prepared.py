@@ -0,0 +1,103 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+from db_trace import traced_cursor  # noqa: E402
+from prepared import StatementRegistry  # noqa: E402
+
+
+class FakeError(Exception):
+    def __init__(self, message, pgcode=None):
+        super().__init__(message)
+        self.pgcode = pgcode
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.connection = conn
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        if sql.startswith("PREPARE") and self.connection.reject_prepare:
+            raise FakeError("prepared statements are not supported")
+        if sql.startswith("EXECUTE") and self.connection.deallocated:
+            raise FakeError("prepared statement does not exist", pgcode="26000")
+        self.connection.executed.append((sql, params))
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, reject_prepare=False):
+        self.reject_prepare = reject_prepare
+        self.deallocated = False
+        self.executed = []
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _registry():
+    registry = StatementRegistry()
+    registry.register("name_of_user", "SELECT full_name FROM users WHERE uid=%s", ("text",))
+    registry.register("borrow_or_return.return", "UPDATE loans SET return_user_uid=%s WHERE id=%s", ("text", "bigint"))
+    return registry
+
+
+def _run(registry, conn, name, params):
+    with traced_cursor(conn, name) as cur:
+        registry.execute(cur, name, params)
+    return conn.executed[-1]
+
+
+def test_prepares_once_per_connection_and_executes_by_name():
+    registry = _registry()
+    conn = FakeConn()
+    # prepare() していない接続では SQL をそのまま送る
+    assert _run(registry, conn, "name_of_user", ("U-1",)) == ("SELECT full_name FROM users WHERE uid=%s", ("U-1",))
+
+    assert registry.prepare(conn) and registry.prepare(conn)
+    prepares = [sql for sql, _params in conn.executed if sql.startswith("PREPARE")]
+    assert prepares == [
+        'PREPARE "name_of_user"(text) AS SELECT full_name FROM users WHERE uid=$1',
+        'PREPARE "borrow_or_return.return"(text, bigint) AS UPDATE loans SET return_user_uid=$1 WHERE id=$2',
+    ]
+    assert _run(registry, conn, "borrow_or_return.return", ("U-1", 7)) == (
+        'EXECUTE "borrow_or_return.return"(%s, %s)', ("U-1", 7),
+    )
+    # 別の接続は PREPARE 済みではない
+    assert _run(registry, FakeConn(), "name_of_user", ("U-2",))[0].startswith("SELECT")
+
+
+def test_falls_back_to_plain_sql_when_prepare_fails_or_statement_disappears():
+    registry = _registry()
+    conn = FakeConn(reject_prepare=True)
+    assert registry.prepare(conn) is False
+    assert _run(registry, conn, "name_of_user", ("U-1",))[0].startswith("SELECT")
+
+    conn = FakeConn()
+    registry.prepare(conn)
+    conn.deallocated = True
+    with pytest.raises(FakeError):
+        _run(registry, conn, "name_of_user", ("U-1",))
+    assert _run(registry, conn, "name_of_user", ("U-1",))[0].startswith("SELECT")
+
+
+def test_register_rejects_mismatched_parameters():
+    registry = StatementRegistry()
+    with pytest.raises(ValueError):
+        registry.register("bad", "SELECT %s, %s", ("text",))
+    with pytest.raises(ValueError):
+        registry.register("named", "SELECT %(uid)s", ("text",))
@@ -0,0 +1,88 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+import rollups  # noqa: E402
+
+NOW = datetime(2025, 10, 2, 12, 30, tzinfo=timezone.utc)
+
+
+def _trunc(grain, value):
+    value = value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if grain == "day" else value
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = -1
+        self._row = None
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append((" ".join(sql.split()), params))
+        self.rowcount = 3
+        if "pg_try_advisory_xact_lock" in sql:
+            self._row = (self.conn.lock_available,)
+        elif sql.startswith("SELECT now()"):
+            self._row = (NOW,)
+        elif "FROM rollup_state" in sql:
+            self._row = (self.conn.watermark,) if self.conn.watermark else None
+        elif "SELECT LEAST" in sql:
+            self._row = (self.conn.oldest,)
+        elif "date_trunc(%s" in sql:
+            self._row = (_trunc(*params),)
+        elif "INSERT INTO rollup_state" in sql:
+            self.conn.watermark = params[1]
+
+    def fetchone(self):
+        return self._row
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, watermark=None, oldest=None, lock_available=True):
+        self.watermark = watermark
+        self.oldest = oldest
+        self.lock_available = lock_available
+        self.executed = []
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def rebuilt_since(self, table):
+        return {params["grain"]: params["since"] for sql, params in self.executed if sql.startswith(f"DELETE FROM {table}")}
+
+
+def test_refresh_rebuilds_from_watermark_minus_margin_and_advances_it():
+    conn = FakeConn(watermark=datetime(2025, 10, 2, 12, 3, tzinfo=timezone.utc))
+    result = rollups.refresh_rollups(conn, margin=timedelta(minutes=5))
+    assert result["from"] == datetime(2025, 10, 2, 11, 58, tzinfo=timezone.utc)
+    # 猶予分さかのぼって 11 時台から（時間次）・当日から（日次）作り直す
+    assert conn.rebuilt_since("loan_usage_rollup") == {
+        "hour": datetime(2025, 10, 2, 11, tzinfo=timezone.utc),
+        "day": datetime(2025, 10, 2, tzinfo=timezone.utc),
+    }
+    assert conn.rebuilt_since("scan_tap_rollup") == conn.rebuilt_since("loan_usage_rollup")
+    assert conn.watermark == NOW and result["rows"] == 12
+
+
+def test_first_refresh_backfills_from_oldest_row_and_skips_when_locked():
+    conn = FakeConn(oldest=datetime(2025, 9, 1, 8, 15, tzinfo=timezone.utc))
+    rollups.refresh_rollups(conn)
+    assert conn.rebuilt_since("loan_usage_rollup")["day"] == datetime(2025, 9, 1, tzinfo=timezone.utc)
+
+    busy = FakeConn(watermark=NOW, lock_available=False)
+    assert rollups.refresh_rollups(busy) == {"skipped": True}
+    assert not busy.rebuilt_since("loan_usage_rollup")
@@ -0,0 +1,107 @@
+import gzip
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+import scan_partitions  # noqa: E402
+from scan_partitions import Partition, expired_partitions, missing_partitions, parse_partition_bound  # noqa: E402
+
+JST = timezone(timedelta(hours=9))
+
+
+def _month(year, month):
+    return datetime(year, month, 1, tzinfo=JST)
+
+
+def test_parse_bounds_and_plan_missing_months():
+    legacy = parse_partition_bound(
+        "scan_events_legacy", "FOR VALUES FROM (MINVALUE) TO ('2025-11-01 00:00:00+09')"
+    )
+    assert legacy == Partition("scan_events_legacy", None, _month(2025, 11))
+    december = parse_partition_bound(
+        "scan_events_202512", "FOR VALUES FROM ('2025-12-01 00:00:00+09') TO ('2026-01-01 00:00:00+09')"
+    )
+    assert parse_partition_bound("scan_events_default", "DEFAULT") is None
+
+    starts = [_month(2025, 10), _month(2025, 11), _month(2025, 12), _month(2026, 1), _month(2026, 2)]
+    missing = missing_partitions(starts, [legacy, december])
+    assert [p.name for p in missing] == ["scan_events_202511", "scan_events_202601"]
+    assert missing[0].lower == _month(2025, 11) and missing[0].upper == _month(2025, 12)
+
+
+def test_expired_partitions_are_whole_months_before_cutoff():
+    partitions = [
+        Partition("scan_events_legacy", None, _month(2023, 11)),
+        Partition("scan_events_202311", _month(2023, 11), _month(2023, 12)),
+        Partition("scan_events_202312", _month(2023, 12), _month(2024, 1)),
+    ]
+    assert [p.name for p in expired_partitions(partitions, _month(2023, 12))] == [
+        "scan_events_legacy", "scan_events_202311",
+    ]
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append(" ".join(sql.split()))
+        if "make_interval" in sql:
+            self._rows = [(_month(2023, 12),)]
+        elif "pg_inherits" in sql:
+            self._rows = [
+                ("scan_events_202311", "FOR VALUES FROM ('2023-11-01 00:00:00+09') TO ('2023-12-01 00:00:00+09')"),
+                ("scan_events_202312", "FOR VALUES FROM ('2023-12-01 00:00:00+09') TO ('2024-01-01 00:00:00+09')"),
+            ]
+
+    def fetchone(self):
+        return self._rows[0]
+
+    def fetchall(self):
+        return self._rows
+
+    def copy_expert(self, sql, fh):
+        self.conn.executed.append(sql)
+        fh.write("id,ts,station_id,tag_uid,role_hint\n1,2023-11-02 09:00:00+09,pi1,AA,user\n")
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self):
+        self.executed = []
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_retention_archives_then_detaches_and_drops(tmp_path):
+    conn = FakeConn()
+    results = scan_partitions.apply_retention(conn, retention_months=24, mode="archive", archive_dir=tmp_path)
+    archive = tmp_path / "scan_events_202311.csv.gz"
+    assert results == [{"partition": "scan_events_202311", "mode": "archive", "archive": str(archive)}]
+    with gzip.open(archive, "rt", encoding="utf-8") as fh:
+        assert fh.read().splitlines()[1].startswith("1,")
+    tail = conn.executed[-3:]
+    assert tail[0].startswith("COPY (SELECT * FROM scan_events_202311")
+    assert tail[1:] == [
+        "ALTER TABLE scan_events DETACH PARTITION scan_events_202311",
+        "DROP TABLE scan_events_202311",
+    ]
+
+    detached = FakeConn()
+    scan_partitions.apply_retention(detached, retention_months=24, mode="detach", archive_dir=tmp_path)
+    assert detached.executed[-1] == "ALTER TABLE scan_events DETACH PARTITION scan_events_202311"
+    assert scan_partitions.apply_retention(FakeConn(), retention_months=0) == []
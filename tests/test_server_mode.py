@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+import server_mode  # noqa: E402
+
+
+def test_resolve_mode_explicit_and_invalid(monkeypatch):
+    monkeypatch.setenv("TOOLMGMT_SERVER_MODE", "werkzeug")
+    assert server_mode.resolve_mode() == "werkzeug"
+    assert server_mode.resolve_mode("Gevent") == "gevent"
+    with pytest.raises(ValueError):
+        server_mode.resolve_mode("uwsgi")
+
+
+def test_default_mode_is_werkzeug_even_with_eventlet_installed(monkeypatch):
+    monkeypatch.delenv("TOOLMGMT_SERVER_MODE", raising=False)
+    monkeypatch.setattr(server_mode.importlib.util, "find_spec", lambda name: object())
+    assert server_mode.resolve_mode() == "werkzeug"
+    assert server_mode.resolve_mode("auto") == "eventlet"
+
+
+def test_resolve_auto_falls_back_to_werkzeug(monkeypatch):
+    monkeypatch.setattr(server_mode.importlib.util, "find_spec", lambda name: None)
+    assert server_mode.resolve_mode("auto") == "werkzeug"
+
+
+def test_werkzeug_mode_runs_blocking_calls_inline():
+    assert server_mode.prepare("werkzeug") == "werkzeug"
+    assert server_mode.socketio_async_mode() == "threading"
+    assert server_mode.offload(lambda a, b=0: a + b, 1, b=2) == 3
@@ -0,0 +1,62 @@
+import gzip
+import sys
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+import static_assets  # noqa: E402
+
+
+def _build(tmp_path, monkeypatch, content="console.log('hello');\n" * 40):
+    static_dir = tmp_path / "static"
+    (static_dir / "js").mkdir(parents=True)
+    (static_dir / "js" / "app.js").write_text(content, encoding="utf-8")
+    dist_dir = static_dir / "dist"
+    monkeypatch.setattr(static_assets, "DIST_DIR", dist_dir)
+    return static_dir, dist_dir, static_assets.build_assets(static_dir, dist_dir, logger=lambda _msg: None)
+
+
+def test_build_fingerprints_and_precompresses(tmp_path, monkeypatch):
+    _static_dir, dist_dir, manifest = _build(tmp_path, monkeypatch)
+
+    hashed = manifest["assets"]["js/app.js"]
+    assert hashed.startswith("js/app.") and hashed.endswith(".js") and hashed != "js/app.js"
+    assert gzip.decompress((dist_dir / (hashed + ".gz")).read_bytes()) == (dist_dir / hashed).read_bytes()
+    assert static_assets.asset_url("js/app.js") == f"/assets/{hashed}"
+    assert static_assets.asset_url("js/unknown.js") == "/static/js/unknown.js"
+
+
+def test_resolve_prefers_compressed_and_rejects_unlisted(tmp_path, monkeypatch):
+    _static_dir, dist_dir, manifest = _build(tmp_path, monkeypatch)
+    hashed = manifest["assets"]["js/app.js"]
+
+    path, encoding = static_assets.resolve_asset(hashed, "gzip, deflate")
+    assert encoding == "gzip" and path.name.endswith(".js.gz")
+    path, encoding = static_assets.resolve_asset(hashed, "")
+    assert encoding is None and path == dist_dir / hashed
+    assert static_assets.resolve_asset("../manifest.json", "gzip") is None
+    assert static_assets.resolve_asset("js/app.js", "gzip") is None
+
+
+def test_resolve_skips_encodings_refused_with_q_zero(tmp_path, monkeypatch):
+    _static_dir, dist_dir, manifest = _build(tmp_path, monkeypatch)
+    hashed = manifest["assets"]["js/app.js"]
+
+    assert static_assets.resolve_asset(hashed, "gzip;q=0") == (dist_dir / hashed, None)
+    assert static_assets.resolve_asset(hashed, "gzip; q=0.0, deflate")[1] is None
+    assert static_assets.resolve_asset(hashed, "gzip;q=0.5")[1] == "gzip"
+    assert static_assets.resolve_asset(hashed, "*;q=0") == (dist_dir / hashed, None)
+    assert static_assets.resolve_asset(hashed, "*")[1] == "gzip"
+    assert static_assets.accepted_encodings("br;q=0, deflate, *;q=0.1") == {"deflate", "gzip"}
+
+
+def test_rebuild_changes_hash_and_prunes_stale_files(tmp_path, monkeypatch):
+    static_dir, dist_dir, first = _build(tmp_path, monkeypatch)
+    (static_dir / "js" / "app.js").write_text("console.log('changed');\n" * 40, encoding="utf-8")
+    second = static_assets.build_assets(static_dir, dist_dir, logger=lambda _msg: None)
+
+    assert second["version"] != first["version"]
+    assert not (dist_dir / first["assets"]["js/app.js"]).exists()
+    assert static_assets.asset_url("js/app.js") == f"/assets/{second['assets']['js/app.js']}"
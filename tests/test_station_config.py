@@ -0,0 +1,55 @@
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+from file_watcher import FileWatcher  # noqa: E402
+from station_config import StationConfigStore, load_station_config  # noqa: E402
+
+
+def test_store_reads_once_and_writes_through(tmp_path, monkeypatch):
+    path = tmp_path / "station.json"
+    path.write_text(json.dumps({"process": "切削", "available": ["切削"]}), encoding="utf-8")
+    store = StationConfigStore(path)
+    assert store.get()["process"] == "切削"
+
+    calls = []
+    monkeypatch.setattr("station_config.load_station_config", lambda *a, **k: calls.append(a) or {})
+    assert store.get()["process"] == "切削"
+    saved = store.save(process="研磨")
+    assert calls == [], "get()/save() はファイルを読み直さない"
+    assert saved["available"] == ["切削", "研磨"]
+    assert json.loads(path.read_text(encoding="utf-8"))["process"] == "研磨"
+    assert store.reload() is False, "自分の書き込みは変更として扱わない"
+
+
+def test_store_reload_detects_external_edit(tmp_path):
+    path = tmp_path / "station.json"
+    store = StationConfigStore(path)
+    assert store.get()["source"] in {"default", "env"}
+    path.write_text(json.dumps({"process": "旋削", "available": []}), encoding="utf-8")
+    assert store.reload() is True
+    assert store.get()["available"] == ["旋削"]
+    assert load_station_config(path)["process"] == "旋削"
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watcher_reports_replaced_file(tmp_path, use_inotify):
+    path = tmp_path / "station.json"
+    seen = threading.Event()
+    watcher = FileWatcher([path], lambda changed: seen.set(), poll_interval=0.05, use_inotify=use_inotify).start()
+    try:
+        if use_inotify and watcher.backend != "inotify":
+            pytest.skip("inotify が使えない環境")
+        tmp = tmp_path / ".station.json.tmp"
+        tmp.write_text("{}", encoding="utf-8")
+        tmp.replace(path)
+        assert seen.wait(3.0)
+    finally:
+        watcher.stop()
@@ -0,0 +1,45 @@
+import sys
+import time
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+if str(repo_root) not in sys.path:
+    sys.path.insert(0, str(repo_root))
+
+import usb_sync  # noqa: E402
+from usb_sync import SyncStep  # noqa: E402
+
+
+def _sleep(seconds, code=0):
+    return ["sh", "-c", f"sleep {seconds}; exit {code}"]
+
+
+def test_independent_steps_run_concurrently():
+    steps = [
+        SyncStep(name="mount", title="mount", cmd=_sleep(0)),
+        SyncStep(name="a", title="a", cmd=_sleep(0.4), depends_on=("mount",)),
+        SyncStep(name="b", title="b", cmd=_sleep(0.4), depends_on=("mount",)),
+        SyncStep(name="unmount", title="unmount", cmd=_sleep(0), depends_on=("a", "b"), always_run=True),
+    ]
+    started = time.monotonic()
+    results = usb_sync._run_steps(steps)
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 0.75, "独立ステップが並列実行されていません"
+    assert all(r["returncode"] == 0 for r in results.values())
+    assert results["a"]["duration_ms"] >= 350
+    assert results["unmount"]["started_at"] >= results["a"]["started_at"] + results["a"]["duration_ms"] - 1
+
+
+def test_failed_dependency_skips_dependents_but_runs_cleanup():
+    steps = [
+        SyncStep(name="mount", title="mount", cmd=_sleep(0, code=32)),
+        SyncStep(name="a", title="a", cmd=_sleep(0), depends_on=("mount",)),
+        SyncStep(name="unmount", title="unmount", cmd=_sleep(0), depends_on=("a",), always_run=True),
+    ]
+    results = usb_sync._run_steps(steps)
+
+    assert results["mount"]["returncode"] == 32
+    assert results["a"]["returncode"] == usb_sync.SKIPPED_RETURNCODE
+    assert results["a"]["skipped"] is True
+    assert results["unmount"]["returncode"] == 0
@@ -1,11 +1,29 @@
 import os
 import shlex
 import subprocess
-from typing import Dict, List, Optional
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MASTER_SCRIPT = os.path.join(BASE_DIR, 'scripts', 'usb_master_sync.sh')
+MAX_WORKERS = int(os.environ.get('USB_SYNC_MAX_WORKERS', '4'))
+# 依存ステップが失敗したため実行しなかったステップの returncode
+SKIPPED_RETURNCODE = 125
+
+
+@dataclass
+class SyncStep:
+    """USB 同期の 1 ステップ。depends_on の完了後に実行される。"""
+
+    name: str
+    title: str
+    cmd: List[str]
+    depends_on: Tuple[str, ...] = ()
+    # 依存ステップが失敗しても実行する（アンマウント等の後始末用）
+    always_run: bool = False
 
 
 def _resolve_docviewer_script() -> Optional[str]:
@@ -26,7 +44,8 @@ def _resolve_docviewer_script() -> Optional[str]:
     return None
 
 
-def _run_command(name: str, cmd: List[str]) -> Dict[str, str]:
+def _run_command(name: str, cmd: List[str]) -> Dict[str, object]:
+    started = time.monotonic()
     proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
     return {
         'name': name,
@@ -34,11 +53,112 @@ def _run_command(name: str, cmd: List[str]) -> Dict[str, str]:
         'returncode': proc.returncode,
         'stdout': proc.stdout,
         'stderr': proc.stderr,
+        'started_at': started,
+        'duration_ms': round((time.monotonic() - started) * 1000, 1),
+    }
+
+
+def _skipped_step(step: SyncStep, reason: str) -> Dict[str, object]:
+    return {
+        'name': step.name,
+        'command': ' '.join(shlex.quote(part) for part in step.cmd),
+        'returncode': SKIPPED_RETURNCODE,
+        'stdout': '',
+        'stderr': reason,
+        'skipped': True,
+        'duration_ms': 0.0,
     }
 
 
+def _run_steps(steps: List[SyncStep], max_workers: int = MAX_WORKERS) -> Dict[str, Dict[str, object]]:
+    """Run steps concurrently while honouring depends_on; return results keyed by name."""
+    names = {step.name for step in steps}
+    for step in steps:
+        unknown = [dep for dep in step.depends_on if dep not in names]
+        if unknown:
+            raise ValueError(f'{step.name}: 未定義の依存ステップがあります: {", ".join(unknown)}')
+
+    results: Dict[str, Dict[str, object]] = {}
+    pending: Dict[str, SyncStep] = {step.name: step for step in steps}
+    running = {}
+    base = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        while pending or running:
+            progressed = True
+            while progressed:
+                progressed = False
+                for name, step in list(pending.items()):
+                    if any(dep not in results for dep in step.depends_on):
+                        continue
+                    del pending[name]
+                    progressed = True
+                    failed = [dep for dep in step.depends_on if results[dep]['returncode'] != 0]
+                    if failed and not step.always_run:
+                        results[name] = _skipped_step(step, f'依存ステップが失敗したため実行しませんでした: {", ".join(failed)}')
+                        continue
+                    running[pool.submit(_run_command, step.name, step.cmd)] = step
+
+            if not running:
+                # 残りは循環依存などで実行できないステップ
+                for name, step in pending.items():
+                    results[name] = _skipped_step(step, '依存関係を解決できないため実行しませんでした')
+                pending.clear()
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                results[step.name] = future.result()
+
+    for result in results.values():
+        if 'started_at' in result:
+            result['started_at'] = round((float(result['started_at']) - base) * 1000, 1)
+    return results
+
+
+def _build_steps(device: str, docviewer_script: Optional[str]) -> List[SyncStep]:
+    """Declare the sync steps: mount once, import in parallel, then unmount."""
+    steps: List[SyncStep] = [
+        SyncStep(
+            name='mount',
+            title='USB マウント',
+            cmd=['sudo', 'bash', MASTER_SCRIPT, '--mount', device],
+        ),
+        SyncStep(
+            name='tool_master',
+            title='工具マスタ同期',
+            cmd=['sudo', 'bash', MASTER_SCRIPT, device],
+            depends_on=('mount',),
+        ),
+    ]
+    import_steps = ['tool_master']
+
+    if docviewer_script:
+        steps.append(
+            SyncStep(
+                name='docviewer',
+                title='ドキュメントビューア同期',
+                cmd=['sudo', 'bash', docviewer_script, device],
+                depends_on=('mount',),
+            )
+        )
+        import_steps.append('docviewer')
+
+    steps.append(
+        SyncStep(
+            name='unmount',
+            title='USB アンマウント',
+            cmd=['sudo', 'bash', MASTER_SCRIPT, '--unmount', device],
+            depends_on=tuple(import_steps),
+            always_run=True,
+        )
+    )
+    return steps
+
+
 def run_usb_sync(device: str = '/dev/sda1') -> Dict[str, object]:
-    steps: List[Dict[str, str]] = []
+    steps: List[Dict[str, object]] = []
     combined_stdout: List[str] = []
     combined_stderr: List[str] = []
     overall_code = 0
@@ -46,49 +166,42 @@ def run_usb_sync(device: str = '/dev/sda1') -> Dict[str, object]:
     if not os.path.isfile(MASTER_SCRIPT):
         raise FileNotFoundError(f'マスター同期スクリプトが見つかりません: {MASTER_SCRIPT}')
 
-    commands: List[Dict[str, object]] = [
-        {
-            'name': 'tool_master',
-            'cmd': ['sudo', 'bash', MASTER_SCRIPT, device],
-            'title': '工具マスタ同期',
-        }
-    ]
-
     docviewer_script = _resolve_docviewer_script()
-    if docviewer_script:
-        commands.append(
-            {
-                'name': 'docviewer',
-                'cmd': ['sudo', 'bash', docviewer_script, device],
-                'title': 'ドキュメントビューア同期',
-            }
-        )
-    else:
-        steps.append({
-            'name': 'docviewer',
-            'title': 'ドキュメントビューア同期',
-            'command': '',
-            'returncode': 127,
-            'stdout': '',
-            'stderr': 'DocumentViewer の USB インポートスクリプトが見つかりません。DOCVIEWER_IMPORT_SCRIPT を設定してください。',
-        })
-        overall_code = 127
-
-    for command in commands:
-        step = _run_command(command['name'], command['cmd'])
-        step['title'] = command['title']
+    declared = _build_steps(device, docviewer_script)
+
+    started = time.monotonic()
+    results = _run_steps(declared)
+    elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+
+    for command in declared:
+        step = results[command.name]
+        step['title'] = command.title
         steps.append(step)
 
+        if command.name == 'tool_master' and not docviewer_script:
+            steps.append({
+                'name': 'docviewer',
+                'title': 'ドキュメントビューア同期',
+                'command': '',
+                'returncode': 127,
+                'stdout': '',
+                'stderr': 'DocumentViewer の USB インポートスクリプトが見つかりません。DOCVIEWER_IMPORT_SCRIPT を設定してください。',
+                'duration_ms': 0.0,
+            })
+            overall_code = overall_code or 127
+
+        header = f"== {command.title} ({float(step['duration_ms']) / 1000:.1f}s) =="
         if step['stdout']:
-            combined_stdout.append(f"== {command['title']} ==\n{step['stdout'].strip()}\n")
+            combined_stdout.append(f"{header}\n{str(step['stdout']).strip()}\n")
         if step['stderr']:
-            combined_stderr.append(f"== {command['title']} ==\n{step['stderr'].strip()}\n")
+            combined_stderr.append(f"{header}\n{str(step['stderr']).strip()}\n")
         if step['returncode'] != 0:
             overall_code = overall_code or int(step['returncode'])
 
     result = {
         'returncode': overall_code,
         'steps': steps,
+        'elapsed_ms': elapsed_ms,
         'stdout': '\n'.join(line for line in combined_stdout if line).strip(),
         'stderr': '\n'.join(line for line in combined_stderr if line).strip(),
     }